@@ -0,0 +1,240 @@
+"""
+enemy AI on worker processes.
+every few ticks the main process writes a compact snapshot of the world into shared memory
+(player position, enemy positions and AI kinds) and hands a slice of the enemies to each worker. the obstacle tile
+grid is shared too, but only rewritten when the walls change.
+workers return movement intents (destination pixels) that are applied on the next tick, so AI decisions never hold up
+the frame they were asked for in.
+
+this module must not import pygame: it's imported by every worker process.
+"""
+
+import atexit
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# ai kinds. an enemy class opts into remote AI by setting ai_kind to one of these
+CHASE = 1      # walk towards the player, around walls
+LINE_UP = 2    # get in line with the player on whichever axis is closer, keeping distance
+
+# serial, grid version, enemy count, grid width, grid height, tile size, left border, top border, player x, player y
+HEADER = struct.Struct('<qqiiiiiidd')
+ENEMY = struct.Struct('<ddd')  # kind, x, y
+
+# how far (in tiles) chasers path around walls. further than this they walk straight at the player
+PATH_RADIUS = 24
+
+active_scheduler = None
+
+
+def remote_ai_enabled():
+    """
+    :return: (boolean) whether enemy AI decisions are being made by worker processes
+    """
+    return active_scheduler is not None
+
+
+class AIScheduler:
+    """
+    owns the worker pool and the shared snapshot
+    """
+    def __init__(self, workers, grid_size, interval=1, max_enemies=4096):
+        """
+        :param workers: (int)           number of worker processes
+        :param grid_size: (int, int)    width and height of the tile grid, in tiles
+        :param interval: (int)          ticks between AI updates
+        :param max_enemies: (int)       capacity of the snapshot. enemies past this keep their last intent
+        """
+        width, height = grid_size
+        self.workers = workers
+        self.interval = interval
+        self.max_enemies = max_enemies
+        self.grid_size = grid_size
+        self.snapshot = shared_memory.SharedMemory(create=True, size=HEADER.size + ENEMY.size * max_enemies)
+        self.grid = shared_memory.SharedMemory(create=True, size=width * height)
+        self.pool = ProcessPoolExecutor(workers, initializer=attach_worker,
+                                        initargs=(self.snapshot.name, self.grid.name))
+        self.serial = 0
+        self.grid_version = None    # version of the obstacle grid last copied into shared memory
+        self.ticks = 0
+        self.pending = deque()   # (planned enemies, futures) waiting to be applied
+        atexit.register(self.close)
+
+    def write_snapshot(self, enemies, player_center, obstacle_grid, layout):
+        """
+        :param enemies: (list(sprite))          enemies to plan for. each must have ai_kind and rect
+        :param player_center: (int, int)        player's pixel position
+        :param obstacle_grid: (ObstacleGrid)    the walls. only copied when its version has changed
+        :param layout: (int, int, int)          tile size, left border tiles, top border tiles
+        :return: (int) number of enemies written
+        """
+        width, height = self.grid_size
+        obstacle_grid.ensure_built()
+        if obstacle_grid.version != self.grid_version:
+            self.write_grid(obstacle_grid)
+
+        count = min(len(enemies), self.max_enemies)
+        buf = self.snapshot.buf
+        for index in range(count):
+            enemy = enemies[index]
+            ENEMY.pack_into(buf, HEADER.size + index * ENEMY.size, enemy.ai_kind, *enemy.rect.center)
+        self.serial += 1
+        tile_size, left, top = layout
+        HEADER.pack_into(buf, 0, self.serial, self.grid_version, count, width, height, tile_size, left, top,
+                         *player_center)
+        return count
+
+    def write_grid(self, obstacle_grid):
+        """
+        copy the obstacle grid into shared memory, cropped or padded to grid_size
+        :param obstacle_grid: (ObstacleGrid)
+        :return: None
+        """
+        width, height = self.grid_size
+        grid = bytearray(width * height)
+        columns = min(width, obstacle_grid.width)
+        for y in range(min(height, obstacle_grid.height)):
+            row = y * obstacle_grid.width
+            grid[y * width:y * width + columns] = obstacle_grid.blocked[row:row + columns]
+        self.grid.buf[:len(grid)] = grid
+        self.grid_version = obstacle_grid.version
+
+    def submit(self, enemies, player_center, obstacle_grid, layout):
+        """
+        snapshot the world and split the enemies between the workers
+        :return: None
+        """
+        count = self.write_snapshot(enemies, player_center, obstacle_grid, layout)
+        chunk = max(1, -(-count // self.workers))
+        futures = [self.pool.submit(plan_chunk, self.serial, start, min(start + chunk, count))
+                   for start in range(0, count, chunk)]
+        self.pending.append((enemies[:count], futures))
+
+    def collect(self):
+        """
+        waits for the oldest submitted plan
+        :return: (list((sprite, (float, float))))   enemy and destination pixel for every intent
+        """
+        if not self.pending:
+            return []
+        enemies, futures = self.pending.popleft()
+        intents = []
+        for future in futures:
+            for index, destination in future.result():
+                intents.append((enemies[index], destination))
+        return intents
+
+    def tick(self, enemies, player_center, obstacle_grid, layout):
+        """
+        call once per tick. applies intents planned last time, and asks for new ones every interval ticks
+        :return: (list((sprite, (float, float)))) intents to apply this tick
+        """
+        intents = self.collect()
+        if self.ticks % self.interval == 0 and player_center is not None:
+            self.submit(enemies, player_center, obstacle_grid, layout)
+        self.ticks += 1
+        return intents
+
+    def close(self):
+        """
+        stops the workers and frees the shared memory
+        :return: None
+        """
+        global active_scheduler
+        if self.pool is None:
+            return
+        self.pool.shutdown(cancel_futures=True)
+        self.pool = None
+        for block in (self.snapshot, self.grid):
+            block.close()
+            block.unlink()
+        if active_scheduler is self:
+            active_scheduler = None
+
+
+def start(workers, grid_size, interval=1):
+    """
+    start making enemy AI decisions on worker processes
+    :return: (AIScheduler)
+    """
+    global active_scheduler
+    active_scheduler = AIScheduler(workers, grid_size, interval)
+    return active_scheduler
+
+
+# worker process state
+worker_snapshot = None
+worker_grid = None
+worker_paths = (None, None)  # ((grid version, player tile), distance field), rebuilt only when either changes
+
+
+def attach_worker(snapshot_name, grid_name):
+    """
+    pool initializer: attach to the shared snapshot
+    """
+    global worker_snapshot, worker_grid
+    worker_snapshot = shared_memory.SharedMemory(name=snapshot_name)
+    worker_grid = shared_memory.SharedMemory(name=grid_name)
+
+
+def distance_field(grid, width, height, start):
+    """
+    breadth-first walking distance (in tiles) from the start tile, out to PATH_RADIUS
+    :return: (dict) tile -> distance, for every reachable tile within the radius
+    """
+    distances = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        x, y = frontier.popleft()
+        distance = distances[(x, y)] + 1
+        if distance > PATH_RADIUS:
+            continue
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < width and 0 <= ny < height and (nx, ny) not in distances and not grid[ny * width + nx]:
+                distances[(nx, ny)] = distance
+                frontier.append((nx, ny))
+    return distances
+
+
+def plan_chunk(serial, start, end):
+    """
+    runs on a worker. plans movement for enemies [start, end) of the snapshot
+    :return: (list((int, (float, float))))  snapshot index and destination pixel of each enemy
+    """
+    global worker_paths
+    buf = worker_snapshot.buf
+    _, grid_version, count, width, height, tile_size, left, top, player_x, player_y = HEADER.unpack_from(buf, 0)
+    grid = worker_grid.buf
+
+    def tile_of(x, y):
+        return int(x // tile_size - left), int(y // tile_size - top)
+
+    def center_of(tile):
+        return (left + tile[0] + 1/2) * tile_size, (top + tile[1] + 1/2) * tile_size
+
+    player_tile = tile_of(player_x, player_y)
+    intents = []
+    for index in range(start, end):
+        kind, x, y = ENEMY.unpack_from(buf, HEADER.size + index * ENEMY.size)
+        if kind == CHASE:
+            if worker_paths[0] != (grid_version, player_tile):
+                worker_paths = ((grid_version, player_tile), distance_field(grid, width, height, player_tile))
+            distances = worker_paths[1]
+            tile = tile_of(x, y)
+            here = distances.get(tile)
+            destination = (player_x, player_y)
+            if here:
+                neighbours = [(tile[0] + 1, tile[1]), (tile[0] - 1, tile[1]), (tile[0], tile[1] + 1), (tile[0], tile[1] - 1)]
+                closer = [neighbour for neighbour in neighbours if distances.get(neighbour, here) < here]
+                if closer:
+                    destination = center_of(closer[0])
+            intents.append((index, destination))
+        elif kind == LINE_UP:
+            if abs(x - player_x) < abs(y - player_y):
+                destination = (player_x, (y - player_y) * 1000)
+            else:
+                destination = ((x - player_x) * 1000, player_y)
+            intents.append((index, destination))
+    return intents
@@ -0,0 +1,109 @@
+"""
+per-tick contact list.
+the collision pass runs once per tick, after movement, and finds every contact between the group pairs the game
+cares about (health, weapons, pickups). everything that needs to know what a sprite is touching asks the contact list
+instead of running its own collision query, so each sprite is tested against each group at most once per tick.
+
+contacts are pixel-accurate when the contact list is given a mask_for function: rects are tested first, and only pairs
+whose rects overlap have their masks compared. masks are built once per source image and rotation (see
+sprite_mixins.collision_mask), so accuracy costs little more than the rect test.
+"""
+
+from collections import Counter
+
+import pygame
+
+
+class ContactList:
+    """
+    contacts between sprites and groups for the current tick.
+    pairs given to the constructor are found eagerly by rebuild(). anything else is found the first time it's asked for
+    and remembered until the next rebuild().
+    """
+    def __init__(self, group_pairs, mask_for=None):
+        """
+        :param group_pairs: (list((Group, Group)))  pairs of groups whose contacts should be found every tick
+        :param mask_for: (function)                 sprite -> (Mask, (int, int)) its collision mask and the mask's
+                                                    top left corner in world pixels. None to only compare rects
+        """
+        self.group_pairs = group_pairs
+        self.mask_for = mask_for
+        self.touching_by_group = {}  # (sprite, group) -> sprites in group touching sprite
+        # counters since the last rebuild, for profiling
+        self.tests = 0               # sprite-vs-group queries
+        self.rect_tests = 0          # sprite-vs-sprite rect tests
+        self.mask_tests = 0          # rect tests that overlapped and went on to compare masks
+        self.mask_hits = 0           # mask tests that found overlapping pixels
+        self.totals = Counter()      # the same counters summed over every tick so far
+        self.rebuilds = 0
+
+    def find(self, sprite, others, other_rects):
+        """
+        two stage test: rects (all at once), then masks for the sprites whose rects overlap
+        :param sprite: (sprite)                 sprite to check
+        :param others: (list(sprite))           sprites to check against
+        :param other_rects: (list(Rect))        their rects, in the same order
+        :return: (list(sprite)) the sprites in others touching the sprite
+        """
+        self.rect_tests += len(others)
+        candidates = [others[index] for index in sprite.rect.collidelistall(other_rects)]
+        if self.mask_for is None or not candidates:
+            return candidates
+        self.mask_tests += len(candidates)
+        mask, (x, y) = self.mask_for(sprite)
+        touched = []
+        for other in candidates:
+            other_mask, (x_other, y_other) = self.mask_for(other)
+            if mask.overlap(other_mask, (x_other - x, y_other - y)) is not None:
+                touched.append(other)
+        self.mask_hits += len(touched)
+        return touched
+
+    def rebuild(self):
+        """
+        forget last tick's contacts and find contacts between every registered pair of groups.
+        call after everything has moved.
+        :return: None
+        """
+        self.touching_by_group = {}
+        self.totals.update(self.stats())
+        self.rebuilds += 1
+        self.tests = self.rect_tests = self.mask_tests = self.mask_hits = 0
+        for group_a, group_b in self.group_pairs:
+            sprites_b = group_b.sprites()
+            rects_b = [sprite.rect for sprite in sprites_b]
+            reverse_hits = {}
+            for sprite_a in group_a:
+                touched = self.find(sprite_a, sprites_b, rects_b) if sprites_b else []
+                self.touching_by_group[(sprite_a, group_b)] = touched
+                for sprite_b in touched:
+                    reverse_hits.setdefault(sprite_b, []).append(sprite_a)
+            for sprite_b in sprites_b:
+                self.touching_by_group[(sprite_b, group_a)] = reverse_hits.get(sprite_b, [])
+            self.tests += len(group_a)
+
+    def touching(self, sprite, group):
+        """
+        :param sprite: (sprite)     sprite to check
+        :param group: (Group)       group to check against
+        :return: (list(sprite))     sprites in the group touching the sprite, not counting the sprite itself
+        """
+        key = (sprite, group)
+        touched = self.touching_by_group.get(key)
+        if touched is None:
+            others = [other for other in group if other is not sprite]
+            touched = self.find(sprite, others, [other.rect for other in others])
+            self.touching_by_group[key] = touched
+            self.tests += 1
+        return touched
+
+    def stats(self):
+        """
+        :return: (dict) this tick's counters
+        """
+        return {
+            "tests": self.tests,
+            "rect_tests": self.rect_tests,
+            "mask_tests": self.mask_tests,
+            "mask_hits": self.mask_hits,
+        }
@@ -0,0 +1,296 @@
+"""
+golden-state determinism harness.
+runs seeded scenarios headlessly and hashes the whole world every tick (each entity's class, rect, groups,
+component data and statuses). the hashes are compared with golden traces recorded earlier, so a change that is
+meant to be a pure optimization can be shown not to change behavior. on a mismatch it reports the first tick that
+diverged and the first entity that differs on it.
+
+    python determinism.py               check every scenario against its golden trace
+    python determinism.py --record      (re)record golden traces. only do this for intended behavior changes
+    python determinism.py NAME ...      check (or record) only the named scenarios
+    python determinism.py --pipelined   also draw every tick on the render thread (see render_pipeline.py), to show
+                                        that drawing alongside the simulation doesn't change it
+
+golden traces live in golden/<scenario>.json.gz: per tick the world hash, plus each entity's digest
+whenever it changed, so that the diverging entity can be named.
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import sys
+
+from run_game import *
+import run_game
+import player_input
+import savestate
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+
+def key_bits(*keys):
+    """
+    :return: (int) input bits with the given keys held
+    """
+    bits = 0
+    for key in keys:
+        bits |= 1 << player_input.KEY_BITS[key]
+    return bits
+
+
+def goblin_patrols(rng):
+    """
+    goblins walking their patrols, one on a four corner loop, with the player idle out of the way
+    """
+    PlayerSprite((16, 8))
+    spawn('Goblin', (2, 1))
+    spawn('Goblin', (6, 2))
+    looping = spawn('Goblin', (10, 1))
+    looping.set_tile_sequence([(10, 1), (14, 1), (14, 5), (10, 5)], 4, True)
+    return [0] * 300
+
+
+def boomerang_return(rng):
+    """
+    the player turns right and throws a boomerang at a goblin, twice
+    """
+    PlayerSprite((3, 4))
+    spawn('Goblin', (9, 3))
+    bits = [0] * 240
+    bits[5] = key_bits(K_RIGHT)
+    for tick in range(10, 14):
+        bits[tick] = key_bits(K_3)
+    for tick in range(120, 124):
+        bits[tick] = key_bits(K_3)
+    return bits
+
+
+def fire_spread(rng):
+    """
+    goblins patrol through a fire and into each other, and the player fires the fire rod at them
+    """
+    PlayerSprite((12, 4))
+    spawn('Fire', (5, 4))
+    spawn('Goblin', (5, 2))
+    spawn('Goblin', (6, 3)).set_tile_sequence([(6, 3), (4, 3)], 2, True)
+    spawn('Goblin', (4, 6))
+    bits = [0] * 300
+    bits[3] = key_bits(K_LEFT)
+    for tick in range(40, 200, 25):
+        bits[tick] = key_bits(K_5)
+    return bits
+
+
+def random_bits(rng, ticks):
+    """
+    :return: (list(int)) input bits for random keys, held for a random number of ticks each
+    """
+    bits = []
+    held = 0
+    for _ in range(ticks):
+        if rng.random() < 0.1:
+            held = rng.getrandbits(len(player_input.TRACKED_KEYS)) & rng.getrandbits(len(player_input.TRACKED_KEYS))
+        bits.append(held)
+    return bits
+
+
+def seeded_room(rng):
+    """
+    the usual room with seeded random input
+    """
+    spawn_entities()
+    return random_bits(rng, 600)
+
+
+def generated_level(rng):
+    """
+    a generated rooms and corridors level, several screens big, with seeded random input
+    """
+    import level_generator
+    level = level_generator.generate(48, 32, seed=5, player_near=(8, 4))
+    savestate.clear_world()
+    initialize_level(level, *load_map_images())
+    spawn_level(level)
+    return random_bits(rng, 600)
+
+
+# name -> (function that builds the world and returns input bits per tick, seed)
+SCENARIOS = {
+    "goblin_patrols": (goblin_patrols, 1),
+    "boomerang_return": (boomerang_return, 2),
+    "fire_spread": (fire_spread, 3),
+    "seeded_room": (seeded_room, 4),
+    "generated_level": (generated_level, 5),
+}
+
+
+def comparable(value):
+    """
+    :return: the value, with images left out
+    """
+    return None if isinstance(value, pygame.Surface) else value
+
+
+def entity_state(sprite):
+    """
+    :return: (list) everything about a sprite that affects behavior
+    """
+    state = [type(sprite).__name__, tuple(sprite.rect), [index for index, group in enumerate(groups) if sprite in group]]
+    for name, store in world.stores.items():
+        slot = store.slots.get(sprite)
+        if slot is not None:
+            state.append((name, [comparable(column[slot]) for column in store.columns.values()]))
+    state.append([(type(status).__name__, status.remaining_time, status.infectious)
+                  for status in Status.get_statuses(sprite)])
+    return state
+
+
+def digest(text):
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class WorldHasher:
+    """
+    names every entity by class and order of appearance, and hashes the world
+    """
+    def __init__(self):
+        self.keys = {}   # sprite -> name
+        self.count = 0
+
+    def entity_digests(self):
+        """
+        :return: (dict) entity name -> digest of its state, in group order
+        """
+        digests = {}
+        for group in groups:
+            for sprite in group:
+                key = self.keys.get(sprite)
+                if key is None:
+                    self.count += 1
+                    key = self.keys[sprite] = "{}#{}".format(type(sprite).__name__, self.count)
+                if key not in digests:
+                    digests[key] = digest(repr(entity_state(sprite)))
+        return digests
+
+    def find(self, key):
+        """
+        :return: (sprite) the live sprite with the given name, or None
+        """
+        for sprite, sprite_key in self.keys.items():
+            if sprite_key == key and sprite.alive():
+                return sprite
+        return None
+
+
+def world_hash(digests):
+    return digest(";".join(key + ":" + entity_digest for key, entity_digest in digests.items()))
+
+
+def run_scenario(name):
+    """
+    build a scenario's world and run it, hashing the world after every tick
+    :param name: (string) key in SCENARIOS
+    :return: (generator) of (tick, world hash, entity digests, hasher)
+    """
+    build, seed = SCENARIOS[name]
+    savestate.clear_world()
+    governor.enabled = False
+    initialize_map(*load_map_images())
+    bits = build(random.Random(seed))
+    player_input.start_scripted_input(bits)
+    hasher = WorldHasher()
+    for tick in range(len(bits)):
+        simulation_tick()
+        digests = hasher.entity_digests()
+        if run_game.pipeline:
+            view_tick()
+        yield tick + 1, world_hash(digests), digests, hasher
+    if run_game.pipeline:
+        run_game.pipeline.finish()
+
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, name + ".json.gz")
+
+
+def record(name):
+    """
+    run a scenario and save its golden trace
+    :return: (int) ticks recorded
+    """
+    ticks = []
+    previous = {}
+    for tick, tick_hash, digests, _ in run_scenario(name):
+        ticks.append({
+            "hash": tick_hash,
+            "changed": {key: value for key, value in digests.items() if previous.get(key) != value},
+            "removed": [key for key in previous if key not in digests],
+        })
+        previous = digests
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with gzip.open(golden_path(name), "wt") as golden_file:
+        json.dump({"scenario": name, "ticks": ticks}, golden_file, separators=(",", ":"))
+    return len(ticks)
+
+
+def check(name):
+    """
+    run a scenario and compare it with its golden trace
+    :return: (string) None if it matched, otherwise a description of the first divergence
+    """
+    with gzip.open(golden_path(name), "rt") as golden_file:
+        golden = json.load(golden_file)["ticks"]
+    expected = {}
+    ran = 0
+    for (tick, tick_hash, digests, hasher), golden_tick in zip(run_scenario(name), golden):
+        ran = tick
+        for key in golden_tick["removed"]:
+            del expected[key]
+        expected.update(golden_tick["changed"])
+        if tick_hash == golden_tick["hash"]:
+            continue
+        for key in list(digests) + list(expected):
+            if key not in expected:
+                return "tick {}: {} exists but shouldn't".format(tick, key)
+            if key not in digests:
+                return "tick {}: {} should exist but doesn't".format(tick, key)
+            if digests[key] != expected[key]:
+                return "tick {}: {} differs, now {}".format(tick, key, entity_state(hasher.find(key)))
+        return "tick {}: world hash differs".format(tick)
+    if ran != len(golden):
+        return "ran {} ticks, golden trace has {}".format(ran, len(golden))
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="check that scenarios still behave exactly as recorded")
+    parser.add_argument("scenarios", nargs="*", metavar="NAME", help="scenarios to run. all of them by default")
+    parser.add_argument("--record", action="store_true", help="record golden traces instead of checking them")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="draw every tick on a render thread while the next one is simulated")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    init_pygame()
+    if args.pipelined:
+        create_display()
+        run_game.pipeline = RenderPipeline(draw_frame, pygame.display.update, surface_lock)
+    failures = 0
+    for name in args.scenarios or SCENARIOS:
+        if args.record:
+            print("{}: recorded {} ticks".format(name, record(name)))
+            continue
+        divergence = check(name)
+        if divergence:
+            failures += 1
+        print("{}: {}".format(name, divergence or "ok"))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+"""
+multi-room dungeons.
+a dungeon is a graph of rooms, each the size of the screen. walking into a doorway on a room's edge moves the player to
+the matching doorway of the room on the other side. only the room the player is in exists in the world, so only its
+entities tick; rooms that were left are suspended as saves (see savestate.py), with their entities frozen exactly as
+they were, and restored when the player comes back.
+
+a room's layout gives its interior (the border walls and doorways are added from its exits):
+    '#' wall    '.' floor    letters spawn an entity on the first visit (see SPAWNS)
+
+while the player is in a room, the images its neighbours need are loaded and their backgrounds (every wall and floor
+tile drawn into one surface) are rendered on a background thread, so that going through a door only has to swap the
+world, never load or draw anything.
+
+a quick-save of a dungeon (see Dungeon.save) has every room in it, not just the world:
+    8 bytes     magic, b'LONKDUNG'
+    1 byte      format version
+    string      name of the room the player is in
+    rooms       room count (u32), then per room: name, then its suspended save (u32 length, 0 if it hasn't been
+                visited, then the bytes)
+    world       the rest is the current room's world, as written by savestate.save_world
+strings are a u16 length, then UTF-8.
+"""
+
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sprite_classes import *
+import savestate
+from prototypes import image_names, spawn_many
+
+WALL = '#'
+FLOOR = '.'
+
+# layout letter -> entity type spawned there (see prototypes.py)
+SPAWNS = {
+    'f': 'Fire',
+    'g': 'Goblin',
+    'c': 'Chaser',
+    'a': 'Archer',
+    'h': 'Heart',
+    'p': 'HastePotion',
+}
+
+OPPOSITE = {'left': 'right', 'right': 'left', 'up': 'down', 'down': 'up'}
+
+# tiles of each edge left open when the room has an exit there. two tiles wide, so the player has room to line up
+DOORWAYS = {
+    'left': [(0, vertical_tiles // 2 - 1), (0, vertical_tiles // 2)],
+    'right': [(horizontal_tiles - 1, vertical_tiles // 2 - 1), (horizontal_tiles - 1, vertical_tiles // 2)],
+    'up': [(horizontal_tiles // 2 - 1, 0), (horizontal_tiles // 2, 0)],
+    'down': [(horizontal_tiles // 2 - 1, vertical_tiles - 1), (horizontal_tiles // 2, vertical_tiles - 1)],
+}
+
+# the default dungeon: four rooms in a square, starting where the single room game does
+ROOMS = {
+    'entrance': ({'right': 'hall', 'down': 'crypt'}, [
+        "................",
+        ".f..............",
+        ".c..............",
+        "..gh............",
+        ".........a...f..",
+        "....g...........",
+        ".........p......",
+        "................",
+    ]),
+    'hall': ({'left': 'entrance', 'down': 'armory'}, [
+        "................",
+        "..##........##..",
+        "..#....g.....#..",
+        "......a.........",
+        "................",
+        "..#..........#..",
+        "..##...h....##..",
+        "................",
+    ]),
+    'crypt': ({'up': 'entrance', 'right': 'armory'}, [
+        "................",
+        ".c....#..#....c.",
+        "......#..#......",
+        "..f...........f.",
+        "..........g.....",
+        "......#..#......",
+        ".c....#..#......",
+        "...............p",
+    ]),
+    'armory': ({'up': 'hall', 'left': 'crypt'}, [
+        "................",
+        ".a...........a..",
+        "....######......",
+        "................",
+        "......g.........",
+        "....######......",
+        ".h...........a..",
+        "................",
+    ]),
+}
+START_ROOM = 'entrance'
+START_TILE = (8, 4)
+
+DUNGEON_MAGIC = b'LONKDUNG'
+DUNGEON_VERSION = 1
+LENGTH = struct.Struct('<I')
+SHORT = struct.Struct('<H')
+
+
+class Room:
+    """
+    one room of a dungeon
+    """
+    def __init__(self, name, exits, layout):
+        """
+        :param name: (string)           name other rooms' exits refer to it by
+        :param exits: (dict)            edge ('left', 'right', 'up' or 'down') -> name of the room through that edge
+        :param layout: (list(string))   interior rows, see the module docstring
+        """
+        if len(layout) != vertical_tiles - 2 or any(len(row) != horizontal_tiles - 2 for row in layout):
+            raise ValueError("room {} must be {}x{} tiles inside its walls".format(
+                name, horizontal_tiles - 2, vertical_tiles - 2))
+        self.name = name
+        self.exits = exits
+        self.layout = layout
+        self.walls = self.wall_tiles()
+        self.saved = None           # (bytes) the room as the player left it, or None if it hasn't been visited
+        self.prepared = None        # (Future) of the room's background surface, once prefetching has started
+
+    def wall_tiles(self):
+        """
+        :return: (set((int, int))) every wall tile, including the border but not its doorways
+        """
+        doorways = {tile for edge in self.exits for tile in DOORWAYS[edge]}
+        walls = set()
+        for x in range(horizontal_tiles):
+            for y in range(vertical_tiles):
+                border = x == 0 or x == horizontal_tiles - 1 or y == 0 or y == vertical_tiles - 1
+                if border and (x, y) not in doorways or not border and self.layout[y - 1][x - 1] == WALL:
+                    walls.add((x, y))
+        return walls
+
+    def spawns(self):
+        """
+        :return: (dict) entity type -> tiles the layout spawns it on
+        """
+        spawns = {}
+        for y, row in enumerate(self.layout):
+            for x, letter in enumerate(row):
+                if letter in SPAWNS:
+                    spawns.setdefault(SPAWNS[letter], []).append((x + 1, y + 1))
+        return spawns
+
+    def prepare(self):
+        """
+        runs on the prefetch thread: loads every image the room needs and renders its background
+        :return: (Surface) the background
+        """
+        wall_image, floor_image = load_image("brick_dark.png", "roguetiles"), load_image("brick_light.png", "roguetiles")
+        for entity_type in self.spawns():
+            for image_name, sub_path in image_names(entity_type):
+                load_image(image_name, sub_path)
+        background = pygame.Surface(render_size(horizontal_tiles * tile_size, vertical_tiles * tile_size))
+        with surface_lock:  # the tile images mustn't be locked by the game thread mid-blit
+            background.blits([(wall_image if (x, y) in self.walls else floor_image,
+                               render_position(Rect(x * tile_size, y * tile_size, 0, 0)))
+                              for x in range(horizontal_tiles) for y in range(vertical_tiles)], False)
+        return background
+
+    def build(self):
+        """
+        creates the room's tiles and, on the first visit, its entities. the world must be empty
+        :return: None
+        """
+        wall_image, floor_image = load_image("brick_dark.png", "roguetiles"), load_image("brick_light.png", "roguetiles")
+        set_map_size(horizontal_tiles, vertical_tiles)
+        for x in range(horizontal_tiles):
+            for y in range(vertical_tiles):
+                is_wall = (x, y) in self.walls
+                StaticTile((x, y), wall_image if is_wall else floor_image).add(obstacles if is_wall else floors)
+        obstacle_grid.invalidate()
+        for entity_type, tiles in self.spawns().items():
+            spawn_many(entity_type, tiles)
+
+
+class CarriedSprite:
+    """
+    a sprite taken out of the world, with everything needed to put it back in another one
+    """
+    def __init__(self, sprite):
+        self.sprite = sprite
+        self.groups = sprite.groups()
+        self.rows = {name: store.get_row(sprite) for name, store in world.stores.items() if sprite in store}
+        self.statuses = list(Status.get_statuses(sprite))
+        sprite.kill()
+
+    def put_back(self):
+        """
+        :return: None
+        """
+        sprite = self.sprite
+        for name, row in self.rows.items():
+            world.stores[name].add(sprite, **row)
+        sprite.add(*self.groups)
+        for status in self.statuses:
+            victim_statuses.setdefault(sprite, []).append(status)
+            active_statuses.append(status)
+        if sprite in animation_store:
+            join_animation_clock(sprite)
+
+
+class Dungeon:
+    """
+    the rooms, which one the player is in, and the prefetch thread
+    """
+    def __init__(self, rooms=None, start_room=START_ROOM, start_tile=START_TILE):
+        """
+        :param rooms: (dict)            room name -> (exits, layout). see Room. defaults to ROOMS
+        :param start_room: (string)     room the player starts in
+        :param start_tile: (int, int)   tile the player starts on
+        """
+        self.rooms = {name: Room(name, exits, layout) for name, (exits, layout) in (rooms or ROOMS).items()}
+        for room in self.rooms.values():
+            for edge, neighbour in room.exits.items():
+                if self.rooms[neighbour].exits.get(OPPOSITE[edge]) != room.name:
+                    raise ValueError("room {} leads {} to {}, which doesn't lead back".format(room.name, edge, neighbour))
+        self.start_room = start_room
+        self.start_tile = start_tile
+        self.current = None
+        self.prefetcher = ThreadPoolExecutor(1, thread_name_prefix="room prefetch")
+        # for profiling
+        self.transitions = 0
+        self.transition_ms = 0.0        # longest transition so far
+        self.prefetch_waits = 0         # transitions that had to wait for the prefetch thread
+
+    def start(self):
+        """
+        (re)starts the dungeon: every room as it was at the start, and a new player in the start room
+        :return: None
+        """
+        for room in self.rooms.values():
+            room.saved = None
+        savestate.clear_world()
+        self.enter(self.rooms[self.start_room])
+        PlayerSprite(self.start_tile)
+
+    def enter(self, room):
+        """
+        make a room the one in the world, which must be empty, and start prefetching its neighbours
+        :param room: (Room)
+        :return: None
+        """
+        if room.saved is not None:
+            savestate.load_world(room.saved)
+        else:
+            room.build()
+        self.arrive(room)
+
+    def arrive(self, room):
+        """
+        make a room, now in the world, the current one and start prefetching its neighbours
+        :param room: (Room)
+        :return: None
+        """
+        self.current = room
+        self.prefetch(room)
+        for neighbour in room.exits.values():
+            self.prefetch(self.rooms[neighbour])
+
+    def prefetch(self, room):
+        """
+        start preparing a room's images and background on the prefetch thread, unless it's already been done
+        :return: None
+        """
+        if room.prepared is None:
+            room.prepared = self.prefetcher.submit(room.prepare)
+
+    def background(self):
+        """
+        :return: (Surface) the current room's background, or None if it isn't ready yet
+        """
+        prepared = self.current.prepared
+        return prepared.result() if prepared is not None and prepared.done() else None
+
+    def update(self, tick):
+        """
+        call between ticks. takes the player through a doorway if they're standing in one
+        :param tick: (int) current tick count, stored with the room being left
+        :return: (boolean) whether the player changed rooms
+        """
+        player = get_player()
+        if not player:
+            return False
+        x, y = get_tile_from_pixel(*player.rect.center)
+        if x <= 0:
+            edge = 'left'
+        elif x >= horizontal_tiles - 1:
+            edge = 'right'
+        elif y <= 0:
+            edge = 'up'
+        elif y >= vertical_tiles - 1:
+            edge = 'down'
+        else:
+            return False
+        if edge not in self.current.exits:
+            return False
+        self.transition(player, edge, tick)
+        return True
+
+    def transition(self, player, edge, tick):
+        """
+        suspend the current room and take the player into the one through the edge
+        :return: None
+        """
+        start = time.perf_counter()
+        for weapon in player_weapons:
+            weapon.kill()   # weapons stay behind
+        carried = CarriedSprite(player)
+        self.current.saved = savestate.save_world(tick)
+        savestate.clear_world()
+        room = self.rooms[self.current.exits[edge]]
+        if room.prepared is not None and not room.prepared.done():
+            self.prefetch_waits += 1
+            room.prepared.result()
+        self.enter(room)
+        carried.put_back()
+        # one tile in from the doorway on the other side, keeping the player's position along the edge
+        x_step, y_step = DIRECTION_VECTORS[edge]
+        x, y = player.rect.center
+        if x_step:
+            x = get_center_pixel(1 if x_step > 0 else horizontal_tiles - 2, 0)[0]
+        else:
+            y = get_center_pixel(0, 1 if y_step > 0 else vertical_tiles - 2)[1]
+        player.rect.center = (x, y)
+        player.clear_fields()
+        self.transitions += 1
+        self.transition_ms = max(self.transition_ms, (time.perf_counter() - start) * 1000)
+
+    def save(self, tick):
+        """
+        :param tick: (int) current tick count, restored by load
+        :return: (bytes) the world, every suspended room, and which room the player is in. see the module docstring
+        """
+        data = bytearray(DUNGEON_MAGIC + bytes([DUNGEON_VERSION]))
+        data += pack_string(self.current.name)
+        data += LENGTH.pack(len(self.rooms))
+        for room in self.rooms.values():
+            saved = room.saved or b''
+            data += pack_string(room.name) + LENGTH.pack(len(saved)) + saved
+        data += savestate.save_world(tick)
+        return bytes(data)
+
+    def load(self, data):
+        """
+        replaces the world and every room with a saved dungeon
+        :param data: (bytes) made by save
+        :return: (int) the tick count when the dungeon was saved
+        """
+        if data[:len(DUNGEON_MAGIC)] != DUNGEON_MAGIC:
+            raise ValueError("not a saved dungeon")
+        if data[len(DUNGEON_MAGIC)] != DUNGEON_VERSION:
+            raise ValueError("unsupported dungeon save version {}".format(data[len(DUNGEON_MAGIC)]))
+        offset = len(DUNGEON_MAGIC) + 1
+        current, offset = unpack_string(data, offset)
+        (count,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        saves = {}
+        for _ in range(count):
+            name, offset = unpack_string(data, offset)
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            saves[name] = data[offset:offset + length] or None
+            offset += length
+        if saves.keys() != self.rooms.keys():
+            raise ValueError("save is for a dungeon with rooms {}".format(", ".join(saves)))
+
+        tick = savestate.load_world(data[offset:])
+        for name, saved in saves.items():
+            self.rooms[name].saved = saved
+        self.arrive(self.rooms[current])
+        return tick
+
+    def close(self):
+        self.prefetcher.shutdown(cancel_futures=True)
+
+
+def pack_string(value):
+    """
+    :return: (bytes) u16 length, then UTF-8
+    """
+    encoded = value.encode()
+    return SHORT.pack(len(encoded)) + encoded
+
+
+def unpack_string(data, offset):
+    """
+    :return: (string, int) the string at offset, and the offset just past it
+    """
+    (length,) = SHORT.unpack_from(data, offset)
+    offset += SHORT.size
+    return data[offset:offset + length].decode(), offset + length
@@ -0,0 +1,201 @@
+"""
+component storage for the entity/system engine.
+
+each component type (movement, rotation, health, ...) is stored in a ComponentStore:
+one dense column per field, where slot i of every column belongs to the same entity.
+numeric fields are array.array columns, anything else (images, tuples, optional values) is a plain list.
+systems are functions that loop over one store's columns, touching every entity with that component in one pass.
+
+entities are the sprites themselves. a sprite's component data lives in the stores, not on the sprite;
+the mixins in sprite_mixins expose the fields as properties so that sprite code can keep using self.speed etc.
+"""
+
+from array import array
+
+
+class ComponentStore:
+    """
+    dense storage for one component type
+    """
+    def __init__(self, name, fields):
+        """
+        :param name: (string)   name of the component
+        :param fields: (dict)   field name -> array typecode for numeric fields, or None for fields holding python objects.
+                                field order is kept; it's the order fields are serialized in.
+        """
+        self.name = name
+        self.fields = dict(fields)
+        self.columns = {field: array(typecode) if typecode else [] for field, typecode in self.fields.items()}
+        self.entities = []  # entity in each slot
+        self.slots = {}     # entity -> slot
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity):
+        return entity in self.slots
+
+    def add(self, entity, **values):
+        """
+        gives an entity this component. fields not given are 0 (numeric) or None (objects)
+        :param entity:  the entity (sprite)
+        :param values:  initial field values
+        :return: (int) the entity's slot
+        """
+        if entity in self.slots:
+            raise ValueError("{} already has a {} component".format(entity, self.name))
+        slot = len(self.entities)
+        for field, typecode in self.fields.items():
+            self.columns[field].append(values.get(field, 0 if typecode else None))
+        self.entities.append(entity)
+        self.slots[entity] = slot
+        return slot
+
+    def add_many(self, entities, **values):
+        """
+        gives many entities this component at once, all with the same field values. each column is extended once, so
+        this is much faster than add() in a loop
+        :param entities: (list)     the entities (sprites)
+        :param values:              initial field values. lists, dicts and sets are copied for each entity
+        :return: None
+        """
+        for entity in entities:
+            if entity in self.slots:
+                raise ValueError("{} already has a {} component".format(entity, self.name))
+        start, count = len(self.entities), len(entities)
+        for field, typecode in self.fields.items():
+            value = values.get(field, 0 if typecode else None)
+            if typecode:
+                self.columns[field].extend(array(typecode, [value]) * count)
+            elif isinstance(value, (list, dict, set)):
+                self.columns[field].extend([type(value)(value) for _ in range(count)])
+            else:
+                self.columns[field].extend([value] * count)
+        self.entities.extend(entities)
+        self.slots.update(zip(entities, range(start, start + count)))
+
+    def remove(self, entity):
+        """
+        removes an entity's component by moving the last slot into its place
+        :param entity:  the entity (sprite)
+        :return: None
+        """
+        slot = self.slots.pop(entity)
+        last = len(self.entities) - 1
+        if slot != last:
+            moved = self.entities[last]
+            self.entities[slot] = moved
+            self.slots[moved] = slot
+            for column in self.columns.values():
+                column[slot] = column[last]
+        self.entities.pop()
+        for column in self.columns.values():
+            column.pop()
+
+    def remove_dead(self):
+        """
+        removes every entity that is no longer alive (in no sprite group)
+        :return: (int) number of entities removed
+        """
+        dead = [entity for entity in self.entities if not entity.alive()]
+        for entity in dead:
+            self.remove(entity)
+        return len(dead)
+
+    def get_row(self, entity):
+        """
+        :param entity:  the entity (sprite)
+        :return: (dict) field -> value for the entity
+        """
+        slot = self.slots[entity]
+        return {field: column[slot] for field, column in self.columns.items()}
+
+    def clear(self):
+        """
+        removes every entity
+        :return: None
+        """
+        for field, typecode in self.fields.items():
+            self.columns[field] = array(typecode) if typecode else []
+        self.entities = []
+        self.slots = {}
+
+
+def component_property(store, field):
+    """
+    makes a property that reads and writes an entity's field in a component store.
+    this is the adapter that lets sprite code keep using plain attributes.
+    :param store: (ComponentStore)  store holding the field
+    :param field: (string)          field name
+    :return: (property)
+    """
+    # columns are replaced by ComponentStore.clear(), so look the column up on every access
+    def get_field(entity):
+        try:
+            return store.columns[field][store.slots[entity]]
+        except KeyError:
+            raise AttributeError("{} has no {} component".format(type(entity).__name__, store.name))
+
+    def set_field(entity, value):
+        store.columns[field][store.slots[entity]] = value
+
+    return property(get_field, set_field)
+
+
+def component_fields(store):
+    """
+    class decorator that adds a component_property for every field in a store
+    :param store: (ComponentStore)
+    :return: the decorator
+    """
+    def decorate(cls):
+        for field in store.fields:
+            setattr(cls, field, component_property(store, field))
+        return cls
+    return decorate
+
+
+class World:
+    """
+    every component store, and the systems that run over them in order
+    """
+    def __init__(self):
+        self.stores = {}
+        self.systems = []
+
+    def add_store(self, name, fields):
+        """
+        :param name: (string)   name of the component
+        :param fields: (dict)   see ComponentStore
+        :return: (ComponentStore) the new store
+        """
+        store = ComponentStore(name, fields)
+        self.stores[name] = store
+        return store
+
+    def add_system(self, system):
+        """
+        :param system: (function)   called with no arguments once per tick, in the order systems were added
+        :return: the system, so this can be used as a decorator
+        """
+        self.systems.append(system)
+        return system
+
+    def run_systems(self):
+        """
+        drops dead entities from every store, then runs every system once
+        :return: None
+        """
+        for store in self.stores.values():
+            store.remove_dead()
+        for system in self.systems:
+            system()
+
+    def clear(self):
+        """
+        removes every entity from every store
+        :return: None
+        """
+        for store in self.stores.values():
+            store.clear()
+
@@ -1,13 +1,26 @@
 import pygame
 import os
+import threading
+
+from collisions import ContactList
+from ecs import World
+from governor import FrameGovernor
+from line_of_sight import LineOfSight, MAX_TABLE_CELLS
+from obstacle_grid import ObstacleGrid, ObstacleGroup
+from telemetry import Telemetry
 
 
 # used for animation
 tick_counter = 0
 
-# size of square tiles, in pixels
+# size of square tiles, in world pixels. positions, rects and speeds are all in world pixels
 tile_size = 64
 
+# world pixels per image pixel. 1 draws the 64 px art as is. in low resolution mode (see set_art_scale) images are
+# loaded at their native 16 px size, the world is drawn into a small surface and that is scaled up to the window once
+# per frame. simulation is unaffected either way: rects are always in world pixels.
+art_scale = 1
+
 # dimensions of screen, in tiles
 left_border_tiles = 0
 right_border_tiles = 0
@@ -20,13 +33,21 @@ total_vertical_width = top_border_tiles + vertical_tiles + bottom_border_tiles
 
 hud_top = (top_border_tiles + vertical_tiles) * tile_size
 
+# size of the map, in tiles. the room fills the screen, but generated levels can be any size (see set_map_size)
+map_size = (horizontal_tiles, vertical_tiles)
+
 
-clock = pygame.time.Clock()
 FRAMES_PER_SECOND = 30
 
+# sheds load when ticks run over budget. see governor.py
+governor = FrameGovernor(FRAMES_PER_SECOND)
+
+# metrics and gameplay events, written to disk in the background once started. see telemetry.py
+telemetry = Telemetry()
+
 
 #initialize all sprite groups
-obstacles = pygame.sprite.RenderPlain()
+obstacles = ObstacleGroup()  # see obstacle_grid.py
 floors = pygame.sprite.RenderPlain()
 player_group = pygame.sprite.RenderPlain()
 enemies = pygame.sprite.RenderPlain()
@@ -35,30 +56,133 @@ hazards = pygame.sprite.RenderPlain()
 player_weapons = pygame.sprite.RenderPlain()
 collectibles = pygame.sprite.RenderPlain() # should only be collectible by player
 hud_group = pygame.sprite.RenderPlain()
-statuses = pygame.sprite.RenderPlain()
 # new groups:
-groups = [obstacles, floors, player_group, player_weapons, enemies, enemy_weapons, hazards, collectibles, hud_group, statuses]
+groups = [obstacles, floors, player_group, player_weapons, enemies, enemy_weapons, hazards, collectibles, hud_group]
+
+# contacts between these groups are found once per tick, after movement. see collisions.py
+contacts = ContactList([
+    (player_group, hazards),
+    (player_group, enemies),
+    (player_group, enemy_weapons),
+    (player_group, player_weapons),
+    (player_group, collectibles),
+    (enemies, hazards),
+    (enemies, player_weapons),
+])
+
+# component stores and the systems that update them. stores are added by the mixins in sprite_mixins
+world = World()
 
 
 def get_player():
+    """
+    :return: the player's sprite, or None once the player has been killed
+    """
     if not player_group:
-        game_over()
-    else:
-        return [player for player in player_group][0] # I'm sorry
+        return None
+    return [player for player in player_group][0] # I'm sorry
+
+
+# (image name, sub path) -> surface. every load of the same image returns the same surface, so images must never be
+# drawn on. transform them (which makes a copy) instead.
+image_cache = {}
+image_cache_stats = {"hits": 0, "misses": 0}
+# held while looking up or filling the cache. images are also loaded on the room prefetch thread (see dungeon.py)
+image_cache_lock = threading.Lock()
+# held while a shared surface is transformed or read into a mask, since that locks it, and SDL won't blit from a locked
+# surface. the render thread holds it while drawing (see render_pipeline.py), so neither can catch the other mid-way
+surface_lock = threading.RLock()
+
+
+def set_art_scale(scale):
+    """
+    choose how many world pixels one image pixel covers. call before any images are loaded.
+    :param scale: (int) 1 for the 64 px art as is, 4 to draw at native 16 px resolution
+    :return: None
+    """
+    global art_scale
+    art_scale = scale
+    with image_cache_lock:
+        image_cache.clear()
+
+
+def get_art_scale():
+    """
+    :return: (int) world pixels per image pixel
+    """
+    return art_scale
+
+
+def set_map_size(width, height):
+    """
+    call whenever a map of a different size is built or loaded
+    :param width: (int)     in tiles
+    :param height: (int)    in tiles
+    :return: None
+    """
+    global map_size
+    map_size = (width, height)
+
+
+def get_map_size():
+    """
+    :return: (int, int) width and height of the current map, in tiles
+    """
+    return map_size
 
 
 def load_image(image_name, sub_path=None):
     """
     This function handles loading an image in pygame
+    images are loaded from disk once and shared after that
     :param image_name: (string) the name of an image in the resources folder
     :param sub_path: (string) path from resources folder to the folder the image is in. None if the image is in resources
-    :return: the image as a pygame image object
+    :return: the image as a pygame image object. shared; don't draw on it
+    """
+    key = (image_name, sub_path)
+    with image_cache_lock:
+        image = image_cache.get(key)
+        if image is not None:
+            image_cache_stats["hits"] += 1
+            return image
+        image_cache_stats["misses"] += 1
+        root_dir = os.path.dirname(__file__)
+        resources_dir = os.path.join(root_dir, "resources")
+        if sub_path:
+            resources_dir = os.path.join(resources_dir, sub_path)
+        image = pygame.image.load(os.path.join(resources_dir, image_name))
+        if art_scale > 1:
+            # the art was scaled up from its native size by pixel repetition, so nearest neighbour scaling recovers
+            # it exactly
+            width, height = image.get_size()
+            image = pygame.transform.scale(image, (max(1, width // art_scale), max(1, height // art_scale)))
+        image_cache[key] = image
+        return image
+
+
+def image_rect(image):
+    """
+    use instead of image.get_rect() for anything in the world
+    :param image: (pygame image)
+    :return: (Rect) rect at the origin covering the image, in world pixels
+    """
+    width, height = image.get_size()
+    return pygame.Rect(0, 0, width * art_scale, height * art_scale)
+
+
+def render_position(rect):
+    """
+    :param rect: (Rect) rect in world pixels
+    :return: (int, int) where its top left corner is on the render target
+    """
+    return rect.x // art_scale, rect.y // art_scale
+
+
+def render_size(world_width, world_height):
+    """
+    :return: (int, int) size of the render target for a world of the given size in world pixels
     """
-    root_dir = os.path.dirname(__file__)
-    resources_dir = os.path.join(root_dir, "resources")
-    if sub_path:
-        resources_dir = os.path.join(resources_dir, sub_path)
-    return pygame.image.load(os.path.join(resources_dir, image_name))
+    return world_width // art_scale, world_height // art_scale
 
 
 def get_center_pixel(x_tile, y_tile):
@@ -84,4 +208,11 @@ def get_tile_from_pixel(x_pixel, y_pixel):
     return x_tile, y_tile
 
 
+# which tiles are walls, for movement and line of sight. see obstacle_grid.py
+obstacle_grid = ObstacleGrid(obstacles, tile_size, (left_border_tiles * tile_size, top_border_tiles * tile_size))
+
+# whether enemies can see each other or the player past the walls. see line_of_sight.py
+sight = LineOfSight(obstacle_grid)
+
+
 
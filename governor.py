@@ -0,0 +1,146 @@
+"""
+frame-time governor.
+watches how long each tick takes and, when ticks keep running over budget, sheds load one level at a time.
+levels are cumulative (level 3 also does everything levels 1 and 2 do):
+    0   normal
+    1   animations advance at a lower rate
+    2   cosmetic status overlays aren't drawn
+    3   new spawns are capped per type
+    4   distant enemies only update their AI every few ticks
+when ticks keep coming in well under budget, it steps back down one level at a time.
+"""
+
+from collections import Counter
+
+LEVEL_NAMES = ["normal", "slow animations", "no status overlays", "spawn caps", "throttled ai"]
+SLOW_ANIMATIONS = 1
+NO_STATUS_OVERLAYS = 2
+SPAWN_CAPS = 3
+THROTTLED_AI = 4
+MAX_LEVEL = THROTTLED_AI
+
+
+class FrameGovernor:
+    """
+    tracks tick times and exposes the current degradation level.
+    the game asks it questions (should this animate? may this spawn?) rather than reading the level directly.
+    """
+    def __init__(self, frames_per_second, raise_after=10, lower_after=90, headroom=0.7,
+                 animation_divisor=2, spawn_cap=50, ai_interval=4, ai_near_distance=384):
+        """
+        :param frames_per_second: (int)     target frame rate. the tick budget is derived from it
+        :param raise_after: (int)           consecutive over-budget ticks before shedding another level
+        :param lower_after: (int)           consecutive ticks with headroom before recovering a level
+        :param headroom: (float)            fraction of the budget a tick must stay under to count as having headroom
+        :param animation_divisor: (int)     at SLOW_ANIMATIONS, animations advance once every this many ticks
+        :param spawn_cap: (int)             at SPAWN_CAPS, max live sprites of any one type
+        :param ai_interval: (int)           at THROTTLED_AI, distant enemies update their AI once every this many ticks
+        :param ai_near_distance: (int)      enemies within this many pixels of the player are never throttled
+        """
+        self.budget_ms = 1000 / frames_per_second
+        self.raise_after = raise_after
+        self.lower_after = lower_after
+        self.headroom = headroom
+        self.animation_divisor = animation_divisor
+        self.spawn_cap = spawn_cap
+        self.ai_interval = ai_interval
+        self.ai_near_distance = ai_near_distance
+
+        self.enabled = True
+        self.level = 0
+        self.tick = 0
+        self.last_tick_ms = 0
+        self.over_budget_streak = 0
+        self.headroom_streak = 0
+        self.level_changes = 0
+        self.population = Counter()  # sprite type name -> live count, only maintained at SPAWN_CAPS
+
+    def record_tick(self, tick_ms, groups):
+        """
+        call once per tick with the time the last tick's work took (not counting time spent sleeping)
+        :param tick_ms: (int)           milliseconds of work in the last tick, e.g. from Clock.get_rawtime()
+        :param groups: (list)           all sprite groups (and any other collections of live entities),
+                                        used to count populations when spawns are capped
+        :return: None
+        """
+        self.tick += 1
+        self.last_tick_ms = tick_ms
+        if not self.enabled:
+            return
+
+        if tick_ms > self.budget_ms:
+            self.over_budget_streak += 1
+            self.headroom_streak = 0
+            if self.over_budget_streak >= self.raise_after and self.level < MAX_LEVEL:
+                self.set_level(self.level + 1)
+        elif tick_ms < self.budget_ms * self.headroom:
+            self.headroom_streak += 1
+            self.over_budget_streak = 0
+            if self.headroom_streak >= self.lower_after and self.level > 0:
+                self.set_level(self.level - 1)
+        else:
+            self.over_budget_streak = 0
+            self.headroom_streak = 0
+
+        if self.level >= SPAWN_CAPS:
+            self.population = Counter(type(sprite).__name__ for group in groups for sprite in group)
+
+    def set_level(self, level):
+        """
+        :param level: (int) degradation level to switch to
+        :return: None
+        """
+        self.level = level
+        self.over_budget_streak = 0
+        self.headroom_streak = 0
+        self.level_changes += 1
+
+    def should_animate(self):
+        """
+        :return: (boolean) whether animations should advance a frame this tick
+        """
+        return self.level < SLOW_ANIMATIONS or self.tick % self.animation_divisor == 0
+
+    def should_draw_status_overlays(self):
+        """
+        :return: (boolean) whether cosmetic status images should be drawn
+        """
+        return self.level < NO_STATUS_OVERLAYS
+
+    def allow_spawn(self, sprite_type):
+        """
+        ask before spawning anything that isn't essential. counts the spawn if it is allowed.
+        :param sprite_type: (class) type of sprite about to be spawned
+        :return: (boolean) whether the sprite may be spawned
+        """
+        if self.level < SPAWN_CAPS:
+            return True
+        name = sprite_type.__name__
+        if self.population[name] >= self.spawn_cap:
+            return False
+        self.population[name] += 1
+        return True
+
+    def should_update_ai(self, position, target):
+        """
+        :param position: (int, int)     pixel position of the enemy
+        :param target: (int, int)       pixel position of what the enemy is going after (usually the player)
+        :return: (boolean) whether the enemy should recompute its decisions this tick
+        """
+        if self.level < THROTTLED_AI or self.tick % self.ai_interval == 0:
+            return True
+        dx = position[0] - target[0]
+        dy = position[1] - target[1]
+        return dx*dx + dy*dy <= self.ai_near_distance * self.ai_near_distance
+
+    def stats(self):
+        """
+        :return: (dict) current state, for telemetry
+        """
+        return {
+            "level": self.level,
+            "level_name": LEVEL_NAMES[self.level],
+            "last_tick_ms": self.last_tick_ms,
+            "budget_ms": self.budget_ms,
+            "level_changes": self.level_changes,
+        }
@@ -0,0 +1,201 @@
+"""
+allocation tracking and leak detection, for long sessions that shouldn't creep in memory.
+every few ticks it samples:
+    allocations     tracemalloc snapshot compared with the previous sample, net bytes per tick bucketed by the
+                    module and function that allocated them
+    populations     live sprites per class (and statuses per class), with their memory from memory_report
+    leaks           sprites that have been killed (are in no group) but are still referenced from somewhere,
+                    statuses whose victim is dead, and statuses that will effectively never expire
+anything whose population or allocated memory grew in every one of the last few samples is flagged as growing.
+tracing allocations slows everything down, so this is an instrumentation mode (run_game.py --track-allocations).
+"""
+
+import ast
+import gc
+import sys
+import tracemalloc
+from collections import Counter, deque
+
+import pygame
+
+from memory_report import MemoryReport
+
+
+class FunctionIndex:
+    """
+    names the function containing a line of source, e.g. 'sprite_mixins.movement_system'
+    """
+    def __init__(self):
+        self.files = {}  # filename -> list of (first line, last line, name), innermost last
+
+    def name(self, filename, lineno):
+        functions = self.files.get(filename)
+        if functions is None:
+            functions = self.files[filename] = self.parse(filename)
+        module = filename.replace("\\", "/").rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        for first, last, function in reversed(functions):
+            if first <= lineno <= last:
+                return module + "." + function
+        return module + ".<module>"
+
+    @staticmethod
+    def parse(filename):
+        try:
+            with open(filename) as source:
+                tree = ast.parse(source.read())
+        except (OSError, SyntaxError, ValueError):
+            return []
+        functions = []
+
+        def visit(node, prefix):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    name = prefix + child.name
+                    if not isinstance(child, ast.ClassDef):
+                        functions.append((child.lineno, child.end_lineno, name))
+                    visit(child, name + ".")
+                else:
+                    visit(child, prefix)
+        visit(tree, "")
+        # sorted so that nested functions come after the functions containing them
+        functions.sort(key=lambda function: (function[0], -function[1]))
+        return functions
+
+
+class LeakTracker:
+    """
+    samples allocations and populations every interval ticks. see the module docstring
+    """
+    def __init__(self, interval=30, window=10, permanent_after=30 * 60 * 60 * 24):
+        """
+        :param interval: (int)          ticks between samples
+        :param window: (int)            samples in a row something must grow in to be flagged
+        :param permanent_after: (int)   statuses with more ticks than this left are reported as never expiring
+        """
+        self.interval = interval
+        self.window = window
+        self.permanent_after = permanent_after
+        self.functions = FunctionIndex()
+        self.population_history = {}    # class name -> recent live counts
+        self.allocation_history = {}    # function -> recent net bytes allocated per tick
+        self.last = {}                  # most recent sample, for the report
+        tracemalloc.start()
+        self.previous_snapshot = self.take_snapshot()
+
+    @staticmethod
+    def take_snapshot():
+        # the tracker's own bookkeeping isn't the game's
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, sys.modules[MemoryReport.__module__].__file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+
+    def sample(self, groups, statuses, stores, image_cache):
+        """
+        call every interval ticks, between ticks
+        :param groups: (list(Group))            every sprite group
+        :param statuses: (list(Status))         every live status
+        :param stores: (list(ComponentStore))   every component store, for memory by class
+        :param image_cache: (dict)              loaded images, for memory by class
+        :return: None
+        """
+        snapshot = self.take_snapshot()
+        allocations = Counter()
+        for stat in snapshot.compare_to(self.previous_snapshot, 'lineno'):
+            frame = stat.traceback[0]
+            allocations[self.functions.name(frame.filename, frame.lineno)] += stat.size_diff / self.interval
+        self.previous_snapshot = snapshot
+        for function, per_tick in allocations.items():
+            self.allocation_history.setdefault(function, deque(maxlen=self.window)).append(per_tick)
+
+        memory = MemoryReport(groups, stores, image_cache).entities
+        populations = Counter({name: count for name, (count, _) in memory.items()})
+        populations.update(type(status).__name__ for status in statuses)
+        for name in set(populations) | set(self.population_history):
+            self.population_history.setdefault(name, deque(maxlen=self.window)).append(populations[name])
+
+        self.last = {
+            "allocations": allocations,
+            "populations": populations,
+            "memory": {name: total for name, (_, total) in memory.items()},
+            "orphaned_statuses": Counter(type(status).__name__ for status in statuses
+                                         if not status.victim_sprite.alive()),
+            "permanent_statuses": Counter("{} on {}".format(type(status).__name__, type(status.victim_sprite).__name__)
+                                          for status in statuses if status.remaining_time > self.permanent_after),
+            "killed_but_referenced": self.killed_but_referenced(groups, stores),
+        }
+
+    def killed_but_referenced(self, groups, stores):
+        """
+        :return: (Counter) (class name, what refers to it) -> number of sprites that are in no group but still
+                            haven't been garbage collected
+        """
+        gc.collect()
+        killed = [obj for obj in gc.get_objects() if isinstance(obj, pygame.sprite.Sprite) and not obj.alive()]
+        owners = {}  # id of an attribute dict or module dict -> what it belongs to
+        for group in groups:
+            for sprite in group:
+                owners[id(vars(sprite))] = type(sprite).__name__
+        for sprite in killed:
+            owners[id(vars(sprite))] = "dead " + type(sprite).__name__
+        for store in stores:
+            # sprites stay in their stores until the next tick's remove_dead
+            owners[id(store.slots)] = "{} component store".format(store.name)
+        for name, module in list(sys.modules.items()):
+            owners[id(getattr(module, '__dict__', None))] = "module " + name
+
+        found = Counter()
+        ignore = {id(killed), id(sys._getframe())}
+        for sprite in killed:
+            for referrer in gc.get_referrers(sprite):
+                if id(referrer) in ignore:
+                    continue
+                if isinstance(referrer, dict):
+                    description = owners.get(id(referrer), "dict")
+                else:
+                    description = type(referrer).__name__
+                found[(type(sprite).__name__, description)] += 1
+        del killed
+        return found
+
+    def growing(self):
+        """
+        :return: (list(string), list(string)) classes whose population, and functions whose net allocations,
+                                                grew in each of the last window samples
+        """
+        populations = [name for name, history in self.population_history.items()
+                       if len(history) == self.window and all(a < b for a, b in zip(history, list(history)[1:]))]
+        allocations = [function for function, history in self.allocation_history.items()
+                       if len(history) == self.window and all(per_tick > 0 for per_tick in history)]
+        return populations, allocations
+
+    def report(self, out=None, top=10):
+        """
+        print the last sample and anything flagged as growing
+        :param out: file to write to. defaults to stderr
+        :param top: (int) number of functions to list by allocations
+        :return: None
+        """
+        out = out or sys.stderr
+        if not self.last:
+            return
+        allocations = self.last["allocations"]
+        for function, per_tick in sorted(allocations.items(), key=lambda item: -abs(item[1]))[:top]:
+            out.write("alloc: {:<48} {:+10.0f} B/tick\n".format(function, per_tick))
+        for name, count in sorted(self.last["populations"].items()):
+            out.write("alloc: live {:<24} {:6d}  {:10d} B\n".format(name, count, self.last["memory"].get(name, 0)))
+        for name, count in sorted(self.last["orphaned_statuses"].items()):
+            out.write("alloc: orphaned status {:<24} {:6d}\n".format(name, count))
+        for name, count in sorted(self.last["permanent_statuses"].items()):
+            out.write("alloc: never-expiring status {:<32} {:6d}\n".format(name, count))
+        for (name, referrer), count in sorted(self.last["killed_but_referenced"].items()):
+            out.write("alloc: killed {} still referenced from {}: {}\n".format(name, referrer, count))
+        populations, functions = self.growing()
+        for name in populations:
+            out.write("alloc: GROWING population of {} over the last {} samples: {}\n".format(
+                name, self.window, list(self.population_history[name])))
+        for function in functions:
+            out.write("alloc: GROWING memory allocated by {} over the last {} samples\n".format(function, self.window))
+        out.flush()
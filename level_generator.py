@@ -0,0 +1,187 @@
+"""
+procedural levels.
+generates tile maps of any size from a seed, either rooms joined by corridors or cellular automaton caves, and
+scatters entities over the floor by density. everything is done with whole-array NumPy operations (the only Python
+loops are over rooms, never over tiles), so a 1000x1000 map takes a fraction of a second.
+
+a level is just arrays and lists; run_game.initialize_level and spawn_level turn it into sprites.
+
+    python level_generator.py [WIDTH HEIGHT [SEED]]     time generating a level and print what's in it
+
+this module doesn't import pygame.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+WALL = 1
+FLOOR = 0
+
+# entity type -> expected number spawned per floor tile. they must add up to at most 1
+DEFAULT_DENSITIES = {
+    'Goblin': 0.004,
+    'Chaser': 0.002,
+    'Archer': 0.002,
+    'Fire': 0.003,
+    'Heart': 0.001,
+    'HastePotion': 0.0005,
+}
+
+# nothing spawns this close (in tiles, on either axis) to the player
+SAFE_RADIUS = 3
+
+
+class Level:
+    """
+    a generated map and what's in it
+    """
+    def __init__(self, tiles, spawns, player_tile):
+        """
+        :param tiles: (ndarray)             uint8 WALL or FLOOR per tile, indexed [y, x]
+        :param spawns: (dict)               entity type -> list of (x, y) tiles
+        :param player_tile: (int, int)      where the player starts
+        """
+        self.tiles = tiles
+        self.spawns = spawns
+        self.player_tile = player_tile
+        self.height, self.width = tiles.shape
+
+    def floor_tiles(self):
+        """
+        :return: (list((int, int))) every floor tile
+        """
+        ys, xs = np.nonzero(self.tiles == FLOOR)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def wall_tiles(self):
+        """
+        :return: (list((int, int))) every wall tile next to a floor tile (diagonally counts). walls surrounded by
+                                    walls can't be reached or seen, so they don't need to exist
+        """
+        floor = np.pad(self.tiles == FLOOR, 1)
+        near_floor = np.zeros_like(self.tiles, dtype=bool)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                near_floor |= floor[dy:dy + self.height, dx:dx + self.width]
+        ys, xs = np.nonzero((self.tiles == WALL) & near_floor)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+
+def neighbour_walls(tiles):
+    """
+    :param tiles: (ndarray) WALL or FLOOR per tile
+    :return: (ndarray) number of walls among each tile's 8 neighbours. off the map counts as wall
+    """
+    height, width = tiles.shape
+    padded = np.pad(tiles, 1, constant_values=WALL)
+    count = np.zeros((height, width), dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy != 1 or dx != 1:
+                count += padded[dy:dy + height, dx:dx + width]
+    return count
+
+
+def caves(rng, width, height, fill=0.45, iterations=4):
+    """
+    cellular automaton caves: random noise, smoothed until walls clump together. some pockets may be cut off
+    :return: (ndarray) WALL or FLOOR per tile
+    """
+    tiles = (rng.random((height, width)) < fill).astype(np.uint8)
+    for _ in range(iterations):
+        count = neighbour_walls(tiles)
+        tiles = ((count >= 5) | ((tiles == WALL) & (count >= 4))).astype(np.uint8)
+    return tiles
+
+
+def rooms_and_corridors(rng, width, height, room_size=(4, 12), tiles_per_room=150):
+    """
+    rectangular rooms scattered over the map (overlapping ones merge), each joined to the next by an L shaped
+    corridor. rooms are visited in a snake through horizontal bands, so corridors stay short and every room is
+    reachable. rooms are shrunk to fit inside the outer wall of small maps
+    :return: (ndarray) WALL or FLOOR per tile
+    """
+    tiles = np.full((height, width), WALL, dtype=np.uint8)
+    count = max(1, width * height // tiles_per_room)
+    smallest, largest = room_size
+    room_widths = rng.integers(min(smallest, width - 2), min(largest, width - 2) + 1, count)
+    room_heights = rng.integers(min(smallest, height - 2), min(largest, height - 2) + 1, count)
+    lefts = rng.integers(1, width - room_widths)
+    tops = rng.integers(1, height - room_heights)
+    for left, top, room_width, room_height in zip(lefts.tolist(), tops.tolist(),
+                                                  room_widths.tolist(), room_heights.tolist()):
+        tiles[top:top + room_height, left:left + room_width] = FLOOR
+
+    x_centers = lefts + room_widths // 2
+    y_centers = tops + room_heights // 2
+    bands = y_centers // largest
+    order = np.lexsort((np.where(bands % 2 == 0, x_centers, -x_centers), bands))
+    x_centers, y_centers = x_centers[order].tolist(), y_centers[order].tolist()
+    for x1, y1, x2, y2 in zip(x_centers, y_centers, x_centers[1:], y_centers[1:]):
+        tiles[y1, min(x1, x2):max(x1, x2) + 1] = FLOOR
+        tiles[min(y1, y2):max(y1, y2) + 1, x2] = FLOOR
+    return tiles
+
+
+STYLES = {
+    'rooms': rooms_and_corridors,
+    'caves': caves,
+}
+
+
+def generate(width, height, seed=0, style='rooms', densities=None, player_near=None):
+    """
+    :param width: (int)             map width in tiles, including the outer wall
+    :param height: (int)            map height in tiles, including the outer wall
+    :param seed: (int)              the same seed always gives the same level
+    :param style: (string)          key in STYLES
+    :param densities: (dict)        entity type -> expected number per floor tile. defaults to DEFAULT_DENSITIES
+    :param player_near: (int, int)  tile the player should start as close as possible to. defaults to the middle
+    :return: (Level)
+    """
+    if width < 3 or height < 3:
+        raise ValueError("a level must be at least 3x3 tiles")
+    densities = DEFAULT_DENSITIES if densities is None else densities
+    if sum(densities.values()) > 1:
+        raise ValueError("entity densities add up to more than one per tile")
+    rng = np.random.default_rng(seed)
+    tiles = STYLES[style](rng, width, height)
+    tiles[0, :] = tiles[-1, :] = WALL
+    tiles[:, 0] = tiles[:, -1] = WALL
+
+    ys, xs = np.nonzero(tiles == FLOOR)
+    if not len(xs):
+        raise ValueError("level has no floor")
+    x_near, y_near = player_near if player_near is not None else (width // 2, height // 2)
+    nearest = int(np.argmin((xs - x_near) ** 2 + (ys - y_near) ** 2))
+    player_tile = (int(xs[nearest]), int(ys[nearest]))
+
+    # each floor tile gets at most one entity: one random number per tile, split into a range per entity type
+    roll = rng.random(len(xs))
+    roll[(np.abs(xs - player_tile[0]) <= SAFE_RADIUS) & (np.abs(ys - player_tile[1]) <= SAFE_RADIUS)] = 1
+    spawns = {}
+    low = 0.0
+    for entity_type, density in densities.items():
+        chosen = (roll >= low) & (roll < low + density)
+        spawns[entity_type] = list(zip(xs[chosen].tolist(), ys[chosen].tolist()))
+        low += density
+    return Level(tiles, spawns, player_tile)
+
+
+def main(argv):
+    width, height = (int(argv[0]), int(argv[1])) if len(argv) >= 2 else (1000, 1000)
+    seed = int(argv[2]) if len(argv) >= 3 else 0
+    for style in STYLES:
+        start = time.perf_counter()
+        level = generate(width, height, seed, style)
+        seconds = time.perf_counter() - start
+        floor = int(np.count_nonzero(level.tiles == FLOOR))
+        print("{} {}x{}: {:.0f} ms, {} floor tiles, {}".format(
+            style, width, height, seconds * 1000, floor,
+            ", ".join("{} {}".format(len(tiles), entity_type) for entity_type, tiles in level.spawns.items())))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,146 @@
+"""
+line of sight over the obstacle tile grid.
+rays are cast between tile centers with Bresenham's line algorithm, and a ray is clear when none of the tiles strictly
+between its ends is an obstacle. rays are symmetric (a sees b exactly when b sees a), so results are stored once per
+unordered pair of tiles.
+
+answers are remembered until the next tick, so any number of enemies asking about the same pair of tiles (e.g. every
+archer standing in a row asking about the player) cost one ray between them. for small static rooms a visibility
+table can be built up front instead, after which every question is a single lookup.
+
+walls come from the obstacle grid (see obstacle_grid.py), so only static obstacles block sight.
+"""
+
+# largest grid, in tiles, a visibility table is built for. the table takes a byte per pair of tiles and casting every
+# pair grows just as fast, so bigger grids (e.g. generated levels) fall back to the per-tick memo
+MAX_TABLE_CELLS = 1024
+
+
+def tile_line(start, end):
+    """
+    Bresenham's line between two tiles
+    :param start: (int, int)    first tile
+    :param end: (int, int)      last tile
+    :return: (list((int, int))) every tile on the line, from start to end inclusive
+    """
+    x, y = start
+    x_end, y_end = end
+    dx = abs(x_end - x)
+    dy = -abs(y_end - y)
+    x_step = 1 if x < x_end else -1
+    y_step = 1 if y < y_end else -1
+    error = dx + dy
+    tiles = [(x, y)]
+    while (x, y) != (x_end, y_end):
+        doubled = 2 * error
+        if doubled >= dy:
+            error += dy
+            x += x_step
+        if doubled <= dx:
+            error += dx
+            y += y_step
+        tiles.append((x, y))
+    return tiles
+
+
+class LineOfSight:
+    """
+    answers "is there a wall between these two tiles" for the current tick
+    """
+    def __init__(self, grid, precompute=False):
+        """
+        :param grid: (ObstacleGrid)     the walls. dynamic obstacles don't block sight
+        :param precompute: (boolean)    build a visibility table for every pair of open tiles whenever the grid is
+                                        rebuilt. worthwhile for small rooms with many observers. grids of more than
+                                        MAX_TABLE_CELLS tiles get no table
+        """
+        self.grid = grid
+        self.precompute = precompute
+        self.grid_version = None    # version of the grid the table and memo were made for
+        self.table = None           # bytearray, visibility of (tile a, tile b) at a * cells + b, or None
+        self.memo = {}              # (tile, tile) -> boolean, this tick's answers
+        # counters since the last next_tick, for profiling
+        self.queries = 0
+        self.rays = 0
+
+    def next_tick(self):
+        """
+        forget this tick's answers. call once at the start of every tick
+        :return: None
+        """
+        self.memo = {}
+        self.queries = self.rays = 0
+
+    def refresh(self):
+        """
+        make sure the grid is built, and forget anything worked out for an older grid
+        :return: None
+        """
+        self.grid.ensure_built()
+        if self.grid_version == self.grid.version:
+            return
+        self.grid_version = self.grid.version
+        self.memo = {}
+        self.table = None
+        if self.precompute and self.grid.width * self.grid.height <= MAX_TABLE_CELLS:
+            self.build_table()
+
+    def build_table(self):
+        """
+        cast a ray between every pair of open tiles
+        :return: None
+        """
+        grid = self.grid
+        width, cells = grid.width, grid.width * grid.height
+        table = bytearray(cells * cells)
+        open_tiles = [(index % width, index // width) for index in range(cells) if not grid.blocked[index]]
+        for position, a in enumerate(open_tiles):
+            index_a = a[1] * width + a[0]
+            for b in open_tiles[position:]:
+                index_b = b[1] * width + b[0]
+                table[index_a * cells + index_b] = table[index_b * cells + index_a] = self.cast(a, b)
+        self.table = table
+
+    def cast(self, a, b):
+        """
+        :return: (boolean) whether no tile strictly between a and b is a wall
+        """
+        self.rays += 1
+        if b < a:
+            a, b = b, a  # the same ray whichever end it's cast from
+        is_blocked = self.grid.is_blocked
+        return not any(is_blocked(tile) for tile in tile_line(a, b)[1:-1])
+
+    def clear_between_tiles(self, a, b):
+        """
+        :param a: (int, int)    one tile
+        :param b: (int, int)    another tile
+        :return: (boolean)      whether a straight line between their centers crosses no wall
+        """
+        self.refresh()
+        self.queries += 1
+        grid = self.grid
+        if self.table is not None:
+            width, height = grid.width, grid.height
+            if 0 <= a[0] < width and 0 <= a[1] < height and 0 <= b[0] < width and 0 <= b[1] < height:
+                if not grid.is_blocked(a) and not grid.is_blocked(b):
+                    return self.table[(a[1] * width + a[0]) * width * height + b[1] * width + b[0]] == 1
+        key = (a, b) if a <= b else (b, a)
+        visible = self.memo.get(key)
+        if visible is None:
+            visible = self.memo[key] = self.cast(a, b)
+        return visible
+
+    def clear(self, pixel_a, pixel_b):
+        """
+        :param pixel_a: (int, int)  a point in the world, e.g. an enemy's center
+        :param pixel_b: (int, int)  another point, e.g. the player's center
+        :return: (boolean)          whether no wall lies between the tiles they're in
+        """
+        return self.clear_between_tiles(self.grid.tile_of(*pixel_a), self.grid.tile_of(*pixel_b))
+
+    def stats(self):
+        """
+        :return: (dict) this tick's counters
+        """
+        return {"queries": self.queries, "rays": self.rays}
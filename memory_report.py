@@ -0,0 +1,116 @@
+"""
+memory report.
+breaks down memory held by live entities by entity type, and memory held by surfaces by image.
+entity sizes are the sprite object, its attribute dict and rect, and its rows in the component stores.
+surfaces are counted once however many sprites share them, so a room full of tiles sharing two images costs
+two images, not one per tile.
+"""
+
+import sys
+
+import pygame
+
+
+def surface_bytes(surface):
+    """
+    :return: (int) bytes of pixel data in the surface
+    """
+    return surface.get_pitch() * surface.get_height()
+
+
+def object_bytes(value):
+    """
+    :return: (int) size of a field value. surfaces, sprites and groups are accounted for elsewhere
+    """
+    if value is None or isinstance(value, (pygame.Surface, pygame.sprite.Sprite, pygame.sprite.AbstractGroup)):
+        return 0
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set)):
+        size += sum(object_bytes(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(object_bytes(item) for item in value.values())
+    return size
+
+
+class MemoryReport:
+    """
+    memory by entity type and by surface, measured once when created
+    """
+    def __init__(self, groups, stores, image_cache):
+        """
+        :param groups: (list(Group))            every sprite group
+        :param stores: (list(ComponentStore))   every component store
+        :param image_cache: (dict)              (image name, sub path) -> surface, for naming surfaces
+        """
+        self.entities = {}  # type name -> [count, bytes]
+        self.surfaces = {}  # id(surface) -> [name, sprites using it, bytes]
+        image_names = {id(surface): name if not sub_path else sub_path + "/" + name
+                       for (name, sub_path), surface in image_cache.items()}
+        for surface in image_cache.values():
+            self.add_surface(surface, image_names, None)
+
+        seen = set()
+        for group in groups:
+            for sprite in group:
+                if sprite in seen:
+                    continue
+                seen.add(sprite)
+                name = type(sprite).__name__
+                size = sys.getsizeof(sprite) + sys.getsizeof(vars(sprite)) + sys.getsizeof(sprite.rect)
+                size += sum(object_bytes(value) for value in vars(sprite).values())
+                for store in stores:
+                    slot = store.slots.get(sprite)
+                    if slot is None:
+                        continue
+                    for field, column in store.columns.items():
+                        value = column[slot]
+                        if store.fields[field]:
+                            size += column.itemsize
+                        else:
+                            size += object_bytes(value)
+                            if isinstance(value, pygame.Surface):
+                                self.add_surface(value, image_names, name)
+                if getattr(sprite, 'image', None) is not None:
+                    self.add_surface(sprite.image, image_names, name)
+                count, total = self.entities.get(name, (0, 0))
+                self.entities[name] = [count + 1, total + size]
+
+    def add_surface(self, surface, image_names, user):
+        """
+        :param surface: (Surface)
+        :param image_names: (dict)  id(surface) -> image name
+        :param user: (string)       type name of the sprite using it, or None
+        :return: None
+        """
+        record = self.surfaces.get(id(surface))
+        if record is None:
+            name = image_names.get(id(surface), "{} (transformed)".format(user))
+            record = self.surfaces[id(surface)] = [name, 0, surface_bytes(surface)]
+        if user:
+            record[1] += 1
+
+    def entity_bytes(self):
+        return sum(total for _, total in self.entities.values())
+
+    def surface_bytes(self):
+        return sum(size for _, _, size in self.surfaces.values())
+
+    def report(self, out=None):
+        """
+        print memory by entity type then by surface, largest first
+        :param out: file to write to. defaults to stderr
+        :return: None
+        """
+        out = out or sys.stderr
+        for name, (count, total) in sorted(self.entities.items(), key=lambda item: -item[1][1]):
+            out.write("memory: entity  {:<24} {:6d} x {:6.0f} B = {:10d} B\n".format(name, count, total / count, total))
+        out.write("memory: entities total {:>45d} B\n".format(self.entity_bytes()))
+        # transformed surfaces (rotations etc.) that are each used once are summed into one line per type
+        lines = {}
+        for name, users, size in self.surfaces.values():
+            count, user_count, total = lines.get(name, (0, 0, 0))
+            lines[name] = (count + 1, user_count + users, total + size)
+        for name, (count, users, total) in sorted(lines.items(), key=lambda item: -item[1][2]):
+            out.write("memory: surface {:<32} {:4d} surfaces, {:6d} users {:10d} B\n".format(name, count, users, total))
+        out.write("memory: surfaces total {:>45d} B\n".format(self.surface_bytes()))
+        out.flush()
@@ -0,0 +1,411 @@
+"""
+authoritative server and thin client.
+the server runs the simulation and, every tick, sends each client a snapshot of the world delta-compressed against
+the last snapshot that client acknowledged. clients only draw what they're sent, and send back their input.
+
+messages are length-prefixed (4 byte little-endian length, then the body).
+server -> client body:
+    header      tick (u32), baseline tick (u32, 0 for none), changed count (u16), removed count (u16)
+    changed     one entity record per changed or new entity
+    removed     entity id (u32) per entity that no longer exists
+entity record:
+    id (u32), type (u8), x (i32), y (i32), angle (i16), frame (u8), health (i16)
+    positions are pixel centers, angles are whole degrees of rotation from the sprite's base image,
+    frame is the animation frame (or image variant, e.g. which way a sword faces)
+client -> server body:
+    acknowledged tick (u32), input bits (u16, see player_input)
+"""
+
+import socket
+import struct
+import time
+
+from game_model import image_rect, load_image, render_position
+from sprite_classes import ENTITY_IMAGES
+from sprite_mixins import rotated_image
+
+LENGTH = struct.Struct('<I')
+SNAPSHOT_HEADER = struct.Struct('<IIHH')
+ENTITY = struct.Struct('<IBiihBh')
+REMOVED = struct.Struct('<I')
+CLIENT_INPUT = struct.Struct('<IH')
+# most changed or removed entities one message can hold, since their counts are u16
+MAX_COUNT = 0xFFFF
+
+# in drawing order. only append, codes are sent over the wire
+ENTITY_TYPES = ['StaticTile', 'Fire', 'PlayerSprite', 'Sword', 'Shield', 'Boomerang', 'Arrow', 'Bow', 'FireRod', 'IceRod',
+                'Goblin', 'Chaser', 'Archer', 'Heart', 'HastePotion']
+TYPE_CODES = {name: code for code, name in enumerate(ENTITY_TYPES)}
+DIRECTIONS = ['right', 'up', 'left', 'down']
+
+# snapshots kept per client for use as baselines. a client that falls further behind than this gets a full snapshot
+HISTORY_LENGTH = 64
+
+
+def capture_snapshot(groups, entity_ids):
+    """
+    :param groups: (list(Group))        every sprite group
+    :param entity_ids: (EntityIds)      gives each sprite a stable id
+    :return: (dict) entity id -> (type, x, y, angle, frame, health) for every sprite of a known type
+    """
+    snapshot = {}
+    seen = set()
+    for group in groups:
+        for sprite in group:
+            type_code = TYPE_CODES.get(type(sprite).__name__)
+            if type_code is None or sprite in seen:
+                continue
+            seen.add(sprite)
+            if type_code == TYPE_CODES['StaticTile']:
+                frame = 1 if sprite in groups[0] else 0  # walls are frame 1, floors frame 0
+            elif type_code == TYPE_CODES['Sword']:
+                frame = DIRECTIONS.index(sprite.orientation)
+            else:
+                frame = getattr(sprite, 'current_frame', 0)
+            angle = getattr(sprite, 'current_angle', 0) - getattr(sprite, 'initial_angle', 0)
+            x, y = sprite.rect.center
+            snapshot[entity_ids.get(sprite)] = (type_code, int(x), int(y), int(angle) % 360, frame,
+                                                getattr(sprite, 'health', 0))
+    entity_ids.forget_all_but(seen)
+    return snapshot
+
+
+class EntityIds:
+    """
+    stable ids for sprites, for as long as they're alive
+    """
+    def __init__(self):
+        self.ids = {}
+        self.next_id = 1
+
+    def get(self, sprite):
+        entity_id = self.ids.get(sprite)
+        if entity_id is None:
+            entity_id = self.ids[sprite] = self.next_id
+            self.next_id += 1
+        return entity_id
+
+    def forget_all_but(self, live):
+        """
+        :param live: (set(sprite)) sprites to keep ids for
+        :return: None
+        """
+        if len(live) != len(self.ids):
+            self.ids = {sprite: entity_id for sprite, entity_id in self.ids.items() if sprite in live}
+
+
+def encode_delta(tick, baseline_tick, baseline, snapshot, byte_budget):
+    """
+    :param tick: (int)              tick of the snapshot
+    :param baseline_tick: (int)     tick of the baseline, 0 for none
+    :param baseline: (dict)         what the client had at baseline_tick
+    :param snapshot: (dict)         the world now
+    :param byte_budget: (int)       max message size. changes that don't fit are left for a later message
+    :return: (bytes, dict)          the message body, and what the client will have after applying it
+    """
+    # removals that don't fit stay in the view, so they're sent again in a later message
+    room = max(byte_budget - SNAPSHOT_HEADER.size, 0)
+    removed = [entity_id for entity_id in baseline if entity_id not in snapshot]
+    del removed[min(room // REMOVED.size, MAX_COUNT):]
+    view = dict(baseline)
+    for entity_id in removed:
+        del view[entity_id]
+
+    room = min((room - REMOVED.size * len(removed)) // ENTITY.size, MAX_COUNT)
+    changed = []
+    for entity_id, record in snapshot.items():
+        if baseline.get(entity_id) != record:
+            if len(changed) >= room:
+                break
+            changed.append(ENTITY.pack(entity_id, *record))
+            view[entity_id] = record
+
+    body = b''.join([SNAPSHOT_HEADER.pack(tick, baseline_tick, len(changed), len(removed))] + changed
+                    + [REMOVED.pack(entity_id) for entity_id in removed])
+    return body, view
+
+
+def decode_delta(body, views):
+    """
+    :param body: (bytes)    message body from encode_delta
+    :param views: (dict)    tick -> what this client had at that tick
+    :return: (int, dict)    the message's tick, and what the client has after applying it
+    """
+    tick, baseline_tick, changed_count, removed_count = SNAPSHOT_HEADER.unpack_from(body, 0)
+    view = dict(views.get(baseline_tick, {})) if baseline_tick else {}
+    offset = SNAPSHOT_HEADER.size
+    for _ in range(changed_count):
+        entity_id, *record = ENTITY.unpack_from(body, offset)
+        view[entity_id] = tuple(record)
+        offset += ENTITY.size
+    for _ in range(removed_count):
+        (entity_id,) = REMOVED.unpack_from(body, offset)
+        view.pop(entity_id, None)
+        offset += REMOVED.size
+    return tick, view
+
+
+class Connection:
+    """
+    non-blocking socket that sends and receives length-prefixed messages
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+        if sock.family != socket.AF_UNIX:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.closed = False
+
+    def send(self, body):
+        """
+        queue a message and send as much as the socket will take
+        :param body: (bytes)
+        :return: None
+        """
+        self.outgoing += LENGTH.pack(len(body)) + body
+        self.flush()
+
+    def flush(self):
+        try:
+            while self.outgoing:
+                sent = self.sock.send(self.outgoing)
+                del self.outgoing[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.closed = True
+
+    def receive(self):
+        """
+        :return: (list(bytes)) every complete message that has arrived
+        """
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    self.closed = True
+                    break
+                self.incoming += data
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.closed = True
+
+        messages = []
+        while len(self.incoming) >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(self.incoming, 0)
+            if len(self.incoming) < LENGTH.size + length:
+                break
+            messages.append(bytes(self.incoming[LENGTH.size:LENGTH.size + length]))
+            del self.incoming[:LENGTH.size + length]
+        return messages
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+
+
+class ClientSession:
+    """
+    the server's side of one client: what it has been sent, what it has acknowledged, and bandwidth stats
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.views = {}         # tick -> what the client has after the message for that tick
+        self.acked_tick = 0
+        self.input_bits = 0
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.peak_bytes = 0
+        self.send_ms = 0.0      # time spent encoding and sending to this client, summed
+
+
+class Server:
+    """
+    sends world snapshots to clients and collects their input
+    """
+    def __init__(self, listener=None, max_clients=4, byte_budget=16384):
+        """
+        :param listener: (socket)       listening socket to accept clients from. None to only use add_connection
+        :param max_clients: (int)       connections past this are refused
+        :param byte_budget: (int)       max bytes sent to one client per tick
+        """
+        self.listener = listener
+        if listener:
+            listener.setblocking(False)
+        self.max_clients = max_clients
+        self.byte_budget = byte_budget
+        self.clients = []
+        self.entity_ids = EntityIds()
+        self.capture_ms = 0.0
+
+    def add_connection(self, sock):
+        """
+        :param sock: (socket) connected socket for a new client
+        :return: (ClientSession) or None if the server is full
+        """
+        if len(self.clients) >= self.max_clients:
+            sock.close()
+            return None
+        session = ClientSession(Connection(sock))
+        self.clients.append(session)
+        return session
+
+    def accept(self):
+        """
+        accept any clients waiting to connect
+        :return: None
+        """
+        if not self.listener:
+            return
+        try:
+            while True:
+                sock, _ = self.listener.accept()
+                self.add_connection(sock)
+        except BlockingIOError:
+            pass
+
+    def receive_inputs(self):
+        """
+        reads acknowledgements and input from every client, dropping closed connections
+        :return: (int) input bits of the first client (who controls the player), 0 if nobody is connected
+        """
+        for session in self.clients:
+            for body in session.connection.receive():
+                acked_tick, session.input_bits = CLIENT_INPUT.unpack(body)
+                if acked_tick in session.views:
+                    session.acked_tick = acked_tick
+                    for tick in [tick for tick in session.views if tick < acked_tick]:
+                        del session.views[tick]
+        self.clients = [session for session in self.clients if not session.connection.closed]
+        return self.clients[0].input_bits if self.clients else 0
+
+    def broadcast(self, tick, groups):
+        """
+        capture the world once and send each client its delta
+        :param tick: (int)              current tick, starting from 1
+        :param groups: (list(Group))    every sprite group
+        :return: None
+        """
+        capture_start = time.perf_counter()
+        snapshot = capture_snapshot(groups, self.entity_ids)
+        self.capture_ms = (time.perf_counter() - capture_start) * 1000
+        for session in self.clients:
+            send_start = time.perf_counter()
+            baseline_tick = session.acked_tick if session.acked_tick in session.views else 0
+            baseline = session.views.get(baseline_tick, {})
+            body, view = encode_delta(tick, baseline_tick, baseline, snapshot, self.byte_budget)
+            session.views[tick] = view
+            if len(session.views) > HISTORY_LENGTH:
+                del session.views[min(session.views)]
+            session.connection.send(body)
+            session.bytes_sent += len(body) + LENGTH.size
+            session.messages_sent += 1
+            session.peak_bytes = max(session.peak_bytes, len(body) + LENGTH.size)
+            session.send_ms += (time.perf_counter() - send_start) * 1000
+
+    def stats(self):
+        """
+        :return: (list(dict)) bandwidth and time per client
+        """
+        return [{
+            "client": index,
+            "acked_tick": session.acked_tick,
+            "bytes_per_tick": session.bytes_sent / max(session.messages_sent, 1),
+            "peak_bytes": session.peak_bytes,
+            "send_ms_per_tick": session.send_ms / max(session.messages_sent, 1),
+            "capture_ms": self.capture_ms,
+        } for index, session in enumerate(self.clients)]
+
+
+class Client:
+    """
+    keeps the latest world view sent by the server and draws it
+    """
+    def __init__(self, sock):
+        self.connection = Connection(sock)
+        self.views = {}
+        self.tick = 0
+        self.view = {}
+        self.images = {}  # (type, frame) -> image
+
+    def receive(self):
+        """
+        apply every snapshot that has arrived
+        :return: (boolean) false once the server has gone away
+        """
+        for body in self.connection.receive():
+            self.tick, self.view = decode_delta(body, self.views)
+            self.views[self.tick] = self.view
+            if len(self.views) > HISTORY_LENGTH:
+                del self.views[min(self.views)]
+        return not self.connection.closed
+
+    def send_input(self, bits):
+        """
+        :param bits: (int) this frame's input (see player_input)
+        :return: None
+        """
+        self.connection.send(CLIENT_INPUT.pack(self.tick, bits))
+
+    def entity_image(self, type_code, frame):
+        """
+        :return: the unrotated image for an entity of a type, on a frame
+        """
+        key = (type_code, frame)
+        image = self.images.get(key)
+        if image is None:
+            name = ENTITY_TYPES[type_code]
+            if name == 'StaticTile':
+                image = load_image("brick_dark.png" if frame else "brick_light.png", "roguetiles")
+            elif name == 'Fire':
+                image = load_image('fire{}.png'.format(frame), 'fire')
+            elif name == 'Sword':
+                image = load_image('sword1_{}.png'.format(DIRECTIONS[frame]), 'sword')
+            else:
+                image = load_image(ENTITY_IMAGES[name])
+            self.images[key] = image
+        return image
+
+    def submit(self, queue):
+        """
+        submit the current view to a render queue. entity types are drawn in ENTITY_TYPES order
+        :param queue: (RenderQueue)
+        :return: None
+        """
+        for entity_id, (type_code, x, y, angle, frame, health) in self.view.items():
+            image = rotated_image(self.entity_image(type_code, frame), angle)
+            rect = image_rect(image)
+            rect.center = (x, y)
+            queue.submit(type_code, image, render_position(rect))
+
+    def player_health(self):
+        """
+        :return: (int) health of the player in the current view, or None if there is no player
+        """
+        for type_code, x, y, angle, frame, health in self.view.values():
+            if type_code == TYPE_CODES['PlayerSprite']:
+                return health
+        return None
+
+
+def listen(port, host='127.0.0.1'):
+    """
+    :return: (socket) a socket listening for clients on the port
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen()
+    return listener
+
+
+def connect(address):
+    """
+    :param address: (string) 'host:port'
+    :return: (socket) connected to the server
+    """
+    host, port = address.rsplit(':', 1)
+    return socket.create_connection((host, int(port)))
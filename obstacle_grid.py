@@ -0,0 +1,197 @@
+"""
+the obstacle tile grid.
+walls are tiles, so instead of testing a sprite against every sprite in the obstacles group, questions about walls are
+answered from a grid with one byte per tile. the grid is built from the obstacles group the first time it's needed;
+call invalidate() whenever static obstacles are added or removed (a new map, a loaded save).
+only sprites that opt in with static_obstacle = True (map tiles) go into the grid. anything else in the obstacles
+group (e.g. a shield, which moves with its user) is a dynamic obstacle, and is tested by its rect. there are usually
+only a few, so the list of them is kept between ticks and only rebuilt when sprites join or leave the obstacles group
+(see ObstacleGroup).
+
+sweep() moves a rect through the grid in one pass: it finds the fraction of the move completed before the rect first
+touches an obstacle (the time of impact), and which side it hit (the contact normal). the cost depends on the tiles
+the move passes over, not on the speed, so nothing tunnels through a wall by moving further than its width in a tick.
+"""
+
+import pygame
+
+
+class ObstacleGroup(pygame.sprite.RenderPlain):
+    """
+    the obstacles group. counts sprites joining and leaving it, so the grid can tell when to rebuild its list of
+    dynamic obstacles
+    """
+    def __init__(self, *sprites):
+        self.changes = 0
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.changes += 1
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.changes += 1
+
+
+def axis_entry(low, high, target_low, target_high, delta):
+    """
+    when a moving interval starts and stops overlapping a fixed one, as fractions of the move
+    :return: (float, float) entry and exit times. entry is -inf and exit inf if it always overlaps
+    """
+    if delta > 0:
+        return (target_low - high) / delta, (target_high - low) / delta
+    if delta < 0:
+        return (target_high - low) / delta, (target_low - high) / delta
+    if high <= target_low or low >= target_high:
+        return float('inf'), float('-inf')
+    return float('-inf'), float('inf')
+
+
+def sweep_against(box, dx, dy, target):
+    """
+    swept AABB test of a moving box against a fixed one. boxes that only share an edge don't count as touching, the
+    same as pygame's Rect.colliderect
+    :param box: (int, int, int, int)    left, top, right, bottom of the moving box
+    :param dx: (int)                    horizontal move
+    :param dy: (int)                    vertical move
+    :param target: (int, int, int, int) left, top, right, bottom of the fixed box
+    :return: (float, (int, int)) time of impact in [0, 1) and contact normal, or None if the move doesn't hit it.
+                                 boxes that already overlap are ignored, so a sprite can always move out of a wall
+    """
+    left, top, right, bottom = box
+    target_left, target_top, target_right, target_bottom = target
+    if left < target_right and target_left < right and top < target_bottom and target_top < bottom:
+        return None
+    x_entry, x_exit = axis_entry(left, right, target_left, target_right, dx)
+    y_entry, y_exit = axis_entry(top, bottom, target_top, target_bottom, dy)
+    entry = max(x_entry, y_entry)
+    if entry >= min(x_exit, y_exit) or not 0 <= entry < 1:
+        return None
+    if x_entry > y_entry:
+        return entry, (-1 if dx > 0 else 1, 0)
+    return entry, (0, -1 if dy > 0 else 1)
+
+
+class ObstacleGrid:
+    """
+    which tiles are walls
+    """
+    def __init__(self, obstacles, tile_size, origin):
+        """
+        :param obstacles: (ObstacleGroup)   sprites that can't be walked through
+        :param tile_size: (int)             size of a tile in pixels
+        :param origin: (int, int)           pixel at the top left corner of tile (0, 0)
+        """
+        self.obstacles = obstacles
+        self.tile_size = tile_size
+        self.origin = origin
+        self.width = self.height = 0
+        self.blocked = None     # bytearray, 1 for each wall tile, row by row. None until built
+        self.version = 0        # incremented every time the grid is built, so users can tell when to refresh
+        self.dynamic = []       # obstacles that aren't part of the grid, as of dynamic_changes
+        self.dynamic_changes = None
+        self.sweeps = 0         # for profiling
+        self.tiles_tested = 0
+
+    def tile_of(self, x_pixel, y_pixel):
+        """
+        :return: (int, int) tile containing the pixel. same as game_model.get_tile_from_pixel
+        """
+        return int((x_pixel - self.origin[0]) // self.tile_size), int((y_pixel - self.origin[1]) // self.tile_size)
+
+    def invalidate(self):
+        """
+        forget the grid, because static obstacles have changed. it's rebuilt the next time it's needed
+        :return: None
+        """
+        self.blocked = None
+
+    def ensure_built(self):
+        """
+        read the grid from the obstacles group if it isn't built
+        :return: None
+        """
+        if self.blocked is not None:
+            return
+        tiles = [self.tile_of(*sprite.rect.center) for sprite in self.obstacles
+                 if getattr(sprite, 'static_obstacle', False)]
+        self.width = max((x for x, _ in tiles), default=-1) + 1
+        self.height = max((y for _, y in tiles), default=-1) + 1
+        self.blocked = bytearray(self.width * self.height)
+        for x, y in tiles:
+            if x >= 0 and y >= 0:
+                self.blocked[y * self.width + x] = 1
+        self.version += 1
+
+    def is_blocked(self, tile):
+        """
+        :return: (boolean) whether the tile is a wall. tiles off the grid never are
+        """
+        x, y = tile
+        return 0 <= x < self.width and 0 <= y < self.height and self.blocked[y * self.width + x] == 1
+
+    def dynamic_obstacles(self):
+        """
+        :return: (list(sprite)) obstacles that aren't part of the grid. only rebuilt when the obstacles group changes
+        """
+        if self.dynamic_changes != self.obstacles.changes:
+            self.dynamic = [sprite for sprite in self.obstacles if not getattr(sprite, 'static_obstacle', False)]
+            self.dynamic_changes = self.obstacles.changes
+        return self.dynamic
+
+    def sweep(self, rect, dx, dy, dynamic=()):
+        """
+        move a rect through the grid
+        :param rect: (Rect)                 where the rect starts
+        :param dx: (int)                    horizontal move, in pixels
+        :param dy: (int)                    vertical move, in pixels
+        :param dynamic: (list(sprite))      obstacles outside the grid to test as well, from dynamic_obstacles()
+        :return: (float, (int, int))        fraction of the move made before touching an obstacle (1 if none was hit)
+                                            and the contact normal (None if none was hit)
+        """
+        self.ensure_built()
+        self.sweeps += 1
+        box = (rect.left, rect.top, rect.right, rect.bottom)
+        # everything the rect passes over on the way
+        left, right = min(rect.left, rect.left + dx), max(rect.right, rect.right + dx)
+        top, bottom = min(rect.top, rect.top + dy), max(rect.bottom, rect.bottom + dy)
+        first_x, first_y = self.tile_of(left, top)
+        last_x, last_y = self.tile_of(right - 1, bottom - 1)
+        first_x, first_y = max(first_x, 0), max(first_y, 0)
+        last_x, last_y = min(last_x, self.width - 1), min(last_y, self.height - 1)
+
+        time, normal = 1, None
+        size = self.tile_size
+        x_origin, y_origin = self.origin
+        for y in range(first_y, last_y + 1):
+            row = y * self.width
+            for x in range(first_x, last_x + 1):
+                if not self.blocked[row + x]:
+                    continue
+                self.tiles_tested += 1
+                tile_left, tile_top = x_origin + x * size, y_origin + y * size
+                hit = sweep_against(box, dx, dy, (tile_left, tile_top, tile_left + size, tile_top + size))
+                if hit and hit[0] < time:
+                    time, normal = hit
+        for sprite in dynamic:
+            other = sprite.rect
+            if other.right <= left or other.left >= right or other.bottom <= top or other.top >= bottom:
+                continue
+            hit = sweep_against(box, dx, dy, (other.left, other.top, other.right, other.bottom))
+            if hit and hit[0] < time:
+                time, normal = hit
+        return time, normal
+
+    def overlaps(self, rect, dynamic=()):
+        """
+        :return: (boolean) whether the rect overlaps any obstacle
+        """
+        self.ensure_built()
+        first_x, first_y = self.tile_of(rect.left, rect.top)
+        last_x, last_y = self.tile_of(rect.right - 1, rect.bottom - 1)
+        for y in range(max(first_y, 0), min(last_y, self.height - 1) + 1):
+            for x in range(max(first_x, 0), min(last_x, self.width - 1) + 1):
+                if self.blocked[y * self.width + x]:
+                    return True
+        return rect.collidelist([sprite.rect for sprite in dynamic]) != -1
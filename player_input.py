@@ -0,0 +1,229 @@
+"""
+input layer.
+the keyboard is sampled once per tick into a compact InputFrame (one bit per key the game cares about).
+everything that reads input during a tick reads that frame, so a session can be recorded to a file
+and replayed exactly.
+
+recording file format:
+    8 bytes     magic, b'LONKINPT'
+    1 byte      format version
+    then one little-endian unsigned short per tick (the frame's bits)
+"""
+
+import atexit
+import struct
+
+import pygame
+from pygame.locals import *
+
+
+# order matters: a key's index in this list is its bit in the recorded frame. only append to it.
+TRACKED_KEYS = [K_DOWN, K_RIGHT, K_LEFT, K_UP, K_SPACE, K_1, K_2, K_3, K_4, K_5, K_6]
+KEY_BITS = {key: bit for bit, key in enumerate(TRACKED_KEYS)}
+
+RECORDING_MAGIC = b'LONKINPT'
+RECORDING_VERSION = 1
+FRAME_FORMAT = struct.Struct('<H')
+
+
+class InputFrame:
+    """
+    state of the tracked keys during one tick.
+    indexable by key constant like the sequence returned by pygame.key.get_pressed()
+    """
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        """
+        :param bits: (int)  bit i is set if TRACKED_KEYS[i] is held
+        """
+        self.bits = bits
+
+    def __getitem__(self, key):
+        bit = KEY_BITS.get(key)
+        return bit is not None and bool(self.bits >> bit & 1)
+
+    @staticmethod
+    def from_keyboard():
+        """
+        :return: (InputFrame) the current state of the keyboard
+        """
+        pressed = pygame.key.get_pressed()
+        bits = 0
+        for bit, key in enumerate(TRACKED_KEYS):
+            if pressed[key]:
+                bits |= 1 << bit
+        return InputFrame(bits)
+
+
+class InputRecorder:
+    """
+    writes one frame per tick to a recording file
+    """
+    def __init__(self, path):
+        """
+        :param path: (string) file to record to. overwritten if it exists
+        """
+        self.file = open(path, 'wb')
+        self.file.write(RECORDING_MAGIC + bytes([RECORDING_VERSION]))
+        self.ticks = 0
+
+    def write(self, frame):
+        """
+        :param frame: (InputFrame)  input for the current tick
+        :return: None
+        """
+        self.file.write(FRAME_FORMAT.pack(frame.bits))
+        self.ticks += 1
+
+    def close(self):
+        self.file.close()
+
+
+class InputReplay:
+    """
+    plays back a recording file one frame per tick
+    """
+    def __init__(self, path):
+        """
+        :param path: (string) recording file made by InputRecorder
+        """
+        with open(path, 'rb') as recording:
+            data = recording.read()
+        header_size = len(RECORDING_MAGIC) + 1
+        if data[:len(RECORDING_MAGIC)] != RECORDING_MAGIC:
+            raise ValueError("{} is not an input recording".format(path))
+        if data[len(RECORDING_MAGIC)] != RECORDING_VERSION:
+            raise ValueError("{} has unsupported recording version {}".format(path, data[len(RECORDING_MAGIC)]))
+        self.frames = [InputFrame(bits) for (bits,) in FRAME_FORMAT.iter_unpack(data[header_size:])]
+        self.index = 0
+
+    @classmethod
+    def from_frames(cls, bits):
+        """
+        :param bits: (list(int)) input bits for each tick
+        :return: (InputReplay) a replay of the given input, without a file
+        """
+        replay = cls.__new__(cls)
+        replay.frames = [InputFrame(frame_bits) for frame_bits in bits]
+        replay.index = 0
+        return replay
+
+    def finished(self):
+        """
+        :return: (bool) whether every recorded frame has been played
+        """
+        return self.index >= len(self.frames)
+
+    def next_frame(self):
+        """
+        :return: (InputFrame) input for the next tick. empty input once the recording has run out
+        """
+        if self.finished():
+            return InputFrame()
+        frame = self.frames[self.index]
+        self.index += 1
+        return frame
+
+
+class RemoteInput:
+    """
+    input sent over the network by a client (see netplay). holds the latest bits received
+    """
+    def __init__(self):
+        self.bits = 0
+
+    def next_frame(self):
+        """
+        :return: (InputFrame) the client's most recent input
+        """
+        return InputFrame(self.bits)
+
+
+current_frame = InputFrame()
+recorder = None
+replay = None
+remote = None
+
+
+def start_recording(path):
+    """
+    record every polled frame to a file until stop() is called or the process exits
+    :param path: (string) file to record to
+    :return: None
+    """
+    global recorder
+    recorder = InputRecorder(path)
+    atexit.register(stop)
+
+
+def start_replay(path):
+    """
+    take input from a recording instead of the keyboard
+    :param path: (string) recording file to play back
+    :return: None
+    """
+    global replay
+    replay = InputReplay(path)
+
+
+def start_remote_input():
+    """
+    take input from a network client instead of the keyboard
+    :return: (RemoteInput) set its bits whenever the client sends input
+    """
+    global remote
+    remote = RemoteInput()
+    return remote
+
+
+def start_scripted_input(bits):
+    """
+    take input from a list instead of the keyboard
+    :param bits: (list(int)) input bits for each tick (see InputFrame)
+    :return: None
+    """
+    global replay
+    replay = InputReplay.from_frames(bits)
+
+
+def replay_finished():
+    """
+    :return: (bool) true if replaying and the recording has run out
+    """
+    return replay is not None and replay.finished()
+
+
+def stop():
+    """
+    finish recording, if recording
+    :return: None
+    """
+    global recorder
+    if recorder:
+        recorder.close()
+        recorder = None
+
+
+def poll_input():
+    """
+    samples input for this tick. call exactly once per tick, before anything reads input.
+    :return: (InputFrame) the frame for this tick
+    """
+    global current_frame
+    if replay:
+        current_frame = replay.next_frame()
+    elif remote:
+        current_frame = remote.next_frame()
+    else:
+        current_frame = InputFrame.from_keyboard()
+    if recorder:
+        recorder.write(current_frame)
+    return current_frame
+
+
+def get_input():
+    """
+    :return: (InputFrame) input for the current tick
+    """
+    return current_frame
@@ -0,0 +1,186 @@
+"""
+entity prototypes.
+entity types (stats, image, components, starting statuses) are described in resources/entities.json. the first time
+anything is spawned, each description is compiled into a prototype: a sprite built once by the usual mixin
+initializers, whose attributes and component rows are then kept as a template. spawning is a shallow copy of the
+template plus a position, and spawn_many copies it into every component store with one extend per column, so a room
+full of enemies costs little more than one.
+
+an entity type description:
+    class           name of the sprite class in sprite_classes, which holds the behavior (update, get_damage, ...)
+    groups          names of the groups it's in, e.g. "enemies"
+    image           image in resources, or
+    animation       AnimationMixin arguments, by name
+    movement        a movement component. speed (pixels per tick), and optionally patrol: tile offsets from the
+                    spawn tile to walk between, with patrol_repeats to loop them
+    health          HealthMixin arguments, by name
+    weapon_user     true if it spawns weapons
+    statuses        statuses it starts with: type, lifetime, infectious, and optionally remaining_time
+"""
+
+import json
+import os
+
+import sprite_classes
+from sprite_classes import *
+
+PROTOTYPES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "entities.json")
+
+# group names used in entity descriptions
+GROUPS = {
+    'obstacles': obstacles,
+    'floors': floors,
+    'player_group': player_group,
+    'enemies': enemies,
+    'enemy_weapons': enemy_weapons,
+    'hazards': hazards,
+    'player_weapons': player_weapons,
+    'collectibles': collectibles,
+}
+
+
+class Prototype:
+    """
+    a compiled entity type
+    """
+    def __init__(self, name, description):
+        """
+        :param name: (string)       name of the entity type
+        :param description: (dict)  see the module docstring
+        """
+        self.name = name
+        self.cls = getattr(sprite_classes, description['class'])
+        self.groups = [GROUPS[group] for group in description.get('groups', ())]
+        movement = description.get('movement')
+        self.speed = movement.get('speed', 0) if movement is not None else None
+        self.patrol = [tuple(offset) for offset in movement['patrol']] if movement and 'patrol' in movement else None
+        self.patrol_repeats = movement.get('patrol_repeats', False) if movement else False
+        self.statuses = [(getattr(sprite_classes, status['type']), status['lifetime'], status['infectious'],
+                          status.get('remaining_time', status['lifetime']))
+                         for status in description.get('statuses', ())]
+        self.clocked = bool(description.get('animation', {}).get('clock'))
+
+        # build one sprite the long way, then keep what it ended up with
+        sprite = self.cls.__new__(self.cls)
+        pygame.sprite.Sprite.__init__(sprite)
+        if movement is not None:
+            MovementMixin.__init__(sprite)
+            sprite.speed = self.speed
+        if 'health' in description:
+            HealthMixin.__init__(sprite, **description['health'])
+        if description.get('weapon_user'):
+            WeaponUserMixin.__init__(sprite)
+        if 'animation' in description:
+            AnimationMixin.__init__(sprite, **description['animation'])
+        else:
+            sprite.image = load_image(description['image'])
+        self.rect = image_rect(sprite.image)
+        self.attributes = {name: value for name, value in vars(sprite).items() if not name.startswith('_')}
+        self.rows = [(store, store.get_row(sprite)) for store in world.stores.values() if sprite in store]
+        for store, _ in self.rows:
+            store.remove(sprite)
+
+    def instances(self, count):
+        """
+        :return: (list(sprite)) new sprites with the prototype's attributes, in no stores or groups yet
+        """
+        sprites = []
+        new = self.cls.__new__
+        for _ in range(count):
+            sprite = new(self.cls)
+            pygame.sprite.Sprite.__init__(sprite)
+            attributes = vars(sprite)
+            for name, value in self.attributes.items():
+                # containers (e.g. live weapons) belong to each sprite
+                attributes[name] = type(value)(value) if isinstance(value, (list, dict, set)) else value
+            sprite.rect = self.rect.copy()
+            sprites.append(sprite)
+        return sprites
+
+    def spawn_many(self, tiles):
+        """
+        :param tiles: (list((int, int)))    tile to center each new sprite on
+        :return: (list(sprite)) the new sprites, in the same order
+        """
+        sprites = self.instances(len(tiles))
+        for sprite, tile in zip(sprites, tiles):
+            sprite.rect.center = get_center_pixel(*tile)
+        for store, row in self.rows:
+            store.add_many(sprites, **row)
+        for sprite, tile in zip(sprites, tiles):
+            if self.patrol is not None:
+                sprite.set_tile_sequence([(tile[0] + dx, tile[1] + dy) for dx, dy in self.patrol],
+                                         self.speed, self.patrol_repeats)
+            if self.clocked:
+                join_animation_clock(sprite)
+                sprite.set_image()
+            for status_class, lifetime, infectious, remaining_time in self.statuses:
+                status = object.__new__(status_class)
+                Status.__init__(status, sprite, lifetime, infectious)
+                status.remaining_time = remaining_time
+        for group in self.groups:
+            group.add(*sprites)
+        return sprites
+
+
+# entity type name -> raw description, and -> Prototype once compiled
+descriptions = {}
+prototypes = {}
+
+
+def load_descriptions(path=PROTOTYPES_FILE):
+    """
+    read entity type descriptions. prototypes are compiled from them when first spawned
+    :param path: (string) json file of entity type name -> description
+    :return: None
+    """
+    with open(path) as descriptions_file:
+        descriptions.update(json.load(descriptions_file))
+    prototypes.clear()
+
+
+def get_prototype(name):
+    """
+    :param name: (string) entity type
+    :return: (Prototype) compiled the first time it's asked for
+    """
+    prototype = prototypes.get(name)
+    if prototype is None:
+        if not descriptions:
+            load_descriptions()
+        prototype = prototypes[name] = Prototype(name, descriptions[name])
+    return prototype
+
+
+def image_names(name):
+    """
+    :param name: (string) entity type
+    :return: (list((string, string))) (image name, sub path) of every image the type uses, for prefetching
+    """
+    if not descriptions:
+        load_descriptions()
+    description = descriptions[name]
+    animation = description.get('animation')
+    if animation is None:
+        return [(description['image'], None)]
+    return [("{}{}.{}".format(animation['image_base_name'], frame, animation['image_extension']),
+             animation.get('images_path')) for frame in range(animation['number_of_frames'])]
+
+
+def spawn(name, tile):
+    """
+    :param name: (string)       entity type
+    :param tile: (int, int)     tile to center it on
+    :return: (sprite) the new entity
+    """
+    return get_prototype(name).spawn_many([tile])[0]
+
+
+def spawn_many(name, tiles):
+    """
+    spawn a whole wave or room's worth of one entity type at once
+    :param name: (string)               entity type
+    :param tiles: (list((int, int)))    tile to center each one on
+    :return: (list(sprite)) the new entities, in the same order
+    """
+    return get_prototype(name).spawn_many(tiles)
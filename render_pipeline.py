@@ -0,0 +1,116 @@
+"""
+pipelined rendering.
+normally a tick is simulated and then drawn on the same thread, so a frame takes the simulation time plus the drawing
+time. in pipelined mode the simulation thread only collects what to draw (a render queue of surfaces, positions and
+layers, see render_queue.py) and hands it to a render thread, which draws it into the frame while the next tick is
+simulated. the finished frame is shown from the simulation thread, which is the only one that talks to the display,
+just before the next one is handed over.
+
+a collected frame refers to shared surfaces (from load_image, rotated_image, ...) that the simulation keeps using.
+nothing draws on those, but transforming a surface or building a mask from it locks it, and SDL won't blit from a
+locked surface. so the render thread holds game_model.surface_lock while drawing, and the simulation takes it for
+anything that locks a shared surface. rotations and masks are cached, so after the first few ticks it rarely needs to.
+
+two render queues are used in turn: the simulation collects into one while the render thread draws the other.
+the overlap is only as good as the GIL allows: pygame releases it inside blits and scaling, but the simulation is
+Python throughout, and when drawing takes longer than simulating (as it usually does at full resolution) the
+simulation spends most frames waiting for the render thread.
+"""
+
+import threading
+import time
+from queue import Queue
+
+from render_queue import RenderQueue
+
+
+class RenderPipeline:
+    """
+    the render thread and the two render queues it takes turns with the simulation on
+    """
+    def __init__(self, draw, show, lock, cull=False):
+        """
+        :param draw: (function)     draws a render queue into the frame. called on the render thread
+        :param show: (function)     shows the drawn frame. called on the simulation thread
+        :param lock: (Lock)         held while drawing. see the module docstring
+        :param cull: (boolean)      see RenderQueue
+        """
+        self.draw = draw
+        self.show = show
+        self.lock = lock
+        self.queues = [RenderQueue(cull), RenderQueue(cull)]
+        self.collecting = 0         # index of the queue to collect the next frame in
+        self.ready = Queue()        # queues handed to the render thread, then None to stop
+        self.drawn = Queue()        # queues the render thread has finished with
+        self.in_flight = False      # whether the render thread has a frame that hasn't been shown yet
+        self.error = None           # exception raised on the render thread, re-raised on the simulation thread
+        self.thread = threading.Thread(target=self.render_loop, name="render", daemon=True)
+        self.thread.start()
+        # for profiling
+        self.frames = 0
+        self.waits = 0              # frames the simulation had to wait for the render thread to catch up
+        self.wait_ms = 0.0          # time spent waiting, in total
+        self.render_ms = 0.0        # time the render thread took over the last frame
+
+    def queue(self):
+        """
+        :return: (RenderQueue) the queue to collect the next frame in. the render thread may still be drawing the last
+                               one from the other queue
+        """
+        return self.queues[self.collecting]
+
+    def submit(self):
+        """
+        wait for the last frame to be drawn and show it, then hand the one just collected to the render thread
+        :return: None
+        """
+        self.finish()
+        self.ready.put(self.queues[self.collecting])
+        self.in_flight = True
+        self.collecting ^= 1
+
+    def finish(self):
+        """
+        wait for the frame being drawn, if any, and show it. call before drawing on the simulation thread
+        :return: None
+        """
+        if not self.in_flight:
+            return
+        if self.drawn.empty():
+            self.waits += 1
+        start = time.perf_counter()
+        self.drawn.get()
+        self.wait_ms += (time.perf_counter() - start) * 1000
+        self.in_flight = False
+        if self.error is not None:
+            raise self.error
+        self.show()
+
+    def render_loop(self):
+        """
+        runs on the render thread: draws frames as they're submitted, until closed
+        :return: None
+        """
+        while True:
+            queue = self.ready.get()
+            if queue is None:
+                return
+            start = time.perf_counter()
+            try:
+                with self.lock:
+                    self.draw(queue)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.render_ms = (time.perf_counter() - start) * 1000
+                self.frames += 1
+                self.drawn.put(queue)
+
+    def close(self):
+        """
+        show the frame still being drawn and stop the render thread
+        :return: None
+        """
+        self.finish()
+        self.ready.put(None)
+        self.thread.join()
@@ -0,0 +1,80 @@
+"""
+render queue.
+everything drawn in a frame is submitted as (layer, surface, position). when the frame is finished the queue is
+sorted by layer once (stable, so submission order is kept within a layer) and emitted with a single Surface.blits call.
+new kinds of drawables (overlays, shadows, HUD) are new layers, not new draw loops.
+"""
+
+from operator import itemgetter
+
+# draw order, back to front
+BACKGROUND = 0
+PLAYER = 10
+HAZARDS = 20
+PLAYER_WEAPONS = 30
+ENEMIES = 40
+ENEMY_WEAPONS = 50
+COLLECTIBLES = 60
+STATUS_OVERLAYS = 70
+HUD = 80
+
+first_item = itemgetter(0)
+
+
+class RenderQueue:
+    """
+    collects blits for one frame
+    """
+    def __init__(self, cull=False):
+        """
+        :param cull: (boolean) skip anything entirely outside the target surface
+        """
+        self.cull = cull
+        self.items = []     # (layer, (surface, position))
+        self.submitted = 0  # blits submitted last frame, for profiling
+        self.culled = 0     # of those, how many were skipped for being off screen
+
+    def submit(self, layer, surface, position):
+        """
+        :param layer: (int)             where to draw it in the draw order. higher is in front
+        :param surface: (Surface)       what to draw
+        :param position: (int, int)     where its top left corner goes on the target
+        :return: None
+        """
+        self.items.append((layer, (surface, position)))
+
+    def submit_many(self, layer, blits):
+        """
+        :param layer: (int)                             layer for all of them
+        :param blits: (iterable((Surface, (int, int)))) surfaces and positions, drawn in this order
+        :return: None
+        """
+        self.items.extend([(layer, blit) for blit in blits])
+
+    def flush(self, target):
+        """
+        draw everything submitted since the last flush onto the target, back to front, and empty the queue
+        :param target: (Surface)
+        :return: None
+        """
+        self.items.sort(key=first_item)
+        blits = [blit for _, blit in self.items]
+        self.submitted = len(blits)
+        if self.cull:
+            width, height = target.get_size()
+            blits = [(surface, position) for surface, position in blits
+                     if position[0] < width and position[1] < height
+                     and position[0] + surface.get_width() > 0 and position[1] + surface.get_height() > 0]
+        self.culled = self.submitted - len(blits)
+        target.blits(blits, False)
+        self.items = []
+
+
+def sprite_blits(group, to_position):
+    """
+    :param group: (Group)               sprites to draw
+    :param to_position: (function)      world rect -> position on the render target
+    :return: (list((Surface, (int, int)))) each sprite's image and where it goes
+    """
+    return [(sprite.image, to_position(sprite.rect)) for sprite in group]
+
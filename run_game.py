@@ -1,129 +1,799 @@
-import pygame
+from startup import trace
+
+with trace.phase("import pygame"):
+    import pygame
+import argparse
+import os
 import sys
+import time
+
+with trace.phase("import game modules"):
+    from sprite_classes import *
+    import player_input
+    import ai_workers
+    import netplay
+    import savestate
+    from dungeon import Dungeon
+    from prototypes import GROUPS, spawn, spawn_many
+    import render_queue as layers
+    from render_queue import RenderQueue, sprite_blits
+    from render_pipeline import RenderPipeline
+    from memory_report import MemoryReport
+    from leak_tracker import LeakTracker
+
 
-from sprite_classes import *
+# subsystems the game actually uses. pygame.init() would also bring up audio, joystick, fonts, etc.
+# events and keyboard state come with the display subsystem.
+REQUIRED_SUBSYSTEMS = [("display", pygame.display.init)]
 
+screen = None
+# surface the world is drawn into. the screen itself, or in low resolution mode a smaller surface scaled up by present()
+frame = None
+# everything drawn in a frame goes through this. see render_queue.py
+render_queue = RenderQueue()
+# draws frames on a thread of its own, with --pipelined. see render_pipeline.py
+pipeline = None
+# cached health bar images, by health
+health_bars = {}
+# samples allocations and populations with --track-allocations. see leak_tracker.py
+leak_tracker = None
+# the rooms and the one the player is in, with --dungeon. see dungeon.py
+dungeon = None
 
-pygame.init()
-screen = pygame.display.set_mode((tile_size*total_horizontal_width, tile_size*total_vertical_width))
-# DOUBLEBUF TO AVOID FLICKERING
+QUICK_SAVE_KEY = K_F5
+QUICK_LOAD_KEY = K_F9
+RETRY_KEY = K_r
+QUICK_SAVE_FILE = "quicksave.lonk"
+PAUSE_KEY = K_p
 
+# main loop states. only PLAYING simulates anything; the others block on window events (see wait_in_state)
+PLAYING = "playing"
+PAUSED = "paused"
+GAME_OVER = "game over"
+UNFOCUSED = "unfocused"
+# longest a state other than PLAYING blocks waiting for an event, in ms
+IDLE_WAKE_MS = 1000
 
-def draw_background():
+
+def init_pygame():
     """
-    draws all stationary objects
-    :return:
+    initialize only the pygame subsystems listed in REQUIRED_SUBSYSTEMS, timing each one
+    :return: None
+    """
+    for name, init in REQUIRED_SUBSYSTEMS:
+        with trace.phase("SDL init: " + name):
+            init()
+
+
+def create_display():
+    """
+    creates the window
+    :return: None
+    """
+    global screen, frame
+    screen = pygame.display.set_mode((tile_size*total_horizontal_width, tile_size*total_vertical_width))
+    # DOUBLEBUF TO AVOID FLICKERING
+    frame = screen if get_art_scale() == 1 else pygame.Surface(render_size(*screen.get_size()))
+
+
+def present():
+    """
+    shows the finished frame, scaling it up to the window in low resolution mode
+    :return: None
+    """
+    scale_frame()
+    pygame.display.update()
+
+
+def scale_frame():
     """
+    in low resolution mode, scales the frame up onto the screen
+    :return: None
+    """
+    if frame is not screen:
+        pygame.transform.scale(frame, screen.get_size(), screen)
 
-    # TODO: OPTIMIZE THIS. PERFORMANCE PROBLEMS RESULT FROM BLITTING BACKGROUND HERE.
-    obstacles.draw(screen)
-    floors.draw(screen)
+
+def load_map_images():
+    """
+    loads the images used by map tiles. every tile of a kind shares the same image.
+    :return: (image, image) obstacle image, floor image
+    """
+    return load_image("brick_dark.png", "roguetiles"), load_image("brick_light.png", "roguetiles")
 
 
 # now initialize background tiles
-def initialize_map():
+def initialize_map(obstacle_image, floor_image):
     """
     function to initialize map
+    :param obstacle_image: (pygame image)   image for wall tiles
+    :param floor_image: (pygame image)      image for floor tiles
     :return:
     """
+    obstacle_grid.invalidate()
     for tile_x in range(horizontal_tiles):
         for tile_y in range(vertical_tiles):
             position = (tile_x, tile_y)
             is_obstacle = tile_x == 0 or tile_x == horizontal_tiles-1 or tile_y == 0 or tile_y == vertical_tiles-1
-            img = load_image("brick_dark.png" if is_obstacle else "brick_light.png", "roguetiles")
-            tile = StaticTile(position, img)
+            tile = StaticTile(position, obstacle_image if is_obstacle else floor_image)
             if is_obstacle:
                 tile.add(obstacles)
             else:
                 tile.add(floors)
 
 
+def spawn_entities():
+    """
+    creates the player, enemies, hazards and pickups for the room
+    :return: None
+    """
+    PlayerSprite((8, 4))
+    spawn_many('Fire', [(2, 2), (14, 5)])
+    spawn_many('Goblin', [(3, 4), (5, 6)])
+    spawn('Chaser', (2, 3))
+    spawn('Archer', (10, 5))
+    spawn('Heart', (4, 4))
+    spawn('HastePotion', (10, 7))
+
+
+def initialize_level(level, obstacle_image, floor_image):
+    """
+    builds the map of a generated level. only walls next to the floor become tiles: the rest can't be reached or seen
+    :param level: (Level)                   see level_generator.py
+    :param obstacle_image: (pygame image)   image for wall tiles
+    :param floor_image: (pygame image)      image for floor tiles
+    :return: None
+    """
+    obstacle_grid.invalidate()
+    obstacles.add(*[StaticTile(position, obstacle_image) for position in level.wall_tiles()])
+    floors.add(*[StaticTile(position, floor_image) for position in level.floor_tiles()])
+
+
+def spawn_level(level):
+    """
+    creates the player and every entity the generator placed
+    :param level: (Level) see level_generator.py
+    :return: None
+    """
+    PlayerSprite(level.player_tile)
+    for entity_type, tiles in level.spawns.items():
+        spawn_many(entity_type, tiles)
+
+
+def build_world(level=None):
+    """
+    constructs the room, or a generated level. nothing in the world exists until this is called.
+    :param level: (Level) generated level to build instead of the room, see level_generator.py
+    :return: None
+    """
+    with trace.phase("asset loading"):
+        map_images = load_map_images()
+    with trace.phase("map construction"):
+        if level:
+            set_map_size(level.width, level.height)
+            initialize_level(level, *map_images)
+        else:
+            set_map_size(horizontal_tiles, vertical_tiles)
+            initialize_map(*map_images)
+    with trace.phase("entity creation"):
+        if level:
+            spawn_level(level)
+        else:
+            spawn_entities()
+
 
-player = PlayerSprite((8, 4))
-test_fire = Fire((2, 2))
-test_fire2 = Fire((14, 5))
-test_enemy = Goblin((3, 4))
-test_enemy2 = Goblin((5, 6))
-chaser = Chaser((2, 3))
-archer = Archer((10, 5))
-heart = Heart((4,4))
-potion = HastePotion((10, 7))
+def health_bar_image(health):
+    """
+    :param health: (int) amount of health in domain [1, 100]
+    :return: (Surface) the health bar for that much health. cached, since health changes rarely
+    """
+    image = health_bars.get(health)
+    if image is None:
+        scale = get_art_scale()
+        image = pygame.Surface((max(220, 10 + health*2)//scale, 64//scale))
+        image.fill(pygame.Color('black'))
+        pygame.draw.rect(image, pygame.Color('orange'), Rect(0, 0, 220//scale, 64//scale))
+        pygame.draw.rect(image, pygame.Color('green'), Rect(10//scale, 8//scale, health*2//scale, 48//scale))
+        if health < 100:
+            pygame.draw.rect(image, pygame.Color('black'),
+                             Rect((10+health*2)//scale, 8//scale, (200-health*2)//scale, 48//scale))
+        health_bars[health] = image
+    return image
 
 
-def draw_health(health):
+def draw_health(health, queue):
     """
     draws health bar on bottom of screen.
     :param health: (int) amount of health in domain [1, 100]
+    :param queue: (RenderQueue) the frame being drawn
     :return: none
     """
-    outer_rect = Rect(20, hud_top, 220, 64)
-    health_rect = Rect(30, hud_top+8, health*2, 48)
-    black_rect = Rect(30+health*2, hud_top+8, 200-health*2, 48)
-    pygame.draw.rect(screen, pygame.Color('orange'), outer_rect)
-    pygame.draw.rect(screen, pygame.Color('green'), health_rect)
-    if health < 100:
-        pygame.draw.rect(screen, pygame.Color('black'), black_rect)
+    queue.submit(layers.HUD, health_bar_image(health), render_position(Rect(20, hud_top, 0, 0)))
 
 
-def controller_tick():
+def handle_events():
     """
-    This function handles user input
-    (takes input from controller and updates model)
-    :return:
+    handles pending window events
+    :return: (list(event)) the events handled
+    """
+    events = pygame.event.get()
+    for event in events:
+        handle_event(event)
+    return events
+
+
+def handle_event(event):
+    """
+    handles a window event the same way in every state. quits if the window was closed, quick-saves and quick-loads
+    on their keys
+    :param event: (event)
+    :return: (boolean) whether the world was replaced by a quick-load
+    """
+    global tick_counter
+    if event.type == QUIT:
+        player_input.stop()
+        sys.exit(0)
+    if event.type == KEYDOWN and event.key == QUICK_SAVE_KEY:
+        save_game(QUICK_SAVE_FILE)
+    elif event.type == KEYDOWN and event.key == QUICK_LOAD_KEY and os.path.exists(QUICK_SAVE_FILE):
+        load_game(QUICK_SAVE_FILE)
+        return True
+    return False
+
+
+def save_game(path):
+    """
+    save the world to a file. with --dungeon, every room and which one the player is in are saved too
+    :param path: (string)
+    :return: None
+    """
+    if dungeon:
+        with open(path, 'wb') as save_file:
+            save_file.write(dungeon.save(tick_counter))
+    else:
+        savestate.write_save(path, tick_counter)
+
+
+def load_game(path):
     """
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            sys.exit(0)
+    load a file written by save_game, made in the same mode (--dungeon or not)
+    :param path: (string)
+    :return: None
+    """
+    global tick_counter
+    if dungeon:
+        with open(path, 'rb') as save_file:
+            tick_counter = dungeon.load(save_file.read())
+    else:
+        tick_counter = savestate.read_save(path)
+
+
+def simulation_tick():
+    """
+    advances the world one tick. touches no window state, so it can run where there are no window events to handle
+    (e.g. on a server thread)
+    :return: None
+    """
+    player_input.poll_input()
+    sight.next_tick()
+    if ai_workers.active_scheduler:
+        apply_remote_ai()
 
     player_group.update()
     hazards.update()
     player_weapons.update()
     enemies.update()
+    enemy_weapons.update()
     collectibles.update()
-    statuses.update()
+    world.run_systems()
+    update_statuses()
+
+
+def apply_remote_ai():
+    """
+    applies enemy movement decisions made by the AI workers last tick, and sends them this tick's snapshot
+    :return: None
+    """
+    planned = [enemy for enemy in enemies if getattr(enemy, 'ai_kind', None)]
+    player = get_player()
+    layout = (tile_size, left_border_tiles, top_border_tiles)
+    intents = ai_workers.active_scheduler.tick(planned, player.rect.center if player else None, obstacle_grid, layout)
+    for enemy, destination in intents:
+        if enemy.alive():
+            enemy.apply_intent(destination)
+
+
+# sprite groups and the layers they're drawn on
+GROUP_LAYERS = [
+    (obstacles, layers.BACKGROUND),
+    (floors, layers.BACKGROUND),
+    (player_group, layers.PLAYER),
+    (hazards, layers.HAZARDS),
+    (player_weapons, layers.PLAYER_WEAPONS),
+    (enemies, layers.ENEMIES),
+    (enemy_weapons, layers.ENEMY_WEAPONS),
+    (collectibles, layers.COLLECTIBLES),
+]
 
 
 def view_tick():
     """
-    This function updates the display
+    This function updates the display. in pipelined mode it collects the frame for the render thread to draw, and
+    shows the one before
     :return:
     """
-    draw_background()
-    player_group.draw(screen)
-    draw_health(player.health)
-    hazards.draw(screen)
-    player_weapons.draw(screen)
-    enemies.draw(screen)
-    collectibles.draw(screen)
-    statuses.draw(screen)
-    pygame.display.update()
+    if pipeline:
+        collect_frame(pipeline.queue())
+        pipeline.submit()
+    else:
+        draw_world()
+        present()
 
 
-initialize_map()
+def collect_frame(queue):
+    """
+    submits everything in the world and the HUD to a render queue
+    :param queue: (RenderQueue)
+    :return: None
+    """
+    background = dungeon.background() if dungeon else None
+    if background is not None:
+        queue.submit(layers.BACKGROUND, background,
+                     render_position(Rect(left_border_tiles * tile_size, top_border_tiles * tile_size, 0, 0)))
+    for group, layer in GROUP_LAYERS:
+        if background is None or layer != layers.BACKGROUND:
+            queue.submit_many(layer, sprite_blits(group, render_position))
+    player = get_player()
+    if player:
+        draw_health(player.health, queue)
+    if governor.should_draw_status_overlays():
+        queue.submit_many(layers.STATUS_OVERLAYS, status_overlay_blits())
 
-# game loop
-while get_player() and get_player().health > 0:
-    time = clock.tick(FRAMES_PER_SECOND)
-    controller_tick()
-    view_tick()
-    tick_counter += 1
 
+def draw_world():
+    """
+    draws the world and the HUD into the frame, without showing it
+    :return: None
+    """
+    collect_frame(render_queue)
+    render_queue.flush(frame)
 
 
+def draw_frame(queue):
+    """
+    draws a collected frame, ready to be shown. runs on the render thread in pipelined mode
+    :param queue: (RenderQueue)
+    :return: None
+    """
+    queue.flush(frame)
+    scale_frame()
+
+
+def draw_paused():
+    """
+    shows the world dimmed, for states where it's frozen
+    :return: None
+    """
+    draw_world()
+    shade = pygame.Surface(frame.get_size())
+    shade.set_alpha(128)
+    frame.blit(shade, (0, 0))
+    present()
+
+
+def wait_in_state(state):
+    """
+    sits in a state that simulates nothing until an event moves it on. blocks on window events instead of polling,
+    and only redraws when the window has been uncovered or a quick-load changed the world
+    :param state: (string) PAUSED, GAME_OVER or UNFOCUSED
+    :return: (string) the next state
+    """
+    redraw = game_over if state == GAME_OVER else draw_paused
+    redraw()
+    while True:
+        event = pygame.event.wait(IDLE_WAKE_MS)
+        if event.type == NOEVENT:
+            continue
+        loaded = handle_event(event)
+        if loaded and state == GAME_OVER:
+            return PLAYING
+        if loaded or event.type in (VIDEOEXPOSE, WINDOWEXPOSED, WINDOWSHOWN, WINDOWRESTORED):
+            redraw()
+        if event.type == KEYDOWN and event.key == (RETRY_KEY if state == GAME_OVER else PAUSE_KEY):
+            return PLAYING
+        if state == UNFOCUSED and event.type == WINDOWFOCUSGAINED:
+            return PLAYING
+
+
+def state_after_events(events, pause_on_focus_loss):
+    """
+    :param events: (list(event))            this tick's window events
+    :param pause_on_focus_loss: (boolean)   whether losing focus should stop the game
+    :return: (string) the state to leave PLAYING for, or None to keep playing
+    """
+    for event in events:
+        if event.type == KEYDOWN and event.key == PAUSE_KEY:
+            return PAUSED
+        if event.type == WINDOWFOCUSLOST and pause_on_focus_loss:
+            return UNFOCUSED
+    return None
+
 
 def game_over():
     # game over. clear screen and show game-over
-    screen.fill((0, 0, 0))
+    frame.fill((0, 0, 0))
     """
     for group in groups:
     for sprite in group:
         sprite.kill()
     """
     game_over_screen = load_image("game_over.jpg")
-    screen.blit(game_over_screen, (150, 50))
-    pygame.display.update()
+    frame.blit(game_over_screen, render_position(Rect(150, 50, 0, 0)))
+    present()
+
+
+def parse_args(argv):
+    """
+    :param argv: (list(string)) command line arguments, not including the program name
+    :return: parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Legend of Lonk")
+    parser.add_argument("--trace-startup", action="store_true",
+                        help="print wall time spent in each startup phase")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record keyboard input to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="play back input recorded with --record instead of reading the keyboard, as fast as "
+                             "--uncapped allows. drawing limits that: the room replays at about 150x real time "
+                             "--headless, but only about 3x when drawn at full resolution")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window. a headless --replay draws nothing either; to time drawing "
+                             "without a window, set SDL_VIDEODRIVER=dummy instead")
+    parser.add_argument("--uncapped", action="store_true",
+                        help="don't limit the tick rate to FRAMES_PER_SECOND")
+    parser.add_argument("--no-render", action="store_true",
+                        help="skip drawing entirely (simulation only)")
+    parser.add_argument("--low-res", action="store_true",
+                        help="draw at the art's native 16 px resolution and scale the frame up to the window")
+    parser.add_argument("--cull", action="store_true",
+                        help="skip drawing anything entirely outside the window")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="never shed load when ticks run over budget. always off during --replay, "
+                             "since shedding load depends on timing and would make replays diverge")
+    parser.add_argument("--sight-table", action="store_true",
+                        help="precompute line of sight between every pair of open tiles when the map is built. "
+                             "ignored for maps of more than {} tiles, which use the per-tick cache".format(MAX_TABLE_CELLS))
+    parser.add_argument("--pipelined", action="store_true",
+                        help="draw each frame on a render thread while the next tick is simulated")
+    parser.add_argument("--ai-workers", type=int, default=0, metavar="N",
+                        help="make enemy AI decisions on N worker processes")
+    parser.add_argument("--ai-interval", type=int, default=1, metavar="TICKS",
+                        help="ticks between AI decisions when using --ai-workers")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="print memory used by entities (by type) and surfaces (by image) once the room is built "
+                             "and again when the game ends")
+    parser.add_argument("--track-allocations", type=int, metavar="TICKS",
+                        help="sample allocations, sprite populations and leaks every TICKS ticks, warn about anything "
+                             "that keeps growing, and print a report when the game ends")
+    parser.add_argument("--dungeon", action="store_true",
+                        help="play through a dungeon of several rooms instead of the single room")
+    parser.add_argument("--generate", nargs=2, type=int, metavar=("WIDTH", "HEIGHT"),
+                        help="play a procedurally generated level of this many tiles (needs numpy)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for --generate; the same seed always gives the same level")
+    parser.add_argument("--style", choices=("rooms", "caves"), default="rooms",
+                        help="--generate rooms joined by corridors, or caves")
+    parser.add_argument("--density", action="append", default=[], metavar="TYPE=N",
+                        help="expected number of an entity type per floor tile in a generated level, e.g. Goblin=0.01")
+    parser.add_argument("--telemetry", metavar="DIR",
+                        help="stream per-tick metrics and gameplay events to compressed JSONL files in DIR")
+    parser.add_argument("--telemetry-ticks", type=int, default=1, metavar="N",
+                        help="record tick metrics once every N ticks")
+    parser.add_argument("--telemetry-events", type=float, default=1.0, metavar="RATE",
+                        help="fraction of gameplay events to record, chosen at random")
+    parser.add_argument("--telemetry-queue", type=int, default=10000, metavar="N",
+                        help="records waiting to be written before new ones are dropped")
+    parser.add_argument("--load", metavar="FILE",
+                        help="start from a world saved with --save-at or quick-save instead of the usual room. "
+                             "saves made with --dungeon have every room in them, and need --dungeon to load")
+    parser.add_argument("--save-at", nargs=2, metavar=("TICK", "FILE"),
+                        help="save the world to FILE when the game reaches TICK (e.g. to capture a benchmark start)")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="run the simulation as a server on PORT. the first client to connect controls the player")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="play as a client of a server started with --serve")
+    parser.add_argument("--loopback", action="store_true",
+                        help="run a server on a thread and play as its client over a local socket pair")
+    parser.add_argument("--max-clients", type=int, default=4, metavar="N",
+                        help="clients a server accepts")
+    parser.add_argument("--net-budget", type=int, default=16384, metavar="BYTES",
+                        help="max bytes a server sends one client per tick")
+    parser.add_argument("--net-stats", action="store_true",
+                        help="print bandwidth and send time per client every second")
+    return parser.parse_args(argv)
+
+
+def report_replay(ticks, seconds):
+    """
+    print how fast a replay ran compared to real time
+    :param ticks: (int)         number of ticks simulated
+    :param seconds: (float)     wall time taken
+    :return: None
+    """
+    ticks_per_second = ticks / seconds if seconds else float('inf')
+    print("replayed {} ticks in {:.3f} s: {:.0f} ticks/s, {:.1f}x real time".format(
+        ticks, seconds, ticks_per_second, ticks_per_second / FRAMES_PER_SECOND))
+    per_tick = {name: total / max(contacts.rebuilds, 1) for name, total in contacts.totals.items()}
+    print("collisions per tick: {:.1f} rect tests, {:.1f} mask tests, {:.1f} mask hits".format(
+        per_tick.get("rect_tests", 0), per_tick.get("mask_tests", 0), per_tick.get("mask_hits", 0)))
+    if pipeline:
+        print("render thread: {} frames, simulation waited for it on {} ({:.0f} ms in total)".format(
+            pipeline.frames, pipeline.waits, pipeline.wait_ms))
+
+
+def print_net_stats(server):
+    """
+    :param server: (netplay.Server)
+    :return: None
+    """
+    for stats in server.stats():
+        print("client {client}: acked tick {acked_tick}, {bytes_per_tick:.0f} bytes/tick (peak {peak_bytes}), "
+              "send {send_ms_per_tick:.3f} ms/tick, capture {capture_ms:.3f} ms".format(**stats))
+
+
+def serve(server, args, render):
+    """
+    server game loop: simulate, take input from the first client and send every client its snapshot.
+    waits for a client before starting.
+    :param server: (netplay.Server)
+    :param args: parsed arguments
+    :param render: (boolean) whether to draw the world locally too
+    :return: (int) ticks simulated
+    """
+    remote = player_input.start_remote_input()
+    while not server.clients:
+        server.accept()
+        time.sleep(0.01)
+
+    clock = pygame.time.Clock()
+    frame_rate = 0 if args.uncapped else FRAMES_PER_SECOND
+    ticks = 0
+    while server.clients and get_player() and get_player().health > 0:
+        clock.tick(frame_rate)
+        server.accept()
+        remote.bits = server.receive_inputs()
+        simulation_tick()
+        ticks += 1
+        server.broadcast(ticks, groups)
+        if render:
+            handle_events()
+            view_tick()
+        if args.net_stats and ticks % FRAMES_PER_SECOND == 0:
+            print_net_stats(server)
+    # let clients see the last snapshot, then hang up
+    for session in server.clients:
+        session.connection.flush()
+        session.connection.close()
+    return ticks
+
+
+def play_client(client, server_thread=None):
+    """
+    client game loop: draw whatever the server last sent and send it the keyboard
+    :param client: (netplay.Client)
+    :param server_thread: (Thread) the loopback server, if there is one. the client stops when it does
+    :return: None
+    """
+    clock = pygame.time.Clock()
+    while client.receive() and (server_thread is None or server_thread.is_alive()):
+        clock.tick(FRAMES_PER_SECOND)
+        handle_events()
+        client.send_input(player_input.InputFrame.from_keyboard().bits)
+        client.submit(render_queue)
+        health = client.player_health()
+        if health is not None:
+            draw_health(max(health, 0), render_queue)
+        with surface_lock:  # a loopback server shares the images, and rotates and masks them on its own thread
+            render_queue.flush(frame)
+        present()
+
+
+def run_networked(args):
+    """
+    runs as a server, a client, or both over a local socket pair (--loopback)
+    :param args: parsed arguments
+    :return: None
+    """
+    import socket
+    import threading
+
+    if args.connect:
+        client = netplay.Client(netplay.connect(args.connect))
+        play_client(client)
+        game_over()
+        return
+
+    build_world()
+    if args.serve is not None:
+        server = netplay.Server(netplay.listen(args.serve), args.max_clients, args.net_budget)
+        ticks = serve(server, args, not args.no_render)
+        print("served {} ticks".format(ticks))
+        return
+
+    server = netplay.Server(None, args.max_clients, args.net_budget)
+    server_end, client_end = socket.socketpair()
+    server.add_connection(server_end)
+    server_thread = threading.Thread(target=serve, args=(server, args, False), daemon=True)
+    server_thread.start()
+    play_client(netplay.Client(client_end), server_thread)
+    game_over()
+
+
+def play(args, clock):
+    """
+    runs the game loop until the player dies (or the replay runs out), the game is paused or the window loses focus
+    :param args: parsed arguments
+    :param clock: (Clock)
+    :return: (string) the state to go to next
+    """
+    global tick_counter
+    frame_rate = 0 if args.uncapped else FRAMES_PER_SECOND
+    save_tick = int(args.save_at[0]) if args.save_at else None
+    # replays and headless runs are benchmarks; they shouldn't stop because another window was clicked
+    pause_on_focus_loss = not (args.replay or args.headless)
+    # time spent in other states isn't a slow tick
+    clock.tick()
+    while get_player() and get_player().health > 0 and not player_input.replay_finished():
+        clock.tick(frame_rate)
+        governor.record_tick(clock.get_rawtime(), groups + [active_statuses])
+        next_state = state_after_events(handle_events(), pause_on_focus_loss)
+        if next_state:
+            return next_state
+        telemetry.next_tick(tick_counter)
+        tick_start = time.perf_counter()
+        simulation_tick()
+        if dungeon:
+            dungeon.update(tick_counter)
+        draw_start = time.perf_counter()
+        if not args.no_render:
+            view_tick()
+        if telemetry.wants_tick(tick_counter):
+            record_telemetry((draw_start - tick_start) * 1000, (time.perf_counter() - draw_start) * 1000)
+        tick_counter += 1
+        if tick_counter == save_tick:
+            save_game(args.save_at[1])
+        if leak_tracker and tick_counter % leak_tracker.interval == 0:
+            sample_allocations()
+    return GAME_OVER
+
+
+def record_telemetry(tick_ms, draw_ms):
+    """
+    queue this tick's metrics. see telemetry.py
+    :param tick_ms: (float) time spent simulating the tick
+    :param draw_ms: (float) time spent drawing it
+    :return: None
+    """
+    telemetry.record_tick(tick_ms, draw_ms, {name: len(group) for name, group in GROUPS.items()}, image_cache_stats)
+
+
+def sample_allocations():
+    """
+    take a leak tracker sample, printing a report straight away if anything is growing
+    :return: None
+    """
+    leak_tracker.sample(groups, active_statuses, world.stores.values(), image_cache)
+    if any(leak_tracker.growing()):
+        leak_tracker.report()
+
+
+def start_world(args, level):
+    """
+    builds the world the game starts in: a saved one (--load), the dungeon's first room, or the room or generated
+    level. called again to retry after game over. rebuilding takes no longer than restoring a snapshot of the start
+    would, and taking one would double startup on big generated levels
+    :param args: parsed arguments
+    :param level: (Level) generated level, or None
+    :return: None
+    """
+    global tick_counter
+    if args.load:
+        with trace.phase("load saved world"):
+            load_game(args.load)
+    elif dungeon:
+        dungeon.start()
+    else:
+        savestate.clear_world()
+        tick_counter = 0
+        build_world(level)
+
+
+def main(argv=None):
+    global tick_counter, leak_tracker, dungeon, pipeline
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        if args.replay:
+            args.no_render = True   # there's nothing to see, so drawing would only slow the replay down
+    if args.record:
+        player_input.start_recording(args.record)
+    if args.replay:
+        player_input.start_replay(args.replay)
+    render_queue.cull = args.cull
+    sight.precompute = args.sight_table
+    if args.low_res:
+        set_art_scale(tile_size // 16)
+    if args.no_governor or args.replay:
+        governor.enabled = False
+    if args.telemetry:
+        telemetry.start(args.telemetry, args.telemetry_queue, args.telemetry_ticks, args.telemetry_events)
+
+    level = None
+    if args.generate:
+        import level_generator     # numpy is only needed for generated levels
+        densities = dict(level_generator.DEFAULT_DENSITIES)
+        for density in args.density:
+            entity_type, _, value = density.partition("=")
+            densities[entity_type] = float(value)
+        with trace.phase("level generation"):
+            # the screen doesn't scroll, so start the player where the single room game does
+            level = level_generator.generate(*args.generate, args.seed, args.style, densities, player_near=(8, 4))
+
+    if args.ai_workers:
+        ai_workers.start(args.ai_workers, (level.width, level.height) if level else (horizontal_tiles, vertical_tiles),
+                         args.ai_interval)
+
+    init_pygame()
+    with trace.phase("display creation"):
+        create_display()
+    if args.serve is not None or args.connect or args.loopback:
+        run_networked(args)
+        return
+    if args.pipelined:
+        pipeline = RenderPipeline(draw_frame, pygame.display.update, surface_lock, args.cull)
+        # hand the GIL over sooner than the default 5 ms, so the render thread isn't kept waiting after each blit
+        sys.setswitchinterval(0.001)
+    if args.dungeon:
+        dungeon = Dungeon()
+    start_world(args, level)
+    clock = pygame.time.Clock()
+    if not args.no_render:
+        with trace.phase("first frame"):
+            view_tick()
+    if args.trace_startup:
+        trace.report()
+    if args.memory_report:
+        MemoryReport(groups, world.stores.values(), image_cache).report()
+    if args.track_allocations:
+        leak_tracker = LeakTracker(args.track_allocations)
+
+    run_start = time.perf_counter()
+    start_tick = tick_counter
+    state = PLAYING
+    while True:
+        if state != PLAYING:
+            next_state = wait_in_state(state)
+            player = get_player()
+            if state == GAME_OVER and not (player and player.health > 0):
+                # retry, unless a quick-load has already brought the player back
+                start_world(args, level)
+            state = next_state
+            continue
+
+        state = play(args, clock)
+        if pipeline:
+            pipeline.finish()   # the other states draw on this thread
+        if state != GAME_OVER:
+            continue
+        if args.memory_report:
+            MemoryReport(groups, world.stores.values(), image_cache).report()
+        if leak_tracker:
+            leak_tracker.report()
+        if args.replay:
+            report_replay(tick_counter - start_tick, time.perf_counter() - run_start)
+            return
 
-game_over()
 
-while True:
-    controller_tick()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+binary snapshots of the whole world: every sprite, its component data, its group memberships, and every status.
+used for quick-save/quick-load, suspending dungeon rooms, and capturing benchmark starting states.
+
+format (little-endian):
+    8 bytes     magic, b'LONKSAVE'
+    1 byte      format version
+    header      tick (u32), map width in tiles (u16), map height in tiles (u16), entity count (u32). the map size is
+                the saved map's (see game_model.set_map_size), and becomes the current one when the save is loaded
+    entities    per entity: class code (u8), rect x, y, w, h (i32 each), attributes (tagged dict, see below)
+    stores      per component store, in world.stores order: name (tagged string), slot count (u32),
+                entity index per slot (u32 array), then each field: numeric fields as a packed array of the
+                column's typecode, object fields as one tagged value per slot
+    groups      per group in game_model.groups: member count (u32), entity index per member (u32 array)
+    statuses    status count (u32), then per status: class code (u8), victim entity index (u32), lifetime (i64),
+                remaining time (i64), infectious (u8)
+
+component columns are written straight from the stores' arrays, so saving and loading a room is mostly a handful
+of bulk copies. everything else (attributes, object fields) uses a small tagged encoding: a type byte, then the value.
+images aren't saved; they're reloaded from each entity's class and state.
+"""
+
+import struct
+from array import array
+
+from sprite_classes import *
+
+SAVE_MAGIC = b'LONKSAVE'
+SAVE_VERSION = 1
+HEADER = struct.Struct('<IHHI')
+ENTITY = struct.Struct('<Biiii')
+STATUS = struct.Struct('<BIqqB')
+COUNT = struct.Struct('<I')
+
+# classes that can be saved. a class's index is its code in the file; only append to this list
+SAVED_CLASSES = [StaticTile, Fire, PlayerSprite, Sword, Shield, Boomerang, Arrow, Bow, FireRod, IceRod,
+                 Goblin, Chaser, Archer, Heart, HastePotion, FireStatus, PauseStatus, IceStatus]
+CLASS_CODES = {cls: code for code, cls in enumerate(SAVED_CLASSES)}
+
+# tags for the tagged encoding
+NONE, FALSE, TRUE, INT, FLOAT, STRING, TUPLE, LIST, DICT, SET, ENTITY_REF, GROUP_REF, CLASS_REF = range(13)
+INT_VALUE = struct.Struct('<q')
+FLOAT_VALUE = struct.Struct('<d')
+SHORT = struct.Struct('<H')
+
+
+class Writer:
+    """
+    appends packed values to a buffer
+    """
+    def __init__(self, entity_indices):
+        """
+        :param entity_indices: (dict) sprite -> index in the save, for entity references
+        """
+        self.buffer = bytearray()
+        self.entity_indices = entity_indices
+        self.group_indices = {id(group): index for index, group in enumerate(groups)}
+
+    def pack(self, packer, *values):
+        self.buffer += packer.pack(*values)
+
+    def value(self, value):
+        """
+        append a tagged value
+        :param value: None, bool, int, float, string, tuple, list, dict, set, saved sprite, group, or saved class
+        :return: None
+        """
+        buffer = self.buffer
+        if value is None:
+            buffer.append(NONE)
+        elif value is True or value is False:
+            buffer.append(TRUE if value else FALSE)
+        elif isinstance(value, int):
+            buffer.append(INT)
+            buffer += INT_VALUE.pack(value)
+        elif isinstance(value, float):
+            buffer.append(FLOAT)
+            buffer += FLOAT_VALUE.pack(value)
+        elif isinstance(value, str):
+            encoded = value.encode()
+            buffer.append(STRING)
+            buffer += SHORT.pack(len(encoded)) + encoded
+        elif isinstance(value, (tuple, list, set)):
+            # references to sprites that weren't saved (i.e. dead ones) are dropped from collections
+            items = [item for item in value
+                     if not isinstance(item, pygame.sprite.Sprite) or item in self.entity_indices]
+            if isinstance(value, set):
+                items.sort(key=self.sort_key)
+            buffer.append(TUPLE if isinstance(value, tuple) else LIST if isinstance(value, list) else SET)
+            buffer += SHORT.pack(len(items))
+            for item in items:
+                self.value(item)
+        elif isinstance(value, dict):
+            items = [(key, item) for key, item in value.items()
+                     if not isinstance(key, pygame.sprite.Sprite) or key in self.entity_indices]
+            buffer.append(DICT)
+            buffer += SHORT.pack(len(items))
+            for key, item in items:
+                self.value(key)
+                self.value(item)
+        elif isinstance(value, pygame.sprite.Sprite):
+            index = self.entity_indices.get(value)
+            if index is None:
+                buffer.append(NONE)
+            else:
+                buffer.append(ENTITY_REF)
+                buffer += COUNT.pack(index)
+        elif id(value) in self.group_indices:
+            buffer.append(GROUP_REF)
+            buffer.append(self.group_indices[id(value)])
+        elif value in CLASS_CODES:
+            buffer.append(CLASS_REF)
+            buffer.append(CLASS_CODES[value])
+        else:
+            raise ValueError("can't save a {}".format(type(value).__name__))
+
+    @staticmethod
+    def sort_key(item):
+        # sets are written in a fixed order so that saving the same world twice gives the same bytes
+        return CLASS_CODES[item] if item in CLASS_CODES else repr(item)
+
+
+class Reader:
+    """
+    reads packed values from a buffer
+    """
+    def __init__(self, data, offset, entities):
+        """
+        :param data: (bytes)            the save
+        :param offset: (int)            where to start reading
+        :param entities: (list(sprite)) restored sprites, for entity references
+        """
+        self.data = data
+        self.offset = offset
+        self.entities = entities
+
+    def unpack(self, packer):
+        values = packer.unpack_from(self.data, self.offset)
+        self.offset += packer.size
+        return values
+
+    def array(self, typecode, count):
+        column = array(typecode)
+        size = column.itemsize * count
+        column.frombytes(self.data[self.offset:self.offset + size])
+        self.offset += size
+        return column
+
+    def value(self):
+        """
+        :return: the next tagged value
+        """
+        data = self.data
+        tag = data[self.offset]
+        self.offset += 1
+        if tag == NONE:
+            return None
+        if tag == FALSE or tag == TRUE:
+            return tag == TRUE
+        if tag == INT:
+            return self.unpack(INT_VALUE)[0]
+        if tag == FLOAT:
+            return self.unpack(FLOAT_VALUE)[0]
+        if tag == STRING:
+            (length,) = self.unpack(SHORT)
+            value = data[self.offset:self.offset + length].decode()
+            self.offset += length
+            return value
+        if tag in (TUPLE, LIST, SET):
+            (length,) = self.unpack(SHORT)
+            items = [self.value() for _ in range(length)]
+            return tuple(items) if tag == TUPLE else items if tag == LIST else set(items)
+        if tag == DICT:
+            (length,) = self.unpack(SHORT)
+            value = {}
+            for _ in range(length):
+                key = self.value()
+                value[key] = self.value()
+            return value
+        if tag == ENTITY_REF:
+            return self.entities[self.unpack(COUNT)[0]]
+        if tag == GROUP_REF:
+            self.offset += 1
+            return groups[data[self.offset - 1]]
+        if tag == CLASS_REF:
+            self.offset += 1
+            return SAVED_CLASSES[data[self.offset - 1]]
+        raise ValueError("corrupt save: unknown tag {}".format(tag))
+
+
+def saved_attributes(sprite):
+    """
+    :return: (dict) the sprite's own attributes that go in the save. images, rects and pygame's internals don't
+    """
+    return {name: value for name, value in vars(sprite).items()
+            if not name.startswith('_') and name not in ('image', 'src_image', 'rect')}
+
+
+def save_world(tick):
+    """
+    :param tick: (int) current tick count, restored by load_world
+    :return: (bytes) the whole world
+    """
+    entities = []
+    entity_indices = {}
+    for group in groups:
+        for sprite in group:
+            if sprite not in entity_indices and type(sprite) in CLASS_CODES:
+                entity_indices[sprite] = len(entities)
+                entities.append(sprite)
+
+    writer = Writer(entity_indices)
+    writer.buffer += SAVE_MAGIC + bytes([SAVE_VERSION])
+    writer.pack(HEADER, tick, *get_map_size(), len(entities))
+    for sprite in entities:
+        writer.pack(ENTITY, CLASS_CODES[type(sprite)], *sprite.rect)
+        writer.value(saved_attributes(sprite))
+
+    for name, store in world.stores.items():
+        slots = [slot for slot, entity in enumerate(store.entities) if entity in entity_indices]
+        writer.value(name)
+        writer.pack(COUNT, len(slots))
+        writer.buffer += array('I', [entity_indices[store.entities[slot]] for slot in slots]).tobytes()
+        every_slot = len(slots) == len(store.entities)
+        for field, typecode in store.fields.items():
+            column = store.columns[field]
+            if typecode:
+                writer.buffer += (column if every_slot else array(typecode, [column[slot] for slot in slots])).tobytes()
+            else:
+                for slot in slots:
+                    value = column[slot]
+                    writer.value(None if isinstance(value, pygame.Surface) else value)
+
+    for group in groups:
+        members = [entity_indices[sprite] for sprite in group if sprite in entity_indices]
+        writer.pack(COUNT, len(members))
+        writer.buffer += array('I', members).tobytes()
+
+    statuses = [status for status in active_statuses if status.victim_sprite in entity_indices]
+    writer.pack(COUNT, len(statuses))
+    for status in statuses:
+        writer.pack(STATUS, CLASS_CODES[type(status)], entity_indices[status.victim_sprite], status.lifetime,
+                    status.remaining_time, status.infectious)
+    return bytes(writer.buffer)
+
+
+def clear_world():
+    """
+    removes every sprite and status
+    :return: None
+    """
+    for group in groups:
+        group.empty()
+    world.clear()
+    victim_statuses.clear()
+    active_statuses[:] = []
+    animation_clocks.clear()
+    obstacle_grid.invalidate()
+
+
+def load_world(data):
+    """
+    replaces the world with a saved one
+    :param data: (bytes) made by save_world
+    :return: (int) the tick count when the world was saved
+    """
+    if data[:len(SAVE_MAGIC)] != SAVE_MAGIC:
+        raise ValueError("not a saved world")
+    if data[len(SAVE_MAGIC)] != SAVE_VERSION:
+        raise ValueError("unsupported save version {}".format(data[len(SAVE_MAGIC)]))
+    reader = Reader(data, len(SAVE_MAGIC) + 1, [])
+    tick, map_width, map_height, entity_count = reader.unpack(HEADER)
+
+    clear_world()
+    set_map_size(map_width, map_height)
+    # sprites are created without running their constructors, which would spawn things and add components
+    entities = reader.entities
+    attributes = []
+    for _ in range(entity_count):
+        class_code, x, y, width, height = reader.unpack(ENTITY)
+        sprite = SAVED_CLASSES[class_code].__new__(SAVED_CLASSES[class_code])
+        pygame.sprite.Sprite.__init__(sprite)
+        sprite.rect = Rect(x, y, width, height)
+        entities.append(sprite)
+        attributes.append(reader.offset)
+        skip_value(reader)
+    # attributes can refer to any entity, so read them once every entity exists
+    end_of_entities = reader.offset
+    for sprite, offset in zip(entities, attributes):
+        reader.offset = offset
+        for name, value in reader.value().items():
+            setattr(sprite, name, value)
+    reader.offset = end_of_entities
+
+    for _ in range(len(world.stores)):
+        store = world.stores[reader.value()]
+        (count,) = reader.unpack(COUNT)
+        slot_entities = [entities[index] for index in reader.array('I', count)]
+        for entity in slot_entities:
+            store.add(entity)
+        for field, typecode in store.fields.items():
+            if typecode:
+                store.columns[field] = reader.array(typecode, count)
+            else:
+                store.columns[field] = [reader.value() for _ in range(count)]
+
+    for group in groups:
+        (count,) = reader.unpack(COUNT)
+        group.add(*[entities[index] for index in reader.array('I', count)])
+
+    (count,) = reader.unpack(COUNT)
+    for _ in range(count):
+        class_code, victim, lifetime, remaining_time, infectious = reader.unpack(STATUS)
+        status = object.__new__(SAVED_CLASSES[class_code])
+        Status.__init__(status, entities[victim], lifetime, infectious)
+        status.remaining_time = remaining_time
+
+    sync_animation_clocks()
+    for sprite in entities:
+        restore_image(sprite)
+    return tick
+
+
+def skip_value(reader):
+    """
+    moves the reader past a tagged value without building it
+    :return: None
+    """
+    tag = reader.data[reader.offset]
+    reader.offset += 1
+    if tag in (INT, FLOAT):
+        reader.offset += 8
+    elif tag == STRING:
+        (length,) = reader.unpack(SHORT)
+        reader.offset += length
+    elif tag in (TUPLE, LIST, SET):
+        for _ in range(reader.unpack(SHORT)[0]):
+            skip_value(reader)
+    elif tag == DICT:
+        for _ in range(reader.unpack(SHORT)[0] * 2):
+            skip_value(reader)
+    elif tag == ENTITY_REF:
+        reader.offset += COUNT.size
+    elif tag in (GROUP_REF, CLASS_REF):
+        reader.offset += 1
+
+
+def restore_image(sprite):
+    """
+    gives a restored sprite the image it had when it was saved
+    :param sprite: (sprite)
+    :return: None
+    """
+    name = type(sprite).__name__
+    if sprite in animation_store:
+        sprite.set_image()
+        return
+    if name == 'StaticTile':
+        sprite.image = load_image("brick_dark.png" if sprite in obstacles else "brick_light.png", "roguetiles")
+        return
+    image = load_image('sword1_{}.png'.format(sprite.orientation), 'sword') if name == 'Sword' \
+        else load_image(ENTITY_IMAGES[name])
+    if sprite in rotation_store:
+        sprite.src_image = image
+        sprite.image = rotated_image(image, sprite.current_angle - sprite.initial_angle)
+        sprite.rendered_angle = sprite.current_angle
+    else:
+        sprite.image = image
+
+
+def write_save(path, tick):
+    """
+    save the world to a file
+    :return: None
+    """
+    with open(path, 'wb') as save_file:
+        save_file.write(save_world(tick))
+
+
+def read_save(path):
+    """
+    load the world from a file
+    :return: (int) the tick count when the world was saved
+    """
+    with open(path, 'rb') as save_file:
+        return load_world(save_file.read())
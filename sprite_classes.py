@@ -1,11 +1,33 @@
 from pygame.locals import *
 from sprite_mixins import *
+from player_input import get_input
+from ai_workers import CHASE, LINE_UP, remote_ai_enabled
+
+
+# images of entity types that always look the same (before rotation), by class name
+ENTITY_IMAGES = {
+    'PlayerSprite': "magic.png",
+    'Shield': "shield.png",
+    'Boomerang': "boomerang.png",
+    'Arrow': "arrow_small.png",
+    'Bow': "bow.png",
+    'FireRod': "fire_rod.png",
+    'IceRod': "ice_rod.png",
+    'Goblin': "goblin.png",
+    'Chaser': "zombie.png",
+    'Archer': "archer_elf.png",
+    'Heart': "heart.png",
+    'HastePotion': "haste_potion.png",
+}
 
 
 class StaticTile(pygame.sprite.Sprite):
     """
     background tile, never changes.
     """
+    # wall tiles are part of the obstacle grid (see obstacle_grid.py)
+    static_obstacle = True
+
     def __init__(self, position, image):
         """
 
@@ -14,7 +36,7 @@ class StaticTile(pygame.sprite.Sprite):
         """
         pygame.sprite.Sprite.__init__(self)
         self.image = image
-        self.rect = self.image.get_rect()
+        self.rect = image_rect(self.image)
 
         x_tile, y_tile = position
         x_pixel = (left_border_tiles + x_tile) * tile_size
@@ -24,24 +46,9 @@ class StaticTile(pygame.sprite.Sprite):
 
 class Fire(AnimationMixin, pygame.sprite.Sprite):
     """
-    class for stationary fire hazards
+    class for stationary fire hazards. every fire flickers in step, off one shared clock, and is always on fire.
+    spawned from its prototype, see prototypes.py and resources/entities.json
     """
-    def __init__(self, position_tile):
-        """
-
-        :param position_tile: tuple(int, int) location tile
-        """
-        pygame.sprite.Sprite.__init__(self)
-        AnimationMixin.__init__(self, 'fire', 'png', 9, 'fire', True)
-        self.image = load_image('fire0.png', 'fire')
-        self.rect = self.image.get_rect()
-        self.rect.center = get_center_pixel(position_tile[0], position_tile[1])
-        hazards.add(self)
-
-        # now create an infectious fire status
-        fire = FireStatus(self)
-        fire.remaining_time = 100000000000000
-
     def get_damage(self):
         """
 
@@ -49,19 +56,9 @@ class Fire(AnimationMixin, pygame.sprite.Sprite):
         """
         return 5
 
-    def update(self):
-        """
-        updates fire's state (in this case, swaps out image for animation)
-        also spawns fire statuses on anything that touches it
-        :return: None
-        """
-        AnimationMixin.update(self)
-
-        # might want to do a status spawner mixin or something
-
 
 
-class PlayerSprite(HealthMixin, RotationMixin, MovementMixin, pygame.sprite.Sprite):
+class PlayerSprite(HealthMixin, RotationMixin, MovementMixin, WeaponUserMixin, pygame.sprite.Sprite):
     """
     Player character's sprite. There should only be one of these...
     I guess a possible powerup could be making a 'shadow' that mirrors moves.
@@ -78,7 +75,8 @@ class PlayerSprite(HealthMixin, RotationMixin, MovementMixin, pygame.sprite.Spri
         MovementMixin.__init__(self)
         RotationMixin.__init__(self, self.image, image_direction='down')
         HealthMixin.__init__(self, 100, 15, 0)
-        self.rect = self.image.get_rect()
+        WeaponUserMixin.__init__(self)
+        self.rect = image_rect(self.image)
         self.rect.center = get_center_pixel(initial_tile[0], initial_tile[1])
         self.health = 100
         self.speed = 8
@@ -92,7 +90,7 @@ class PlayerSprite(HealthMixin, RotationMixin, MovementMixin, pygame.sprite.Spri
         update direction of player
         :return: None
         """
-        keys = pygame.key.get_pressed()
+        keys = get_input()
         if keys[K_DOWN]:
             self.direction = "down"
         elif keys[K_RIGHT]:
@@ -102,57 +100,43 @@ class PlayerSprite(HealthMixin, RotationMixin, MovementMixin, pygame.sprite.Spri
         elif keys[K_UP]:
             self.direction = "up"
         RotationMixin.set_direction(self, self.direction)
-        RotationMixin.update(self)
 
     def update_position(self):
         """
         Moves player to a new position
         :return: None
         """
-        keys = pygame.key.get_pressed()
+        keys = get_input()
         x = 1 if keys[K_RIGHT] else -1 if keys[K_LEFT] else 0
         y = 1 if keys[K_DOWN] else -1 if keys[K_UP] else 0
         MovementMixin.set_velocity(self, x*self.speed, y*self.speed)
-        MovementMixin.update(self)
 
 
     def update_held_weapon(self):
         """
         spawns a held weapon next to player, according to player's direction.
-        Right now, only uses sword. will add other weapons later.
+        how often each weapon can be spawned is up to WeaponUserMixin.use_weapon
         :return: None
         """
-        keys = pygame.key.get_pressed()
-
-        if keys[K_SPACE]:
-            test_sword = Sword(self, self.direction)
-            PauseStatus(self, 7)
-
-        if keys[K_1]:
-            test_sword = Sword(self, self.direction)
-            PauseStatus(self, 7)
-        if keys[K_2]:
-            player_shield = Shield(self, self.direction)
-
-        if keys[K_3]:
-            player_boomerang = Boomerang(self, self.direction)
-        if keys[K_4]:
-            Bow(self, self.direction)
-        if keys[K_5]:
-            FireRod(self, self.direction)
-        if keys[K_6]:
-            IceRod(self, self.direction)
+        keys = get_input()
+        self.use_weapon(Sword, keys[K_SPACE] or keys[K_1], self.direction)
+        self.use_weapon(Shield, keys[K_2], self.direction)
+        self.use_weapon(Boomerang, keys[K_3], self.direction)
+        self.use_weapon(Bow, keys[K_4], self.direction)
+        self.use_weapon(FireRod, keys[K_5], self.direction)
+        self.use_weapon(IceRod, keys[K_6], self.direction)
 
 
     def update(self):
         """
         performs all updates to player character
         (updates state by handling button presses)
+        health, rotation and movement are applied afterwards by their systems
         :return:
         """
-        HealthMixin.update(self)
+        WeaponUserMixin.update(self)
 
-        if not StatusSprite.affected_by(self, PauseStatus):
+        if not Status.affected_by(self, PauseStatus):
             self.update_direction()
             self.update_position()
             self.update_held_weapon()
@@ -161,7 +145,12 @@ class PlayerSprite(HealthMixin, RotationMixin, MovementMixin, pygame.sprite.Spri
 class Weapon(RotationMixin, NaturalDeathMixin, pygame.sprite.Sprite):
     """
     class for weapons
+    cooldown, max_active and trigger limit how often a user can spawn the weapon (see WeaponUserMixin)
     """
+    cooldown = 0
+    max_active = None
+    trigger = 'held'
+
     def __init__(self, user, image, orientation='right'):
         """
 
@@ -172,40 +161,41 @@ class Weapon(RotationMixin, NaturalDeathMixin, pygame.sprite.Sprite):
         self.image = image
 
         self.user = user
+        self.orientation = orientation
 
         NaturalDeathMixin.__init__(self, 20)
         RotationMixin.__init__(self, image, orientation)
         angle = RotationMixin.directions_to_angles[orientation]
         RotationMixin.set_rotation_path(self, angle - 70, angle + 70, 20, should_die=True)
-        self.rect = self.image.get_rect()
+        self.rect = image_rect(self.image)
         user_center = user.rect.center
-        dx = 1 if orientation =='right' else -1 if orientation =='left' else 0
-        dy = 1 if orientation =='down' else -1 if orientation =='up' else 0
+        dx, dy = DIRECTION_VECTORS[orientation]
         x = user_center[0] + tile_size * dx
         y = user_center[1] + tile_size * dy
         self.rect.center = (x, y)
         if user in player_group:
             self.add(player_weapons)
             self.affected_group = enemies
+            self.user_group = player_group
 
         if user in enemies:
             self.add(enemy_weapons)
             self.affected_group = player_group
+            self.user_group = enemies
 
         PauseStatus(user, 7)
 
     def get_damage(self):
         return 5
 
-    def update(self):
-        RotationMixin.update(self)
-        NaturalDeathMixin.update(self)
-
 
 class Boomerang(MovementMixin, Weapon):
     """
     class for boomerang
     """
+    max_active = 1
+    trigger = 'edge'
+
     def __init__(self, user, orientation='right'):
         image = load_image("boomerang.png")
         Weapon.__init__(self, user, image, orientation)
@@ -214,9 +204,8 @@ class Boomerang(MovementMixin, Weapon):
         MovementMixin.__init__(self)
         self.speed = 8
 
-        dx = 1 if orientation =='right' else -1 if orientation =='left' else 0
-        dy = 1 if orientation =='down' else -1 if orientation =='up' else 0
-        MovementMixin.set_velocity(self, dx * self.speed, dy*self.speed)
+        dx, dy = DIRECTION_VECTORS[orientation]
+        MovementMixin.set_velocity(self, dx * self.speed, dy * self.speed)
 
         self.returning = False # whether boomerang is coming back
 
@@ -224,23 +213,22 @@ class Boomerang(MovementMixin, Weapon):
         return 2
 
     def update(self):
-        Weapon.update(self)
-        MovementMixin.update(self)
-        if pygame.sprite.spritecollide(self, self.affected_group, False) or self.has_hit_obstacle:
-            for sprite in pygame.sprite.spritecollide(self, self.affected_group, False):
+        hit = contacts.touching(self, self.affected_group)
+        if hit or self.has_hit_obstacle:
+            for sprite in hit:
                 PauseStatus(sprite, 60)
             self.returning = True
             # spawn statuses
-        if pygame.sprite.spritecollide(self, obstacles, False):
-            self.returning = True
         if self.returning:
             x, y = self.user.rect.center
             MovementMixin.set_pixel_destination(self, x, y, self.speed)
-        if pygame.sprite.collide_rect(self, self.user):
+        if self.user in contacts.touching(self, self.user_group):
             self.kill()
 
 
 class Shield(Weapon):
+    max_active = 1
+
     def __init__(self, user, orientation = 'right'):
         image = load_image("shield.png")
         Weapon.__init__(self, user, image, orientation)
@@ -249,9 +237,6 @@ class Shield(Weapon):
     def get_damage(self):
         return 0
 
-    def update(self):
-        Weapon.update(self)
-
 
 class Projectile(MovementMixin, Weapon):
     def __init__(self, user, image, orientation, speed, damage):
@@ -261,16 +246,13 @@ class Projectile(MovementMixin, Weapon):
         self.remaining_time = 500
         self.speed = speed
         self.damage = damage
-        dx = 1 if orientation == 'right' else -1 if orientation == 'left' else 0
-        dy = 1 if orientation == 'down' else -1 if orientation == 'up' else 0
+        dx, dy = DIRECTION_VECTORS[orientation]
         MovementMixin.set_velocity(self, dx * self.speed, dy * self.speed)
 
     def get_damage(self):
         return self.damage
 
     def update(self):
-        Weapon.update(self)
-        MovementMixin.update(self)
         if self.has_hit_obstacle:
             self.kill()
 
@@ -282,6 +264,9 @@ class Arrow(Projectile):
 
 
 class Bow(Weapon):
+    cooldown = 15
+    max_active = 1
+
     def __init__(self, user, orientation):
         image = load_image("bow.png")
         Weapon.__init__(self, user, image, orientation)
@@ -289,6 +274,8 @@ class Bow(Weapon):
 
 
 class FireRod(Weapon):
+    cooldown = 20
+
     def __init__(self, user, orientation):
         image = load_image("fire_rod.png")
         Weapon.__init__(self, user, image, orientation)
@@ -296,6 +283,8 @@ class FireRod(Weapon):
         FireStatus(carrier)
 
 class IceRod(Weapon):
+    cooldown = 20
+
     def __init__(self, user, orientation):
         image = load_image("ice_rod.png")
         Weapon.__init__(self, user, image, orientation)
@@ -303,6 +292,9 @@ class IceRod(Weapon):
         IceStatus(carrier)
 3
 class Sword(Weapon):
+    cooldown = 8
+    max_active = 1
+
     def __init__(self, user, orientation="right"):
 
         pygame.sprite.Sprite.__init__(self)
@@ -316,63 +308,25 @@ class Sword(Weapon):
         """
         return 5
 
-    def update(self):
-        """
-        updates age, kills self when too old.
-        :return: None
-        """
-        RotationMixin.update(self)
-
 
 class Goblin(HealthMixin, MovementMixin, pygame.sprite.Sprite):
     """
     Basic enemy class. just moves up and down
+    spawned from its prototype, see prototypes.py and resources/entities.json
     """
-    def __init__(self, position_tile):
-        """
-        :param position_tile: tuple(int, int) position of center of sprite in tiles
-        """
-        pygame.sprite.Sprite.__init__(self)
-        MovementMixin.__init__(self)
-        HealthMixin.__init__(self, 40, 5, 0)
-        x_tile, y_tile = position_tile
-        MovementMixin.set_tile_sequence(self, [(x_tile, y_tile), (x_tile, y_tile+3)], 3, True)
-        self.src_image = load_image("goblin.png")
-        self.image = self.src_image
-        self.rect = self.image.get_rect()
-        self.rect.center = get_center_pixel(x_tile, y_tile)
-        self.add(enemies)
-
-
     def get_damage(self):
         """
         :return: (int) amount of damage this enemy does
         """
         return 5
 
-    def update(self):
-        """
-        update enemy state
-        :return: None
-        """
-        HealthMixin.update(self)
-        MovementMixin.update(self)
-
 
 class Chaser(HealthMixin, MovementMixin, pygame.sprite.Sprite):
-    def __init__(self, position_tile):
-        """
-        :param position_tile: tuple(int, int) position of center of sprite in tiles
-        """
-        pygame.sprite.Sprite.__init__(self)
-        MovementMixin.__init__(self)
-        HealthMixin.__init__(self, 40, 5, 0)
-        x_tile, y_tile = position_tile
-        self.src_image = load_image("zombie.png")
-        self.image = self.src_image
-        self.rect = self.image.get_rect()
-        self.rect.center = get_center_pixel(x_tile, y_tile)
-        self.add(enemies)
+    """
+    walks towards the player, around walls.
+    spawned from its prototype, see prototypes.py and resources/entities.json
+    """
+    ai_kind = CHASE
 
     def get_damage(self):
         """
@@ -380,31 +334,32 @@ class Chaser(HealthMixin, MovementMixin, pygame.sprite.Sprite):
         """
         return 5
 
+    def apply_intent(self, destination):
+        """
+        follow a movement decision made by a worker process (see ai_workers)
+        :param destination: (float, float)  pixel to walk to
+        :return: None
+        """
+        MovementMixin.set_pixel_destination(self, destination[0], destination[1], 3)
+
     def update(self):
         """
         update enemy state
         :return: None
         """
-        HealthMixin.update(self)
+        if remote_ai_enabled():
+            return
         player = get_player()
-        MovementMixin.set_pixel_destination(self, player.rect.center[0], player.rect.center[1], 3)
-        MovementMixin.update(self)
+        if player and governor.should_update_ai(self.rect.center, player.rect.center):
+            MovementMixin.set_pixel_destination(self, player.rect.center[0], player.rect.center[1], 3)
 
 
-class Archer(HealthMixin, MovementMixin, pygame.sprite.Sprite):
-    def __init__(self, position_tile):
-        """
-        :param position_tile: tuple(int, int) position of center of sprite in tiles
-        """
-        pygame.sprite.Sprite.__init__(self)
-        MovementMixin.__init__(self)
-        HealthMixin.__init__(self, 40, 5, 0)
-        x_tile, y_tile = position_tile
-        self.src_image = load_image("archer_elf.png")
-        self.image = self.src_image
-        self.rect = self.image.get_rect()
-        self.rect.center = get_center_pixel(x_tile, y_tile)
-        self.add(enemies)
+class Archer(HealthMixin, MovementMixin, WeaponUserMixin, pygame.sprite.Sprite):
+    """
+    lines up with the player and shoots arrows at them.
+    spawned from its prototype, see prototypes.py and resources/entities.json
+    """
+    ai_kind = LINE_UP
 
     def get_damage(self):
         """
@@ -412,15 +367,28 @@ class Archer(HealthMixin, MovementMixin, pygame.sprite.Sprite):
         """
         return 5
 
+    def apply_intent(self, destination):
+        """
+        follow a movement decision made by a worker process (see ai_workers)
+        :param destination: (float, float)  pixel to walk to
+        :return: None
+        """
+        MovementMixin.set_pixel_destination(self, destination[0], destination[1], 3)
+
     def update(self):
         """
         update enemy state
         :return: None
         """
-        HealthMixin.update(self)
+        WeaponUserMixin.update(self)
         x_self, y_self = self.rect.center
         player = get_player()
+        if not player or not governor.should_update_ai(self.rect.center, player.rect.center):
+            return
         x_player, y_player = player.rect.center
+        if remote_ai_enabled():
+            self.shoot_if_lined_up(x_player, y_player)
+            return
         if abs(x_self - x_player) < abs(y_self - y_player):
             x_target = x_player
             y_target = (y_self - y_player)*1000
@@ -428,7 +396,25 @@ class Archer(HealthMixin, MovementMixin, pygame.sprite.Sprite):
             x_target = (x_self - x_player) * 1000
             y_target = y_player
         MovementMixin.set_pixel_destination(self, x_target, y_target, 3)
-        MovementMixin.update(self)
+        self.shoot_if_lined_up(x_player, y_player)
+
+    def shoot_if_lined_up(self, x_player, y_player):
+        """
+        fires the bow at the player when the archer is lined up with them on either axis and has a clear shot
+        :param x_player: (int)  horizontal pixel of the player's center
+        :param y_player: (int)  vertical pixel of the player's center
+        :return: None
+        """
+        x_self, y_self = self.rect.center
+        if abs(x_self - x_player) < tile_size//2:
+            direction = 'down' if y_player > y_self else 'up'
+        elif abs(y_self - y_player) < tile_size//2:
+            direction = 'right' if x_player > x_self else 'left'
+        else:
+            direction = None
+        if direction is not None and not sight.clear(self.rect.center, (x_player, y_player)):
+            direction = None
+        self.use_weapon(Bow, direction is not None, direction)
 
 
 class collectible(pygame.sprite.Sprite):
@@ -436,33 +422,25 @@ class collectible(pygame.sprite.Sprite):
 
 
 class Heart(pygame.sprite.Sprite):
-    def __init__(self, position_tile):
-        pygame.sprite.Sprite.__init__(self)
-        x_tile, y_tile = position_tile
-        self.src_image = load_image("heart.png")
-        self.image = self.src_image
-        self.rect = self.image.get_rect()
-        self.rect.center = get_center_pixel(x_tile, y_tile)
-        self.add(collectibles)
+    """
+    restores some of the player's health when picked up.
+    spawned from its prototype, see prototypes.py and resources/entities.json
+    """
     def update(self):
-        player = get_player()
-        if pygame.sprite.collide_rect(self, player):
+        if contacts.touching(self, player_group):
+            player = get_player()
             player.health += 10
             self.kill()
 
 
 class HastePotion(pygame.sprite.Sprite):
-    def __init__(self, position_tile):
-        pygame.sprite.Sprite.__init__(self)
-        x_tile, y_tile = position_tile
-        self.src_image = load_image("haste_potion.png")
-        self.image = self.src_image
-        self.rect = self.image.get_rect()
-        self.rect.center = get_center_pixel(x_tile, y_tile)
-        self.add(collectibles)
+    """
+    makes the player faster when picked up.
+    spawned from its prototype, see prototypes.py and resources/entities.json
+    """
     def update(self):
-        player = get_player()
-        if pygame.sprite.collide_rect(self, player):
+        if contacts.touching(self, player_group):
+            player = get_player()
             player.speed += 4
             self.kill()
 
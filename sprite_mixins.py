@@ -1,13 +1,93 @@
 from game_model import *
+from ecs import component_fields
+from governor import SLOW_ANIMATIONS
+
+"""
+AnimationMixin, MovementMixin, RotationMixin, HealthMixin and NaturalDeathMixin are components:
+their fields live in a store in game_model.world (see ecs.py) and are exposed on the sprite as properties.
+their __init__ methods add the sprite to the store.
+they don't have update methods; the system after each of them updates every sprite with that component
+in one loop, once per tick. Systems run in the order they're registered at the bottom of this file.
+"""
+
+
+animation_store = world.add_store('animation', {
+    'image_base_name': None,
+    'image_extension': None,
+    'images_path': None,
+    'number_of_frames': 'i',
+    'persistent': 'b',
+    'current_frame': 'i',
+    'frame_duration': 'd',  # ms each frame is shown for
+    'elapsed': 'd',         # ms the current frame has been shown for. unused with a shared clock
+    'clock_name': None,     # name of the shared AnimationClock driving this sprite, or None to keep its own time
+    'phase': 'i',           # with a shared clock, how many frames this sprite is ahead of the clock
+})
+
+# ms of simulated time per tick. animations run on simulated time, not wall time, so replays stay deterministic
+TICK_MS = 1000 / FRAMES_PER_SECOND
+
+
+class AnimationClock:
+    """
+    a frame index shared by every sprite that plays the same animation in step (e.g. every torch in a room).
+    it's advanced once per tick however many sprites use it, and its frame images are loaded once.
+    """
+    def __init__(self, image_base_name, image_extension, number_of_frames, images_path, frame_duration):
+        self.number_of_frames = number_of_frames
+        self.frame_duration = frame_duration
+        self.images = [load_image(image_base_name + str(frame) + "." + image_extension, images_path)
+                       for frame in range(number_of_frames)]
+        self.frame = 0
+        self.elapsed = 0.0
+        self.members = []       # sprites using the clock. dead ones are dropped the next time the frame changes
+        self.dirty = False      # whether the frame has changed since members' images were last set
+
+    def advance(self, ms):
+        """
+        :param ms: (float) simulated time passed
+        :return: None
+        """
+        self.elapsed += ms
+        if self.elapsed >= self.frame_duration:
+            frames = int(self.elapsed // self.frame_duration)
+            self.elapsed -= frames * self.frame_duration
+            self.frame = (self.frame + frames) % self.number_of_frames
+            self.dirty = True
+
+    def apply(self):
+        """
+        give every member the image for its frame
+        :return: None
+        """
+        self.members = [sprite for sprite in self.members if sprite.alive()]
+        current_frame = animation_store.columns['current_frame']
+        phases = animation_store.columns['phase']
+        slots = animation_store.slots
+        for sprite in self.members:
+            slot = slots[sprite]
+            frame = (self.frame + phases[slot]) % self.number_of_frames
+            current_frame[slot] = frame
+            sprite.image = self.images[frame]
+        self.dirty = False
+
 
+# clock name -> AnimationClock
+animation_clocks = {}
 
+
+@component_fields(animation_store)
 class AnimationMixin(pygame.sprite.Sprite):
     """
     mixin that provides animation functionality
     images must be within the same folder, and that folder must be within resources
     images must be in the format 'basename{}.extension' where {} is the index of the frame of animation (start at 0)
+    frames are advanced by animation_system as simulated time passes.
+    sprites that should animate in step can share a clock by name, so that the animation costs the same however
+    many sprites play it.
     """
-    def __init__(self, image_base_name, image_extension, number_of_frames, images_path=None, persistent=True):
+    def __init__(self, image_base_name, image_extension, number_of_frames, images_path=None, persistent=True,
+                 frame_duration=TICK_MS, clock=None, phase=0):
         """
         initialize
         :param image_base_name: (string)    base name of the animation images
@@ -15,27 +95,28 @@ class AnimationMixin(pygame.sprite.Sprite):
         :param number_of_frames: (int)      the number of frames in the animation
         :param images_path: (string)        subpath from resources folder to folder containing animations if there is any
         :param persistent: (boolean)        false if sprite should die after animation is completed
+        :param frame_duration: (float)      ms each frame is shown for. defaults to one tick
+        :param clock: (string)              name of a shared clock to follow, or None for the sprite to keep its own time.
+                                            the first sprite to use a clock name sets up the clock with its animation.
+                                            non-persistent animations can't share a clock
+        :param phase: (int)                 with a shared clock, how many frames ahead of the clock this sprite is
         """
+        animation_store.add(self)
         self.image_base_name = image_base_name
         self.image_extension = image_extension
         self.images_path = images_path
         self.number_of_frames = number_of_frames
         self.persistent = persistent
+        self.frame_duration = frame_duration
+        self.elapsed = 0
+        self.phase = phase
+        self.clock_name = clock if persistent else None
         self.current_frame = 0
+        if self.clock_name:
+            join_animation_clock(self)
         self.image = None
         self.set_image()
 
-    def update(self):
-        """
-        change image to that for next frame of animation. loops animation if persistent,
-         kills sprite otherwise.
-        :return:
-        """
-        self.current_frame = (self.current_frame + 1) % self.number_of_frames
-        self.set_image()
-        if self.current_frame >= self.number_of_frames and not self.persistent:
-            self.kill()
-
     def set_image(self):
         """
         ensure image matches current frame
@@ -44,6 +125,102 @@ class AnimationMixin(pygame.sprite.Sprite):
         self.image = load_image(self.image_base_name + str(self.current_frame) + "." + self.image_extension, self.images_path)
 
 
+def join_animation_clock(sprite):
+    """
+    adds an animated sprite to the clock named by its clock_name, creating the clock if needed,
+    and puts the sprite on the clock's current frame
+    :param sprite: (AnimationMixin)
+    :return: (AnimationClock)
+    """
+    clock = animation_clocks.get(sprite.clock_name)
+    if clock is None:
+        clock = animation_clocks[sprite.clock_name] = AnimationClock(
+            sprite.image_base_name, sprite.image_extension, sprite.number_of_frames, sprite.images_path,
+            sprite.frame_duration)
+    clock.members.append(sprite)
+    sprite.current_frame = (clock.frame + sprite.phase) % clock.number_of_frames
+    return clock
+
+
+def sync_animation_clocks():
+    """
+    rebuild clock membership from the animation store, setting each clock's frame from its sprites.
+    call after animated sprites have been restored without their constructors (see savestate)
+    :return: None
+    """
+    for clock in animation_clocks.values():
+        clock.members = []
+    columns = animation_store.columns
+    for slot, sprite in enumerate(animation_store.entities):
+        name = columns['clock_name'][slot]
+        if name:
+            current_frame = columns['current_frame'][slot]
+            clock = join_animation_clock(sprite)
+            clock.frame = (current_frame - columns['phase'][slot]) % clock.number_of_frames
+            sprite.current_frame = current_frame
+
+
+def animation_system():
+    """
+    advance every animation by one tick of simulated time.
+    shared clocks advance once each, and only touch their sprites when their frame changes.
+    sprites with their own time change to the image for their new frame; looped if persistent, killed otherwise.
+    :return: None
+    """
+    for clock in animation_clocks.values():
+        clock.advance(TICK_MS)
+    # under load, images are swapped less often. time still passes, so animations keep their speed
+    if not governor.should_animate():
+        return
+    for clock in animation_clocks.values():
+        if clock.dirty:
+            clock.apply()
+
+    columns = animation_store.columns
+    clock_names = columns['clock_name']
+    current_frame = columns['current_frame']
+    number_of_frames = columns['number_of_frames']
+    persistent = columns['persistent']
+    frame_durations = columns['frame_duration']
+    elapsed = columns['elapsed']
+    base_names = columns['image_base_name']
+    extensions = columns['image_extension']
+    paths = columns['images_path']
+    tick_ms = TICK_MS * governor.animation_divisor if governor.level >= SLOW_ANIMATIONS else TICK_MS
+    for slot, sprite in enumerate(animation_store.entities):
+        if clock_names[slot]:
+            continue
+        elapsed[slot] += tick_ms
+        if elapsed[slot] < frame_durations[slot]:
+            continue
+        frames = int(elapsed[slot] // frame_durations[slot])
+        elapsed[slot] -= frames * frame_durations[slot]
+        frame = current_frame[slot] + frames
+        if frame >= number_of_frames[slot] and not persistent[slot]:
+            sprite.kill()
+            continue
+        frame %= number_of_frames[slot]
+        current_frame[slot] = frame
+        sprite.image = load_image(base_names[slot] + str(frame) + "." + extensions[slot], paths[slot])
+
+
+# direction -> (x, y) unit step, for turning a direction into a velocity
+DIRECTION_VECTORS = {'right': (1, 0), 'left': (-1, 0), 'down': (0, 1), 'up': (0, -1)}
+
+
+movement_store = world.add_store('movement', {
+    'speed': 'd',
+    'destination_tile': None,
+    'destination_pixel': None,
+    'velocity': None,
+    'tile_sequence': None,
+    'sequence_index': None,
+    'sequence_repeats': None,
+    'has_hit_obstacle': 'b',
+})
+
+
+@component_fields(movement_store)
 class MovementMixin(pygame.sprite.Sprite):
     """
     Mixin for handling sprite movement.
@@ -60,6 +237,7 @@ class MovementMixin(pygame.sprite.Sprite):
     velocity:
         sprite will move with that velocity (in pixels per frame) until it gets stuck or killed.
 
+    sprites are moved by movement_system
     """
     def __init__(self):
         """
@@ -71,6 +249,7 @@ class MovementMixin(pygame.sprite.Sprite):
         :param sequence_repeats: (boolean)      whether the tile sequence should be repeated (whether the sprite should go in a loop)
 
         """
+        movement_store.add(self)
         self.speed = 0
         self.destination_tile = None
         self.destination_pixel = None
@@ -79,7 +258,6 @@ class MovementMixin(pygame.sprite.Sprite):
         self.sequence_index = None
         self.sequence_repeats = None
         self.has_hit_obstacle = False
-
     def clear_fields(self):
         """
         use this to clean up fields when using setters
@@ -155,65 +333,97 @@ class MovementMixin(pygame.sprite.Sprite):
         self.clear_fields()
         self.velocity = (x_velocity, y_velocity)
 
-    def update(self):
-        """
-
-        :return:
-        """
-
-        if StatusSprite.affected_by(self, PauseStatus) or StatusSprite.affected_by(self, IceStatus):
-            return
 
-        x_pixel, y_pixel = self.rect.center
-        old_x, old_y = x_pixel, y_pixel
+def movement_system():
+    """
+    moves every sprite with a movement component one tick, sliding along obstacles it runs into.
+    moves are swept through the obstacle grid, so fast sprites stop at walls rather than passing through them.
+    paused and frozen sprites don't move.
+    :return: None
+    """
+    columns = movement_store.columns
+    speeds = columns['speed']
+    velocities = columns['velocity']
+    destination_tiles = columns['destination_tile']
+    destination_pixels = columns['destination_pixel']
+    tile_sequences = columns['tile_sequence']
+    has_hit_obstacle = columns['has_hit_obstacle']
+    dynamic = obstacle_grid.dynamic_obstacles()
+    for slot, sprite in enumerate(movement_store.entities):
+        if sprite in victim_statuses and Status.affected_by(sprite, (PauseStatus, IceStatus)):
+            continue
+
+        rect = sprite.rect
+        old_x, old_y = rect.center
         new_x, new_y = None, None
-        if self.velocity:
-            x_velocity, y_velocity = self.velocity
-            x_pixel += x_velocity
-            y_pixel += y_velocity
-            new_x, new_y = (x_pixel, y_pixel)
-
-        elif self.destination_tile or self.destination_pixel:
-            if self.destination_pixel:
-                x_destination_pixel, y_destination_pixel = self.destination_pixel
-            else:
-                x_destination_tile, y_destination_tile = self.destination_tile
-                x_destination_pixel, y_destination_pixel = get_center_pixel(x_destination_tile, y_destination_tile)
-            x_cur_pixel, y_cur_pixel = self.rect.center
+        velocity = velocities[slot]
+        if velocity:
+            new_x, new_y = old_x + velocity[0], old_y + velocity[1]
 
-            if abs(x_destination_pixel - x_cur_pixel) < self.speed:
-                x_cur_pixel = x_destination_pixel
+        elif destination_tiles[slot] or destination_pixels[slot]:
+            if destination_pixels[slot]:
+                x_destination_pixel, y_destination_pixel = destination_pixels[slot]
             else:
-                x_cur_pixel += self.speed if x_cur_pixel < x_destination_pixel else -self.speed
+                x_destination_pixel, y_destination_pixel = get_center_pixel(*destination_tiles[slot])
+            speed = speeds[slot]
 
-            if abs(y_destination_pixel - y_cur_pixel) < self.speed:
-                y_cur_pixel = y_destination_pixel
+            if abs(x_destination_pixel - old_x) < speed:
+                new_x = x_destination_pixel
             else:
-                y_cur_pixel += self.speed if y_cur_pixel < y_destination_pixel else -self.speed
-            new_x, new_y = x_cur_pixel, y_cur_pixel
-
-
-        self.rect.center = (new_x, new_y)
-        # in any case, check for collisions
-        if pygame.sprite.spritecollide(self, obstacles, False):
-            self.has_hit_obstacle = True
-            if self.tile_sequence:
-                self.increment_destination_tile()
-            # try just moving in one dimension instead of both at the same time
-            self.rect.center = (new_x, old_y)
-            if pygame.sprite.spritecollide(self, obstacles, False):
-                self.rect.center = (old_x, new_y)
-                if pygame.sprite.spritecollide(self, obstacles, False):
-                    self.rect.center = (old_x, old_y)
-
-
-
-
-        if self.tile_sequence:
-            if self.rect.center == get_center_pixel(self.destination_tile[0], self.destination_tile[1]):
-                self.increment_destination_tile()
+                new_x = old_x + (speed if old_x < x_destination_pixel else -speed)
 
+            if abs(y_destination_pixel - old_y) < speed:
+                new_y = y_destination_pixel
+            else:
+                new_y = old_y + (speed if old_y < y_destination_pixel else -speed)
 
+        else:
+            continue
+
+        target = rect.copy()
+        target.center = (new_x, new_y)
+        dx, dy = target.x - rect.x, target.y - rect.y
+        time, normal = obstacle_grid.sweep(rect, dx, dy, dynamic)
+        if normal is None:
+            rect.topleft = target.topleft
+        else:
+            has_hit_obstacle[slot] = True
+            if tile_sequences[slot]:
+                sprite.increment_destination_tile()
+            # move up to the obstacle, then slide along it with what's left of the move
+            if normal[0]:
+                moved_x, moved_y = round(dx * time), int(dy * time)
+                slide_x, slide_y = 0, dy - moved_y
+            else:
+                moved_x, moved_y = int(dx * time), round(dy * time)
+                slide_x, slide_y = dx - moved_x, 0
+            rect.move_ip(moved_x, moved_y)
+            if obstacle_grid.overlaps(rect, dynamic):
+                # rounding cut the corner of an obstacle. stay put instead
+                rect.move_ip(-moved_x, -moved_y)
+            elif slide_x or slide_y:
+                time, _ = obstacle_grid.sweep(rect, slide_x, slide_y, dynamic)
+                rect.move_ip(round(slide_x * time), round(slide_y * time))
+
+        # increment_destination_tile may have cleared the sequence
+        if tile_sequences[slot]:
+            if rect.center == get_center_pixel(*destination_tiles[slot]):
+                sprite.increment_destination_tile()
+
+
+rotation_store = world.add_store('rotation', {
+    'src_image': None,
+    'initial_angle': 'd',
+    'current_angle': 'd',
+    'angular_velocity': None,
+    'start_angle': None,
+    'end_angle': None,
+    'should_die': 'b',
+    'rendered_angle': None,
+})
+
+
+@component_fields(rotation_store)
 class RotationMixin(pygame.sprite.Sprite):
     # TODO: add option to rotate around particular point in the sprite rather than only the center
     # TODO: improve image quality by rotating original image rather than incrementally
@@ -228,23 +438,23 @@ class RotationMixin(pygame.sprite.Sprite):
     set_direction and set_angle immediately rotate a sprite to a particular orientation
     set_angular velocity causes the sprite to spin until angular velocity is changed again
     set_rotation_path will causes the sprite to gradually rotate from one angle to another
+    sprites are turned, and their images re-rendered, by rotation_system
     """
     def __init__(self, src_image, image_direction='right', initial_angle=None):
         """
         :param image_direction: (string) the direction the sprite's base image faces
         :param initial_angle: initial angle of the sprite's base image
         """
+        rotation_store.add(self)
         self.src_image = src_image
         self.initial_angle = initial_angle if initial_angle else RotationMixin.directions_to_angles[image_direction]
-        if initial_angle:
-            self.current_angle = initial_angle
 
         self.current_angle = self.initial_angle
         self.angular_velocity = None
         self.start_angle = None
         self.end_angle = None
         self.should_die = False
-
+        self.rendered_angle = None  # angle self.image was rendered at
     directions_to_angles = {"right": 0, "up": 90, "left": 180, "down": 270}
 
     def clear_rotation_state(self):
@@ -298,32 +508,81 @@ class RotationMixin(pygame.sprite.Sprite):
         self.angular_velocity = angular_velocity
         self.should_die = should_die
 
-    def update(self):
-        """
-        update orientation of image
-        :return:
-        """
-        if self.end_angle and abs(self.current_angle - self.end_angle) < self.angular_velocity:
-            self.current_angle = self.end_angle
-            if self.should_die:
-                self.kill()
-            self.clear_rotation_state()
 
-        if self.angular_velocity:
-            self.current_angle += self.angular_velocity
+# (id of image, rotation in [0, 360)) -> (image, rotated image). the image is kept so its id can't be reused. swings
+# and spins go through the same angles over and over, so each is rendered once
+rotated_images = {}
 
+
+def rotated_image(image, rotation):
+    """
+    :param image: (Surface)     unrotated image, e.g. from load_image
+    :param rotation: (number)   degrees counterclockwise
+    :return: (Surface) the image rotated. shared, like load_image's; don't draw on it
+    """
+    rotation %= 360
+    if not rotation:
+        return image
+    key = (id(image), rotation)
+    cached = rotated_images.get(key)
+    if cached is None:
+        with surface_lock:
+            cached = rotated_images[key] = (image, pygame.transform.rotate(image, rotation))
+    return cached[1]
+
+
+def rotation_system():
+    """
+    update orientation of every rotating sprite. images are only re-rendered when the angle has changed.
+    :return: None
+    """
+    columns = rotation_store.columns
+    current_angles = columns['current_angle']
+    initial_angles = columns['initial_angle']
+    angular_velocities = columns['angular_velocity']
+    end_angles = columns['end_angle']
+    should_die = columns['should_die']
+    rendered_angles = columns['rendered_angle']
+    src_images = columns['src_image']
+    for slot, sprite in enumerate(rotation_store.entities):
+        end_angle = end_angles[slot]
+        if end_angle and abs(current_angles[slot] - end_angle) < angular_velocities[slot]:
+            current_angles[slot] = end_angle
+            if should_die[slot]:
+                sprite.kill()
+            sprite.clear_rotation_state()
+
+        if angular_velocities[slot]:
+            current_angles[slot] += angular_velocities[slot]
+
+        angle = current_angles[slot]
+        if angle == rendered_angles[slot]:
+            continue
         # might want to improve rotation about a point.
-        x, y = self.rect.center
-        self.image = pygame.transform.rotate(self.src_image, self.current_angle - self.initial_angle)
-        self.rect = self.image.get_rect()
-        self.rect.center = (x, y)
+        center = sprite.rect.center
+        # rotated images are shared like loaded ones, and unrotated sprites use their source image
+        sprite.image = rotated_image(src_images[slot], angle - initial_angles[slot])
+        sprite.rect = image_rect(sprite.image)
+        sprite.rect.center = center
+        rendered_angles[slot] = angle
+
 
+health_store = world.add_store('health', {
+    'max_health': 'i',
+    'health': 'i',
+    'grace_period': 'i',
+    'damage_timer': 'i',
+    'knock_back_factor': 'i',
+})
 
+
+@component_fields(health_store)
 class HealthMixin(pygame.sprite.Sprite):
     """
     class to handle health updates.
     Gives player and mobs short grace period during which they cannot take damage again
     if knock_back_factor is greater than 0, the sprite will be forced to move away from the sprite for a short time
+    damage is applied by health_system
     """
     def __init__(self, max_health, grace_period, knock_back_factor=0):
         """
@@ -332,19 +591,18 @@ class HealthMixin(pygame.sprite.Sprite):
         :param grace_period:    (int)   Number of frames after taking damage during which sprite is invulnerable
         :param knock_back_factor: (int) measure of how far sprite should be knocked back by damage. should only be used by sprites with MovementMixin.
         """
+        health_store.add(self)
         self.max_health = max_health
         self.health = self.max_health
         self.grace_period = grace_period
         self.damage_timer = 0  # ticks remaining until sprite exits the grace period
         self.knock_back_factor = knock_back_factor
-
     def max_damage_from_group(self, damaging_group):
         """
         :param group:   sprite group to check for collisions with
         :return:        Maximum damage of any item that this sprite touches in the group
         """
-        contact = pygame.sprite.spritecollide(self, damaging_group, False)
-        if contact:
+        if contacts.touching(self, damaging_group):
             damage = max([element.get_damage() for element in damaging_group])
             return damage
         return 0
@@ -356,141 +614,351 @@ class HealthMixin(pygame.sprite.Sprite):
         """
         return max([self.max_damage_from_group(group) for group in group_list])
 
-    def update(self):
-        """
-        updates health
-        :return:
-        """
-        if self.damage_timer:
-            self.damage_timer -= 1
+
+def health_system():
+    """
+    updates health of every sprite with a health component: counts down grace periods,
+    applies damage from whatever each sprite touches, and kills sprites that run out of health
+    :return: None
+    """
+    columns = health_store.columns
+    health = columns['health']
+    damage_timers = columns['damage_timer']
+    grace_periods = columns['grace_period']
+    knock_back_factors = columns['knock_back_factor']
+    for slot, sprite in enumerate(health_store.entities):
+        if damage_timers[slot]:
+            damage_timers[slot] -= 1
         else:
-            if self in enemies:
+            if sprite in enemies:
                 damaging_groups = [hazards, player_weapons]
             else:
                 damaging_groups = [hazards, enemies, enemy_weapons]
-            damage = self.max_damage_from_group_list(damaging_groups)
-            self.health -= damage
-            self.damage_timer = self.grace_period
-            if damage and self.knock_back_factor:
+            damage = max(sprite.max_damage_from_group_list(damaging_groups), Status.status_damage(sprite))
+            health[slot] -= damage
+            damage_timers[slot] = grace_periods[slot]
+            if damage:
+                telemetry.event("damage", entity=type(sprite).__name__, damage=damage, health=health[slot])
+            if damage and knock_back_factors[slot]:
                 # TODO: MOVE SPRITE AWAY FROM WHATEVER CAUSED THE DAMAGE
                 pass
+        if health[slot] <= 0:
+            telemetry.event("death", entity=type(sprite).__name__)
+            sprite.kill()
+
+
+class WeaponUserMixin(pygame.sprite.Sprite):
+    """
+    Mixin for sprites that spawn weapons (the player and armed enemies).
+    All weapon spawns should go through use_weapon, which enforces the rules declared on the weapon class:
+        cooldown:   (int)       ticks after a use before the weapon can be used again
+        max_active: (int)       max number of live instances of the weapon per user. None for no limit
+        trigger:    (string)    'held' to keep using the weapon while the trigger is held,
+                                'edge' to use it once per press
+    This keeps the number of weapons in play bounded no matter how long a key is held.
+    """
+    def __init__(self):
+        self.weapon_cooldowns = {}  # weapon class -> ticks until it can be used again
+        self.live_weapons = {}      # weapon class -> instances spawned by this user that may still be alive
+        self.held_triggers = set()  # weapon classes whose trigger was held the last time it was checked
+
+    def use_weapon(self, weapon_class, trigger_held, orientation):
+        """
+        spawns a weapon if its trigger is held and its rules allow it
+        :param weapon_class:    (class)     weapon to spawn. constructor must take (user, orientation)
+        :param trigger_held:    (boolean)   whether the weapon's trigger is held this tick
+        :param orientation:     (string)    direction to use the weapon in
+        :return: the new weapon, or None if none was spawned
+        """
+        was_held = weapon_class in self.held_triggers
+        if not trigger_held:
+            self.held_triggers.discard(weapon_class)
+            return None
+        self.held_triggers.add(weapon_class)
+
+        if weapon_class.trigger == 'edge' and was_held:
+            return None
+        if self.weapon_cooldowns.get(weapon_class):
+            return None
+        live = [weapon for weapon in self.live_weapons.get(weapon_class, []) if weapon.alive()]
+        self.live_weapons[weapon_class] = live
+        if weapon_class.max_active is not None and len(live) >= weapon_class.max_active:
+            return None
+        if not governor.allow_spawn(weapon_class):
+            return None
+
+        weapon = weapon_class(self, orientation)
+        live.append(weapon)
+        self.weapon_cooldowns[weapon_class] = weapon_class.cooldown
+        return weapon
 
-            if StatusSprite.affected_by(self, FireStatus):
-                self.health <= 1
-        if self.health <= 0:
-            self.kill()
+    def update(self):
+        """
+        counts down weapon cooldowns. should be called every tick, even while the user is paused.
+        :return: None
+        """
+        for weapon_class, remaining in self.weapon_cooldowns.items():
+            if remaining:
+                self.weapon_cooldowns[weapon_class] = remaining - 1
+        # let go of dead weapons, wherever they are in the list, so they can be freed
+        for weapon_class, live in self.live_weapons.items():
+            if not all(weapon.alive() for weapon in live):
+                self.live_weapons[weapon_class] = [weapon for weapon in live if weapon.alive()]
 
 
+lifetime_store = world.add_store('lifetime', {
+    'remaining_time': 'q',
+})
+
+
+@component_fields(lifetime_store)
 class NaturalDeathMixin(pygame.sprite.Sprite):
+    """
+    sprite dies after a number of ticks. counted down by lifetime_system
+    """
     def __init__(self, lifetime):
+        lifetime_store.add(self)
         self.remaining_time = lifetime
 
-    def update(self):
-        self.remaining_time -=1
-        if self.remaining_time <= 0:
-            self.kill()
+
+# rotations are rounded to this many degrees when picking a collision mask
+MASK_ANGLE_STEP = 5
+# (id of image, rounded rotation) -> (image, Mask). the image is kept so its id can't be reused
+collision_masks = {}
+
+
+def collision_mask(sprite):
+    """
+    masks are built the first time each (image, animation frame, rounded rotation) is needed and shared after that.
+    images come from load_image, so every sprite showing the same frame at the same angle uses the same mask.
+    :param sprite: (sprite)
+    :return: (Mask, (int, int)) the sprite's collision mask in world pixels, and where its top left corner is
+    """
+    slot = rotation_store.slots.get(sprite)
+    if slot is None:
+        image, rotation = sprite.image, 0
+    else:
+        columns = rotation_store.columns
+        image = columns['src_image'][slot]
+        rotation = columns['current_angle'][slot] - columns['initial_angle'][slot]
+        rotation = int(round(rotation / MASK_ANGLE_STEP)) * MASK_ANGLE_STEP % 360
+    key = (id(image), rotation)
+    cached = collision_masks.get(key)
+    if cached is None:
+        with surface_lock:
+            source = image
+            scale = get_art_scale()
+            if scale > 1:
+                # rotate at world resolution, so shapes match the full size art rather than a blocky upscale
+                width, height = image.get_size()
+                source = pygame.transform.scale(image, (width * scale, height * scale))
+            mask = pygame.mask.from_surface(pygame.transform.rotate(source, rotation) if rotation else source)
+        cached = collision_masks[key] = (image, mask)
+    mask = cached[1]
+    width, height = mask.get_size()
+    x, y = sprite.rect.center
+    return mask, (x - width // 2, y - height // 2)
+
+
+def collision_system():
+    """
+    finds this tick's contacts. runs after movement; health, statuses, weapons and pickups use the result
+    :return: None
+    """
+    contacts.rebuild()
 
 
+def lifetime_system():
+    """
+    counts down every lifetime, killing sprites whose time is up
+    :return: None
+    """
+    remaining_time = lifetime_store.columns['remaining_time']
+    for slot, sprite in enumerate(lifetime_store.entities):
+        remaining_time[slot] -= 1
+        if remaining_time[slot] <= 0:
+            sprite.kill()
 
-class StatusSprite(NaturalDeathMixin, pygame.sprite.Sprite):
+
+class Status:
     """
-    this sprite will 'attach' itself to another sprite and alter the other sprite's behavior until it dies
-    may be invisible.
-    has initial function, update function, and cleanup function
+    a status is a timer record attached to a victim sprite that alters the victim's behavior until it runs out.
+    statuses aren't sprites: they have no rect or group membership, and invisible ones have no image at all.
+    all statuses are ticked, expired and spread in one pass by update_statuses.
+    statuses with an overlay image are drawn over their victims (see status_overlay_blits).
     """
-    def __init__(self, victim_sprite, image, lifetime, infectious):
+    __slots__ = ("victim_sprite", "lifetime", "remaining_time", "infectious")
+
+    overlay = None  # (image name, sub path) of the image drawn over the victim, or None if the status is invisible
+    damage = 0      # damage done to the victim every time its grace period runs out
+
+    def __init__(self, victim_sprite, lifetime, infectious):
         """
 
         :param victim_sprite:       (sprite)            which sprite the status should attach itself to
-        :param image                (image)             image for the status
         :param lifetime:            (int)               how many ticks the status should last
         :param infectious:          int                 how status should spread. 0 for no spreading, 1 for spreading to only 1 target, 2 for unlimited spreading
         """
-        pygame.sprite.Sprite.__init__(self)
+        self.victim_sprite = victim_sprite
         self.lifetime = lifetime
+        self.remaining_time = lifetime
         self.infectious = infectious
-        NaturalDeathMixin.__init__(self, lifetime)
-        self.victim_sprite = victim_sprite
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.rect.center = self.victim_sprite.rect.center
-        self.add(statuses)
+        victim_statuses.setdefault(victim_sprite, []).append(self)
+        active_statuses.append(self)
 
     affected_by_status = [player_group, player_weapons, enemies, enemy_weapons]
 
-    def update(self):
-        # stay centered on victim
-        self.rect.center = self.victim_sprite.rect.center
-        NaturalDeathMixin.update(self)
-
-        #check if victim has been killed
-        if not any(self.victim_sprite in group for group in groups):
-            self.kill()
-
-        # spread to colliding victims
-        if self.infectious: # spread to all colliding victims
-            for group in StatusSprite.affected_by_status:
-                colliding_sprites = pygame.sprite.spritecollide(self, group, False)
-                for victim in colliding_sprites:
-                    next_infection_arg = 0 if self.infectious == 1 else self.infectious
-                    # don't keep stacking statuses.
-                    if not StatusSprite.affected_by(victim, type(self)):
-                        StatusSprite(victim, self.image, self.lifetime, next_infection_arg)
+    def spread_to(self, victim_sprite, infectious):
+        """
+        attach a copy of this status to another sprite
+        :param victim_sprite:   (sprite)    sprite to infect
+        :param infectious:      (int)       infectiousness of the copy
+        :return: the new status
+        """
+        status = object.__new__(type(self))
+        Status.__init__(status, victim_sprite, self.lifetime, infectious)
+        status.report_applied()
+        return status
 
+    def report_applied(self):
+        """
+        records the status being applied (see telemetry.py). statuses entities start with or are restored with
+        aren't applications, so this isn't part of __init__
+        """
+        telemetry.event("status", status=type(self).__name__, victim=type(self.victim_sprite).__name__)
 
+    def get_damage(self):
+        return self.damage
 
     @staticmethod
-    def get_status_sprites(victim_sprite):
+    def get_statuses(victim_sprite):
         """
-        :param victim_sprite:       the sprite whose status sprites we want
-        :return:                    a list of status sprites affecting this sprite
+        :param victim_sprite:       the sprite whose statuses we want
+        :return:                    a list of statuses affecting this sprite
         """
-        return [status for status in pygame.sprite.spritecollide(victim_sprite, statuses, False) if status.victim_sprite == victim_sprite]
+        return victim_statuses.get(victim_sprite, [])
 
     @staticmethod
     def affected_by(victim_sprite, status_type):
         """
 
         :param victim_sprite:
-        :param status_type:
-        :return:
+        :param status_type:         status class, or tuple of status classes
+        :return:                    whether any status on the sprite is of the given type
         """
-        return any(isinstance(status, status_type) for status in StatusSprite.get_status_sprites(victim_sprite))
+        return any(isinstance(status, status_type) for status in victim_statuses.get(victim_sprite, ()))
 
-    def get_damage(self):
+    @staticmethod
+    def status_damage(victim_sprite):
         """
-        default amount of damage is zero. can be overridden.
-        :return: amount of damage
+        :param victim_sprite:
+        :return:    the most damage any status on the sprite does to it, 0 if none
         """
-        return 0
+        return max([status.damage for status in victim_statuses.get(victim_sprite, ())], default=0)
+
+
+# victim sprite -> statuses attached to it
+victim_statuses = {}
+# every live status, in the order they were applied
+active_statuses = []
+
 
+def detach_status(status):
+    """
+    removes a status from its victim
+    :param status: (Status)
+    :return: None
+    """
+    attached = victim_statuses[status.victim_sprite]
+    attached.remove(status)
+    if not attached:
+        del victim_statuses[status.victim_sprite]
 
 
-class FireStatus(StatusSprite):
+def update_statuses():
+    """
+    ticks every status once: counts down lifetimes, drops statuses that have run out or whose victim has been killed,
+    then spreads infectious statuses to sprites touching their victims.
+    run after the collision pass, since spreading uses its contacts.
+    :return: None
+    """
+    survivors = []
+    spreading = []
+    for status in active_statuses:
+        status.remaining_time -= 1
+        if status.remaining_time <= 0 or not status.victim_sprite.alive():
+            detach_status(status)
+            continue
+        survivors.append(status)
+        if status.infectious:
+            spreading.append(status)
+    active_statuses[:] = survivors
+
+    for status in spreading:
+        status_type = type(status)
+        next_infection_arg = 0 if status.infectious == 1 else status.infectious
+        for group in Status.affected_by_status:
+            for victim in contacts.touching(status.victim_sprite, group):
+                # don't keep stacking statuses.
+                if not Status.affected_by(victim, status_type) and governor.allow_spawn(status_type):
+                    status.spread_to(victim, next_infection_arg)
+
+
+def status_overlay_blits():
+    """
+    :return: (list((Surface, (int, int)))) the overlay image of every visible status, and where to draw it
+                                            (centered on its victim) on the render target
+    """
+    blits = []
+    for status in active_statuses:
+        status_type = type(status)
+        if status_type.overlay is None:
+            continue
+        image = load_image(*status_type.overlay)
+        rect = image_rect(image)
+        rect.center = status.victim_sprite.rect.center
+        blits.append((image, render_position(rect)))
+    return blits
+
+
+class FireStatus(Status):
     """
     class for fire status effect
     """
-    def __init__(self, victim):
-        image = load_image('fire_status.png', 'fire')
-        StatusSprite.__init__(self, victim, image, 10, 2)
-        self.add(hazards)
+    __slots__ = ()
+    overlay = ('fire_status.png', 'fire')
+    damage = 2
 
-    def get_damage(self):
-        return 2
+    def __init__(self, victim):
+        Status.__init__(self, victim, 10, 2)
+        self.report_applied()
 
 
-class PauseStatus(StatusSprite):
+class PauseStatus(Status):
     """
     class for causing a sprite to pause temporarily
     """
+    __slots__ = ()
+
     def __init__(self, victim, pause_length):
-        image = load_image('blank.png')
-        StatusSprite.__init__(self, victim, image, pause_length, 0)
+        Status.__init__(self, victim, pause_length, 0)
+        self.report_applied()
 
-    def get_damage(self):
-        return 0
 
-class IceStatus(StatusSprite):
+class IceStatus(Status):
+    __slots__ = ()
+    overlay = ('ice_status.png', 'ice')
+
     def __init__(self, victim):
-        image = load_image('ice_status.png', 'ice')
-        StatusSprite.__init__(self, victim, image, 40, 1)
\ No newline at end of file
+        Status.__init__(self, victim, 40, 1)
+        self.report_applied()
+
+
+contacts.mask_for = collision_mask
+
+world.add_system(rotation_system)
+world.add_system(lifetime_system)
+world.add_system(movement_system)
+world.add_system(collision_system)
+world.add_system(health_system)
+world.add_system(animation_system)
@@ -0,0 +1,56 @@
+"""
+startup tracing.
+records wall time spent in each phase of startup (imports, SDL init, display creation, asset loading, entity creation)
+so that cold start can be measured on the kiosks.
+this module must not import pygame, since timing the pygame import is one of the phases.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupTrace:
+    """
+    collects (phase name, milliseconds) pairs in the order the phases ran.
+    phases are always timed (it's just two perf_counter calls); the report is only printed when asked for.
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        time the body of a with block as one phase
+        :param name: (string)   name of the phase, as it should appear in the report
+        :return: None
+        """
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - phase_start) * 1000))
+
+    def total_ms(self):
+        """
+        :return: (float) milliseconds since the trace was created
+        """
+        return (time.perf_counter() - self.start_time) * 1000
+
+    def report(self, out=None):
+        """
+        print one line per phase, then the total
+        :param out: file to write to. defaults to stderr
+        :return: None
+        """
+        out = out or sys.stderr
+        width = max([len(name) for name, _ in self.phases] + [5])
+        for name, ms in self.phases:
+            out.write("startup: {}  {:8.1f} ms\n".format(name.ljust(width), ms))
+        out.write("startup: {}  {:8.1f} ms\n".format("total".ljust(width), self.total_ms()))
+        out.flush()
+
+
+# created as early as possible so that the import phases are covered
+trace = StartupTrace()
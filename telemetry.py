@@ -0,0 +1,207 @@
+"""
+telemetry.
+per-tick metrics and gameplay events, streamed to disk without the game ever waiting on it.
+the game thread only appends records to a bounded queue. a background thread turns them into JSON lines and writes
+them to gzip compressed files, starting a new file once one holds max_file_bytes of JSON and deleting the oldest past
+max_files. when the queue is full (the writer has fallen behind) new records are dropped and counted instead of
+waiting for room, and every tick record carries the number dropped so far.
+
+sampling keeps the volume down: tick metrics are recorded every tick_interval ticks, and each gameplay event is kept
+with probability event_rate. events sampled out are counted too.
+
+    {"type": "tick", "tick": 120, "time": ..., "tick_ms": 4.1, "draw_ms": 2.3, "groups": {...}, "image_cache": {...},
+     "dropped": 0}
+    {"type": "damage", "tick": 121, "time": ..., "entity": "Goblin", "damage": 2, "health": 38}
+    {"type": "death", "tick": 140, "time": ..., "entity": "Goblin"}
+    {"type": "status", "tick": 152, "time": ..., "status": "FireStatus", "victim": "PlayerSprite"}
+    {"type": "summary", ...}    counters, written when telemetry is stopped
+
+this module doesn't import pygame.
+"""
+
+import atexit
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+class Telemetry:
+    """
+    the queue, its writer thread and the sampling settings. does nothing until started
+    """
+    def __init__(self):
+        self.enabled = False
+        self.tick = 0                   # tick events are stamped with
+        self.queue = deque()            # (type, tick, time, fields) records waiting to be written
+        self.capacity = 0
+        self.tick_interval = 1
+        self.event_rate = 1.0
+        self.random = random.Random()   # not the game's random, so sampling can't change gameplay
+        self.directory = None
+        self.max_file_bytes = 0
+        self.max_files = 0
+        self.flush_seconds = 0
+        self.writer = None
+        self.wake = threading.Event()
+        self.stopping = False
+        self.paths = deque()            # files kept, oldest first
+        self.files = 0                  # files started
+        self.file_bytes = 0             # JSON written to the newest file
+        # counted by the game thread
+        self.queued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        # counted by the writer thread
+        self.written = 0
+
+    def start(self, directory, capacity=10000, tick_interval=1, event_rate=1.0, max_file_bytes=8 << 20, max_files=10,
+              flush_seconds=1.0):
+        """
+        :param directory: (string)      where to write telemetry-<pid>-<n>.jsonl.gz files. created if missing
+        :param capacity: (int)          most records waiting to be written before new ones are dropped
+        :param tick_interval: (int)     record tick metrics once every this many ticks
+        :param event_rate: (float)      fraction of gameplay events to keep, chosen at random
+        :param max_file_bytes: (int)    uncompressed size at which to start a new file
+        :param max_files: (int)         files to keep. older ones are deleted
+        :param flush_seconds: (float)   longest a record waits before being written
+        :return: None
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.capacity = capacity
+        self.tick_interval = max(1, tick_interval)
+        self.event_rate = event_rate
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.flush_seconds = flush_seconds
+        self.stopping = False
+        self.writer = threading.Thread(target=self.write_loop, name="telemetry writer", daemon=True)
+        self.writer.start()
+        self.enabled = True
+        atexit.register(self.stop)
+
+    def put(self, record):
+        """
+        queue a record unless the queue is full. never blocks
+        :param record: (string, int, float, dict) type, tick, time and fields
+        :return: None
+        """
+        queued = len(self.queue)
+        if queued >= self.capacity:
+            self.dropped += 1
+            return
+        self.queue.append(record)
+        self.queued += 1
+        if queued == self.capacity // 2:
+            self.wake.set()     # filling up faster than flush_seconds; don't wait for the writer's timeout
+
+    def next_tick(self, tick):
+        """
+        :param tick: (int) the tick about to be simulated. events are stamped with it
+        :return: None
+        """
+        self.tick = tick
+
+    def wants_tick(self, tick):
+        """
+        :return: (boolean) whether tick metrics should be collected for this tick
+        """
+        return self.enabled and tick % self.tick_interval == 0
+
+    def record_tick(self, tick_ms, draw_ms, group_counts, image_cache_stats):
+        """
+        :param tick_ms: (float)             time spent simulating the tick
+        :param draw_ms: (float)             time spent drawing it
+        :param group_counts: (dict)         group name -> sprites in it
+        :param image_cache_stats: (dict)    load_image cache hits and misses so far
+        :return: None
+        """
+        self.put(("tick", self.tick, time.time(), {"tick_ms": round(tick_ms, 3), "draw_ms": round(draw_ms, 3),
+                                                   "groups": group_counts, "image_cache": dict(image_cache_stats),
+                                                   "dropped": self.dropped}))
+
+    def event(self, event_type, **fields):
+        """
+        record a gameplay event, subject to sampling
+        :param event_type: (string)     e.g. "damage"
+        :param fields:                  JSON serializable details
+        :return: None
+        """
+        if not self.enabled:
+            return
+        if self.event_rate < 1 and self.random.random() >= self.event_rate:
+            self.sampled_out += 1
+            return
+        self.put((event_type, self.tick, time.time(), fields))
+
+    def stop(self):
+        """
+        write a summary, everything still queued, and stop the writer thread
+        :return: None
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.queue.append(("summary", self.tick, time.time(), {"queued": self.queued, "dropped": self.dropped,
+                                                               "sampled_out": self.sampled_out}))
+        self.stopping = True
+        self.wake.set()
+        self.writer.join()
+
+    def write_loop(self):
+        """
+        runs on the writer thread: writes whatever is queued every flush_seconds (or sooner when woken), until stopped
+        :return: None
+        """
+        output = None
+        try:
+            while True:
+                self.wake.wait(self.flush_seconds)
+                self.wake.clear()
+                stopping = self.stopping
+                output = self.drain(output)
+                if stopping:
+                    return
+        finally:
+            if output is not None:
+                output.close()
+
+    def drain(self, output):
+        """
+        write every queued record
+        :param output: (GzipFile) current file, or None if none is open yet
+        :return: (GzipFile) the file now being written to
+        """
+        queue = self.queue
+        while queue:
+            event_type, tick, when, fields = queue.popleft()
+            line = json.dumps({"type": event_type, "tick": tick, "time": round(when, 3), **fields},
+                              separators=(",", ":")).encode() + b"\n"
+            if output is None or self.file_bytes >= self.max_file_bytes:
+                output = self.rotate(output)
+            output.write(line)
+            self.file_bytes += len(line)
+            self.written += 1
+        if output is not None:
+            output.flush()
+        return output
+
+    def rotate(self, output):
+        """
+        close the current file, if any, start the next one and delete the oldest past max_files
+        :param output: (GzipFile) or None
+        :return: (GzipFile) the new file
+        """
+        if output is not None:
+            output.close()
+        path = os.path.join(self.directory, "telemetry-{}-{:04d}.jsonl.gz".format(os.getpid(), self.files))
+        self.files += 1
+        self.paths.append(path)
+        while len(self.paths) > self.max_files:
+            os.remove(self.paths.popleft())
+        self.file_bytes = 0
+        return gzip.open(path, "wb")